@@ -15,6 +15,12 @@ app.register_blueprint(sock.blueprint)
 from . import dataset_discovery
 app.register_blueprint(dataset_discovery.blueprint)
 
+from . import export
+app.register_blueprint(export.blueprint)
+
+from . import scheduler
+app.register_blueprint(scheduler.blueprint)
+
 @app.route('/')
 def root():
     return app.send_static_file('backend.html')
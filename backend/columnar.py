@@ -0,0 +1,231 @@
+'''
+Columnar on-disk format for event datasets, which is opened by memory
+mapping instead of parsing.
+
+Layout (all little-endian):
+
+    header (64 bytes):
+        u8[8]: magic "PTVCOLS\\0"
+        u32: format version (1)
+        u32: flags (bit 0: events are sorted by time, bit 1: events
+            have a group column)
+        u64: number of events
+        u64[4]: byte offsets of the ts, xs, ys and values columns
+        u64: byte offset of the groups column (0 without groups)
+    i32[count]: ts
+    f32[count]: xs
+    f32[count]: ys
+    f32[count]: values
+    u32[count]: groups (optional)
+
+Each column starts at a multiple of 64 bytes. The times are stored as they
+are passed to the dataset, i.e., after any time scaling.
+
+CSV files with the columns x, y, time, value and (optionally) group are
+converted with tools/convert_columnar.py.
+'''
+
+import itertools
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import numpy as np
+
+logger = logging.getLogger(vars(sys.modules[__name__])['__package__'])
+
+
+magic = b'PTVCOLS\0'
+version = 1
+
+flag_sorted = 1
+flag_groups = 2
+
+header_dtype = np.dtype([
+    ('magic', 'S8'),
+    ('version', '<u4'),
+    ('flags', '<u4'),
+    ('count', '<u8'),
+    ('offsets', '<u8', (4,)),
+    ('group_offset', '<u8'),
+        ])
+
+# column names in the file order, with the keys of the dataset columns
+columns = (
+    ('ts', 'time', '<i4'),
+    ('xs', 'x', '<f4'),
+    ('ys', 'y', '<f4'),
+    ('values', 'value', '<f4'),
+        )
+
+# the optional column of group ids, after the columns above
+group_column = ('groups', 'group', '<u4')
+
+_alignment = 64
+
+
+def _align(offset):
+    return -(-offset // _alignment) * _alignment
+
+
+def _column_offsets(count, file_columns=columns):
+    offsets = []
+    offset = header_dtype.itemsize
+    for _, _, dtype in file_columns:
+        offset = _align(offset)
+        offsets.append(offset)
+        offset += count * np.dtype(dtype).itemsize
+
+    return offsets, offset
+
+
+def read_header(filename):
+    '''Header of a columnar file as a numpy record, see the module docstring.'''
+    with open(filename, 'rb') as f:
+        raw = f.read(header_dtype.itemsize)
+
+    if len(raw) < header_dtype.itemsize:
+        raise ValueError(F'{filename}: not a columnar dataset (file too short)')
+
+    header = np.frombuffer(raw, dtype=header_dtype)[0]
+    if header['magic'] != magic.rstrip(b'\0'):
+        raise ValueError(F'{filename}: not a columnar dataset')
+    if header['version'] != version:
+        raise ValueError(F'{filename}: unsupported columnar format version {header["version"]}')
+
+    return header
+
+
+def load_columns(filename):
+    '''
+    Columns of a columnar file as a dict with the keys x, y, value, time and
+    (if the file has a group column) group, memory-mapped read-only. Can be
+    used as a `DatasetDefinition` run function.
+    '''
+    header = read_header(filename)
+    count = int(header['count'])
+
+    file_columns, offsets = columns, header['offsets'].tolist()
+    if header['flags'] & flag_groups:
+        file_columns, offsets = columns + (group_column,), offsets + [ int(header['group_offset']) ]
+
+    mapped = np.memmap(filename, dtype='u1', mode='r')
+    data = dict()
+    for (_, key, dtype), offset in zip(file_columns, offsets):
+        size = count * np.dtype(dtype).itemsize
+        data[key] = mapped[offset:offset + size].view(dtype)
+
+    logger.info('Mapped %d events from %s', count, filename)
+    return data
+
+
+def write(filename, chunks, sort=False):
+    '''
+    Write a columnar file from `chunks`, an iterable of dicts with the keys
+    x, y, value, time and (optionally, in all chunks or none) group. The
+    chunks are streamed to disk, so the input does not have to fit into
+    memory (unless `sort` is set).
+    '''
+    directory = os.path.dirname(os.path.abspath(filename))
+    with tempfile.TemporaryDirectory(dir=directory) as tmp:
+        count = 0
+        file_columns = None
+        files = dict()
+        try:
+            for chunk in chunks:
+                if file_columns is None:
+                    file_columns = columns + (group_column,) if 'group' in chunk else columns
+                    files = { name: open(os.path.join(tmp, name), 'wb') for name, _, _ in file_columns }
+                elif ('group' in chunk) != (len(file_columns) > len(columns)):
+                    raise ValueError('either all chunks or none must have groups')
+
+                ts = np.asarray(chunk['time'])
+                if len(ts) > 0 and (ts.min() < np.iinfo('<i4').min or ts.max() > np.iinfo('<i4').max):
+                    raise ValueError('times do not fit into 32-bit integers, use a time scaling')
+
+                for name, key, dtype in file_columns:
+                    np.asarray(chunk[key]).astype(dtype).tofile(files[name])
+
+                count += len(ts)
+        finally:
+            for f in files.values():
+                f.close()
+
+        if file_columns is None:
+            file_columns = columns
+            for name, _, _ in file_columns:
+                open(os.path.join(tmp, name), 'wb').close()
+
+        offsets, size = _column_offsets(count, file_columns)
+        grouped = len(file_columns) > len(columns)
+
+        header = np.zeros(1, dtype=header_dtype)
+        header['magic'] = magic
+        header['version'] = version
+        header['flags'] = (flag_sorted if sort else 0) | (flag_groups if grouped else 0)
+        header['count'] = count
+        header['offsets'] = offsets[:len(columns)]
+        header['group_offset'] = offsets[len(columns)] if grouped else 0
+
+        out = os.path.join(tmp, 'out')
+        with open(out, 'wb') as f:
+            f.write(header.tobytes())
+            for (name, _, _), offset in zip(file_columns, offsets):
+                f.write(b'\0' * (offset - f.tell()))
+                with open(os.path.join(tmp, name), 'rb') as column:
+                    shutil.copyfileobj(column, f, 1 << 24)
+
+            f.truncate(size)
+
+        if sort and count > 0:
+            _sort_by_time(out, file_columns, offsets, count)
+
+        os.replace(out, filename)
+
+    logger.info('Wrote %d events to %s', count, filename)
+
+
+def _sort_by_time(filename, file_columns, offsets, count):
+    mapped = np.memmap(filename, dtype='u1', mode='r+')
+    order = None
+    for (_, _, dtype), offset in zip(file_columns, offsets):
+        column = mapped[offset:offset + count * np.dtype(dtype).itemsize].view(dtype)
+        if order is None:
+            order = np.argsort(column, kind='stable')
+
+        column[:] = column[order]
+
+    mapped.flush()
+
+
+def read_csv_chunks(infile, time_scaling=1.0, chunk_size=1 << 20):
+    '''
+    Chunks of `chunk_size` events from a CSV file with (at least) the
+    columns x, y, time and value, and the column group if the file has one.
+    Times are multiplied by `time_scaling` and truncated to integers, as in
+    `dataset_generation.tides._run`.
+    '''
+    header = next(infile).strip().split(',')
+    usecols = [ header.index(key) for key in ('x', 'y', 'time', 'value') ]
+    grouped = 'group' in header
+    if grouped:
+        usecols.append(header.index('group'))
+
+    while True:
+        lines = list(itertools.islice(infile, chunk_size))
+        if len(lines) == 0:
+            return
+
+        arr = np.loadtxt(lines, delimiter=',', usecols=usecols, dtype='float', ndmin=2)
+        chunk = dict(
+            x=arr[:, 0],
+            y=arr[:, 1],
+            time=np.trunc(arr[:, 2] * time_scaling),
+            value=arr[:, 3],
+                )
+        if grouped:
+            chunk['group'] = arr[:, 4].astype('int64')
+
+        yield chunk
+
@@ -3,13 +3,18 @@ import sys
 from datetime import timedelta
 import math
 import sys
+import time
+import copy
 from base64 import b64encode
 import json
 import logging
-from scipy.stats import entropy
-from scipy.signal import vectorstrength
+from scipy.stats import binom, entropy
 import numpy as np
 
+from . import vectorstrength as fft_vectorstrength
+from . import metrics as quality_metrics
+from . import scheduler
+
 
 logger = logging.getLogger(vars(sys.modules[__name__])['__package__'])
 
@@ -53,24 +58,361 @@ def generate_periods(dt, min_period, increment=1.005):
 
 
 
+# maximum number of (period, event) pairs processed at once in batched sweeps
+max_block_elements = 1 << 22
+
+
+# methods for calculating vector strengths: directly per period, or for all
+# periods at once from the spectrum of the binned events (see vectorstrength.py)
+vectorstrength_methods = ('exact', 'fft')
+
+# number of periods of a prefetched page calculated between checks for
+# waiting messages, see `Dataset.prefetch_page`
+prefetch_slice_size = 16
+
+# sizes of the period raster and spectrogram that the memory reserved for a
+# session accounts for, see `Dataset.session_reserve`
+reserved_raster_cells = 32 * 32
+reserved_spectrogram_windows = 100
+
+# number of phase bins of the base statistics (see
+# `Dataset.calculate_base_statistics`), which the displayed number of bins
+# has to divide
+default_base_num_bins = 200
+
+# fine histograms (see `Dataset.calculate_fine_histogram`) have this many
+# bins per base bin, so that they fold into the base resolution for the
+# sub-harmonics p / k of their period p for each k dividing it: 840 is the
+# least common multiple of 1 to 8, and also divisible by 10 and 12
+harmonic_resolution = 840
+
+# highest k for which sub-harmonics p / k are derived from fine histograms
+max_harmonic = 12
+harmonics = [ k for k in range(1, max_harmonic + 1) if harmonic_resolution % k == 0 ]
+
+# groups with fewer events are ranked after all others, as a best entropy
+# over the whole period grid says little about so few events
+min_ranked_group_events = 10
+
+# methods for generating surrogate event sets, against which the
+# significance of entropies and vector strengths is assessed (see
+# `Dataset.calculate_significance`)
+surrogate_methods = ('shuffle', 'jitter')
+
+# number of surrogate event sets swept over all periods in the same pass
+surrogate_batch_size = 8
+
+# display attributes, i.e., what the histogram bins show
+methods = ('count', 'average value', 'variance')
+
+# arrays of BEGIN DATASET and REPLACE DATASET messages in message order; bit i
+# of the array mask of PARTIAL REPLACE messages stands for entry i
+wire_arrays = ('histograms', 'entropies', 'vectorstrengths', 'periods', 'xs', 'ys', 'values', 'binning', 'ts', 'metrics')
+
+# per-event arrays of BEGIN DATASET messages, which can be left out of them
+# and fetched with COLUMNS messages instead
+event_columns = ('xs', 'ys', 'values', 'ts')
+
+# arrays sent after the display attribute or the number of bins changed: the
+# period-indexed arrays and the binning, but not the per-event columns
+replaced_arrays = ('histograms', 'entropies', 'vectorstrengths', 'periods', 'binning', 'metrics')
+
+
+def _aggregate(ts, values, shift=0):
+    '''
+    Unique timestamps of events, with their event counts, value sums and
+    sums of squared values, of the values minus `shift`.
+    '''
+    unique_ts, inverse, counts = np.unique(ts, return_inverse=True, return_counts=True)
+    values = np.asarray(values, dtype='float') - shift
+
+    sums = np.bincount(inverse, weights=values, minlength=len(unique_ts))
+    sumsqs = np.bincount(inverse, weights=values ** 2, minlength=len(unique_ts))
+
+    return unique_ts.astype('<i4'), counts.astype('<u4'), sums, sumsqs
+
+
+def _group_indices(groups):
+    '''
+    Dense indices (0 to number of groups - 1) of the group ids of the
+    events, and the group ids by index, or (None, None) without groups.
+    '''
+    if groups is None:
+        return None, None
+
+    keys, inverse = np.unique(np.asarray(groups), return_inverse=True)
+    return inverse.astype('<u4'), keys.tolist()
+
+
+def _fold(fine, k, num_bins):
+    '''
+    Phase histogram with `num_bins` bins for period p / k, from the phase
+    histogram `fine` for period p: the phase for p / k is k times the phase
+    for p (modulo 1), so bin j of `fine` adds to bin j modulo len(fine) / k.
+    '''
+    return fine.reshape(k, -1).sum(axis=0).reshape(num_bins, -1).sum(axis=1)
+
+
+class _Chunks:
+    '''
+    Iterable over chunks of events produced by `make`. All chunks are kept
+    if `keep` is set (when all events are processed at once), and produced
+    again for each iteration otherwise.
+    '''
+
+    def __init__(self, make, keep):
+        self.make = make
+        self.kept = list(make()) if keep else None
+
+    def __iter__(self):
+        return iter(self.kept) if self.kept is not None else self.make()
+
+
 class Dataset:
-    def __init__(self, data, min_period, num_bins, logger, scaling):
+    # arrays and scalar attributes that fully describe a precomputed dataset
+    _state_arrays = ('xs', 'ys', 'values', 'ts', 'periods', 'hists', 'ents', 'vecs', 'moments', 'binning',
+            'unique_ts', 'unique_counts', 'unique_sums', 'unique_sumsqs', 'groups')
+    _state_attributes = ('min_period', 'num_bins', 'base_num_bins', 'scaling', 'vectorstrength_method',
+            'method', 'metrics', 'chunk_size', 'page_size', 'dt', 't0', 't1', 'binning_bin_size', 'group_keys',
+            'value_shift')
+    # version of the state above, to be increased whenever its arrays,
+    # attributes or their meaning change
+    state_version = 4
+
+    def __init__(self, data, min_period, num_bins, logger, scaling, vectorstrength_method='exact', base_num_bins=default_base_num_bins,
+            metrics=None, chunk_size=None, page_size=None):
         self.min_period = min_period
         self.num_bins = num_bins
         self.logger = logger
 
+        if base_num_bins % num_bins != 0:
+            raise ValueError(F'number of bins ({num_bins}) must divide base number of bins ({base_num_bins})')
+        self.base_num_bins = base_num_bins
+
+        if vectorstrength_method not in vectorstrength_methods:
+            raise ValueError(F'no such vector strength method: "{vectorstrength_method}"')
+        self.vectorstrength_method = vectorstrength_method
+
         self.method = 'count'
 
+        # additional quality metrics (see metrics.py), all registered ones by default
+        metrics = list(quality_metrics.registry.keys()) if metrics is None else list(metrics)
+        for key in metrics:
+            if key not in quality_metrics.registry:
+                raise ValueError(F'no such metric: "{key}"')
+        self.metrics = metrics
+
         self.scaling = scaling
 
+        # number of events processed at once, or None for all events; with
+        # chunks, only per-period results are kept in memory, and the events
+        # are read again (e.g., from a memory-mapped columnar file) for each
+        # computation
+        if chunk_size is not None and chunk_size <= 0:
+            raise ValueError(F'chunk size must be positive: {chunk_size}')
+        self.chunk_size = chunk_size
+
+        # number of periods per page, or None to calculate the histograms of
+        # all periods upfront; with pages, only the vector strengths of all
+        # periods are calculated upfront (with the "fft" method, for all
+        # periods at once), and the histograms, entropies and metric values
+        # of a page when it is requested (see `period_page_websocket_data`)
+        if page_size is not None and page_size <= 0:
+            raise ValueError(F'page size must be positive: {page_size}')
+        if page_size is not None and vectorstrength_method != 'fft':
+            raise ValueError('pages need the "fft" vector strength method')
+        self.page_size = page_size
+
+        # base statistics (counts, sums, sumsqs) of the calculated pages by
+        # page index, the pages to calculate while the client is idle, and
+        # the page being prefetched with the statistics of its calculated
+        # slices (see `prefetch_page`)
+        self.pages = dict()
+        self.prefetch = []
+        self.prefetch_partial = None
+
+        # token of the session serving this dataset, see sessions.py
+        self.session_token = None
+
+        # period rasters by (width, height, number of bins)
+        self.period_rasters = dict()
+
+        # spectrograms by (window width, window stride, number of bins)
+        self.spectrograms = dict()
+
+        # group rankings by (number of bins, display attribute)
+        self.group_rankings = dict()
+
+        # (period, statistics) of the last fine histogram
+        self.fine_histogram = None
+
         self.compress_data(data)
         self.precalculate_histograms()
         self.precalculate_binning()
 
 
+    def copy(self, logger):
+        '''
+        Shallow copy of the dataset for another session. The arrays are
+        shared, which is safe because they are never modified in place.
+        '''
+        dataset = copy.copy(self)
+        dataset.logger = logger
+
+        # arrays computed later belong to the copy, see `memory_footprint`
+        dataset._borrowed = set(id(arr) for arr in self._arrays())
+        dataset.period_rasters = dict()
+        dataset.spectrograms = dict()
+        dataset.group_rankings = dict()
+        dataset.fine_histogram = None
+        dataset.pages = dict(self.pages)
+        dataset.prefetch = []
+        dataset.prefetch_partial = None
+
+        return dataset
+
+
+    def _arrays(self):
+        '''All arrays held by the dataset, including cached results.'''
+        arrays = [ getattr(self, k) for k in self._state_arrays ]
+        if self.base_statistics is not None:
+            arrays.extend(self.base_statistics)
+        for statistics in self.pages.values():
+            arrays.extend(statistics)
+        arrays.extend(self.metric_values.values())
+        for cache in (self.period_rasters, self.spectrograms, self.group_rankings):
+            for result in cache.values():
+                arrays.extend(result)
+        if self.fine_histogram is not None:
+            arrays.extend(self.fine_histogram[1])
+
+        return [ arr for arr in arrays if isinstance(arr, np.ndarray) ]
+
+
+    def memory_footprint(self):
+        '''
+        Bytes of memory held by this dataset alone. Arrays shared with the
+        dataset it was copied from and memory-mapped arrays are not counted.
+        '''
+        borrowed = getattr(self, '_borrowed', set())
+        counted = set()
+        total = 0
+        for arr in self._arrays():
+            if id(arr) in borrowed or id(arr) in counted or isinstance(arr, np.memmap):
+                continue
+
+            # views count towards the array that owns the memory
+            owner = arr
+            while isinstance(owner.base, np.ndarray):
+                owner = owner.base
+            if isinstance(owner, np.memmap) or id(owner) in borrowed:
+                continue
+
+            counted.add(id(arr))
+            total += arr.nbytes
+
+        return total
+
+
+    def session_reserve(self):
+        '''
+        Estimated bytes of the results that a session calculates on top of
+        this dataset, which a copy of a registered dataset does not hold
+        yet (see `copy`): histograms, entropies and metric values for
+        another number of bins or display attribute, the value statistics
+        of all periods for a display attribute other than "count", the fine
+        histogram, the base statistics of all pages, and a period raster
+        and a spectrogram of typical sizes.
+        '''
+        num_periods = len(self.periods)
+        histograms = num_periods * (4 * self.num_bins + 4 + 4 * len(self.metrics))
+        value_statistics = 0 if self.page_size is not None else num_periods * self.base_num_bins * (4 + 4)
+        fine_histogram = self.base_num_bins * harmonic_resolution * (4 + 4 + 4)
+        pages = 0 if self.page_size is None else num_periods * self.base_num_bins * (4 + 4 + 4)
+        period_raster = reserved_raster_cells * (4 + 4 + 4 + 4)
+        spectrogram = reserved_spectrogram_windows * num_periods * (4 + 4)
+
+        return histograms + value_statistics + fine_histogram + pages + period_raster + spectrogram
+
+
+    def groups_reserve(self, count):
+        '''
+        Estimated bytes of the results of `groups_websocket_data` for
+        `count` groups: their histograms, entropies, vector strengths and
+        metric values for all periods, the GROUPS message containing them,
+        and the ranking of all groups.
+        '''
+        results = count * len(self.periods) * (4 * self.num_bins + 4 + 4 + 4 * len(self.metrics))
+        ranking = len(self.group_keys) * (8 + 8 + 8 + 8)
+
+        return 2 * results + ranking
+
+
+    def state(self):
+        '''
+        The arrays and the JSON-serializable attributes of the precomputed
+        dataset, from which `from_state` can recreate it.
+        '''
+        arrays = { k: getattr(self, k) for k in self._state_arrays if getattr(self, k) is not None }
+        if self.base_statistics is not None:
+            for k, arr in zip(('base_counts', 'base_sums', 'base_sumsqs'), self.base_statistics):
+                if arr is not None:
+                    arrays[k] = arr
+
+        attributes = dict()
+        for k in self._state_attributes:
+            v = getattr(self, k)
+            attributes[k] = v.item() if isinstance(v, np.generic) else v
+
+        return arrays, attributes
+
+
+    @classmethod
+    def from_state(cls, arrays, attributes, logger):
+        '''Recreate a dataset from `state()`, without copying the arrays.'''
+        dataset = cls.__new__(cls)
+        dataset.logger = logger
+        dataset.session_token = None
+        dataset.period_rasters = dict()
+        dataset.spectrograms = dict()
+        dataset.group_rankings = dict()
+        dataset.fine_histogram = None
+        dataset.pages = dict()
+        dataset.prefetch = []
+        dataset.prefetch_partial = None
+
+        for k in cls._state_arrays:
+            setattr(dataset, k, arrays.get(k, None))
+        for k in cls._state_attributes:
+            setattr(dataset, k, attributes[k])
+
+        # datasets with pages have no base statistics of all periods
+        if 'base_counts' in arrays:
+            dataset.base_statistics = (arrays['base_counts'], arrays.get('base_sums', None), arrays.get('base_sumsqs', None))
+        else:
+            dataset.base_statistics = None
+        dataset.update_histograms()
+
+        return dataset
+
+
     def compress_data(self, rawdata):
         self.logger.info('Compressing dataset')
 
+        # columnar data: dict of arrays with the keys x, y, value, time and
+        # optionally group
+        if isinstance(rawdata, dict):
+            self.xs = np.asarray(rawdata['x'], dtype='<f4')
+            self.ys = np.asarray(rawdata['y'], dtype='<f4')
+            self.values = np.asarray(rawdata['value'], dtype='<f4')
+
+            # integer times, e.g., memory-mapped from a columnar file, are not copied
+            ts = np.asarray(rawdata['time'])
+            self.ts = np.asarray(ts, dtype='<i4') if np.issubdtype(ts.dtype, np.integer) else np.round(ts).astype('<i4')
+
+            self.groups, self.group_keys = _group_indices(rawdata.get('group', None))
+            return
+
         length = len(rawdata)
         xs = np.zeros(length, dtype='<f4')
         ys = np.zeros(length, dtype='<f4')
@@ -90,95 +432,417 @@ class Dataset:
         self.values = values
         self.ts = ts
 
+        # events have a group id if the first one has
+        grouped = length > 0 and 'group' in rawdata[0]
+        self.groups, self.group_keys = _group_indices([ v['group'] for v in rawdata ] if grouped else None)
+
 
     def precalculate_histograms(self):
         self.logger.info('Precalculating histograms')
 
-        data_as_seconds = self.ts.copy()
-        data_as_seconds.sort()
-
-        t0 = data_as_seconds.min()
-        t1 = data_as_seconds.max()
+        t0 = self.ts.min()
+        t1 = self.ts.max()
         dt = t1 - t0
 
         self.dt = dt
         self.t0 = t0
         self.t1 = t1
 
+        # values are summed relative to their mean, so that variances do
+        # not cancel catastrophically for values far from 0
+        total = sum(np.sum(values, dtype='float') for _, _, _, values in self.event_chunks())
+        self.value_shift = float(total / max(len(self.ts), 1))
+
+        self.aggregate_events()
+
         self.periods = generate_periods(dt, self.min_period)
         self.logger.info('  Generated %d periods', len(self.periods))
 
-        hists, ents, vecs = self.calculate_histograms_entropies(self.periods)
+        if self.page_size is not None:
+            self.logger.info('  Calculating vector strengths, histograms follow in pages of %d periods', self.page_size)
+            chunks = ( (t, weights) for t, weights, _, _ in self.weighted_event_chunks() )
+            self.moments = fft_vectorstrength.chunked_circular_moments(chunks, 0, self.dt, self.periods)[:, 0]
+            self.vecs = np.abs(self.moments).astype('<f4')
+            self.base_statistics = None
+            self.update_histograms()
+            return
+
+        counts, sums, sumsqs, moments = self.calculate_base_statistics(self.periods)
+        self.base_statistics = (counts, sums, sumsqs)
+        self.moments = moments
+        self.vecs = np.abs(moments).astype('<f4')
+        self.update_histograms()
+
+
+    def aggregate_events(self):
+        '''
+        Collapse events with the same timestamp into one weighted event with
+        their count, value sum and sum of squared values (relative to
+        `value_shift`). The phase of an
+        event only depends on its timestamp, so all temporal kernels work on
+        these weighted events instead of the individual ones.
+
+        With chunks, the events are aggregated per chunk when they are read
+        instead (see `weighted_event_chunks`).
+        '''
+        if self.chunk_size is not None:
+            self.unique_ts = self.unique_counts = self.unique_sums = self.unique_sumsqs = None
+            self.logger.info('  Processing events in chunks of %d', self.chunk_size)
+            return
+
+        self.unique_ts, self.unique_counts, self.unique_sums, self.unique_sumsqs = _aggregate(self.ts, self.values, self.value_shift)
+
+        self.logger.info('  Aggregated %d events into %d unique timestamps', len(self.ts), len(self.unique_ts))
+
+
+    def event_chunks(self):
+        '''Slices (ts, xs, ys, values) of at most `chunk_size` events, or all events at once.'''
+        size = self.chunk_size or max(len(self.ts), 1)
+        for start in range(0, len(self.ts), size):
+            end = start + size
+            yield np.asarray(self.ts[start:end]), np.asarray(self.xs[start:end]), np.asarray(self.ys[start:end]), \
+                    np.asarray(self.values[start:end])
+
+
+    def weighted_event_chunks(self):
+        '''
+        Weighted events (see `aggregate_events`) as chunks (times relative to
+        t0, counts as floats, value sums, sums of squared values).
+        '''
+        if self.chunk_size is None:
+            yield self.unique_ts - self.t0, self.unique_counts.astype('float'), self.unique_sums, self.unique_sumsqs
+            return
+
+        for ts, _, _, values in self.event_chunks():
+            unique_ts, counts, sums, sumsqs = _aggregate(ts, values, self.value_shift)
+            yield unique_ts - self.t0, counts.astype('float'), sums, sumsqs
+
+
+    def calculate_histograms_entropies(self, periods, base_period=None):
+        '''
+        Histograms, entropies, vector strengths and metric values for
+        `periods`. Sub-harmonics of `base_period` are derived from its fine
+        histogram, see `calculate_harmonic_base_statistics`.
+        '''
+        if base_period is None:
+            counts, sums, sumsqs, moments = self.calculate_base_statistics(periods)
+        else:
+            counts, sums, sumsqs, moments = self.calculate_harmonic_base_statistics(periods, base_period)
+        hists, ents = self.histograms_from_statistics(counts, sums, sumsqs)
+        vecs = np.abs(moments).astype('<f4')
+        metric_values = self.metrics_from_statistics(counts, moments)
+
+        return hists, ents, vecs, metric_values
+
+
+    def calculate_base_statistics(self, periods, with_moments=True, with_values=None):
+        '''
+        Count, sum and sum of squares of the values (minus `value_shift`)
+        per phase bin, for each period, at the base resolution of
+        `base_num_bins` bins, and the first circular moment of each period. Histograms for any number of
+        bins dividing `base_num_bins` and for any display attribute, the
+        vector strengths and the quality metrics (see metrics.py) can be
+        derived from these without the events.
+
+        All statistics are accumulated in the same pass over the events,
+        except for the circular moments of the "fft" vector strength
+        method, which are calculated for all periods at once. Without
+        `with_moments`, the moments are not calculated and None. The sums
+        and sums of squares (in single precision) are only calculated
+        `with_values`, by default for display attributes other than
+        "count", and None otherwise.
+        '''
+        num_bins = self.base_num_bins
+        exact_moments = with_moments and self.vectorstrength_method == 'exact'
+        if with_values is None:
+            with_values = self.method != 'count'
+
+        counts = np.zeros((len(periods), num_bins), dtype='<u4')
+        sums = np.zeros((len(periods), num_bins), dtype='<f4') if with_values else None
+        sumsqs = np.zeros((len(periods), num_bins), dtype='<f4') if with_values else None
+        moments = np.zeros(len(periods), dtype='complex')
+        total_weight = 0
+
+        self.logger.info('  Generating %d histograms:', len(periods))
+        for chunk, (t, weights, chunk_sums, chunk_sumsqs) in enumerate(self.weighted_event_chunks(), 1):
+            for i, period in enumerate(periods, 1):
+                phases = np.remainder(t, period) / period
+                bins = np.minimum((phases * num_bins).astype('int64'), num_bins - 1)
+
+                counts[i-1, :] += np.bincount(bins, weights=weights, minlength=num_bins).astype('<u4')
+                if with_values:
+                    sums[i-1, :] += np.bincount(bins, weights=chunk_sums, minlength=num_bins)
+                    sumsqs[i-1, :] += np.bincount(bins, weights=chunk_sumsqs, minlength=num_bins)
+
+                if exact_moments:
+                    angles = 2 * np.pi * phases
+                    moments[i-1] += complex(np.dot(weights, np.cos(angles)), np.dot(weights, np.sin(angles)))
+
+                if self.chunk_size is None and i % 500 == 0:
+                    self.logger.info('    Generated %d/%d histograms', i, len(periods))
+
+                scheduler.checkpoint()
+
+            total_weight += weights.sum()
+            if self.chunk_size is not None:
+                self.logger.info('    Processed chunk %d (%d events)', chunk, weights.sum())
+
+        self.logger.info('  Generated %d histograms', len(periods))
+
+        if not with_moments:
+            moments = None
+        elif exact_moments:
+            moments /= max(total_weight, 1)
+        else:
+            chunks = ( (t, weights) for t, weights, _, _ in self.weighted_event_chunks() )
+            moments = fft_vectorstrength.chunked_circular_moments(chunks, 0, self.dt, periods)[:, 0]
+
+        return counts, sums, sumsqs, moments
 
-        self.hists = hists
-        self.ents = ents
-        self.vecs = vecs
 
+    def calculate_fine_histogram(self, period):
+        '''
+        Count, sum and sum of squares of the values per phase bin for
+        `period`, at `harmonic_resolution` times the base resolution, and
+        the circular moments C_1 to C_max_harmonic. As in
+        `calculate_base_statistics`, the sums and sums of squares are None
+        for the "count" display attribute. The result for the last period
+        is kept.
+        '''
+        with_values = self.method != 'count'
+        if self.fine_histogram is not None and self.fine_histogram[0] == period \
+                and (not with_values or self.fine_histogram[1][1] is not None):
+            return self.fine_histogram[1]
 
-    def calculate_histograms_entropies(self, periods):
-        data_as_seconds = self.ts.copy()
+        self.logger.info('  Generating fine histogram for period %g', period)
 
-        t0 = data_as_seconds.min()
-        t1 = data_as_seconds.max()
-        dt = t1 - t0
+        num_bins = self.base_num_bins * harmonic_resolution
+        exact_moments = self.vectorstrength_method == 'exact'
 
-        hists = np.zeros((len(periods), self.num_bins))
-        ents = np.zeros((len(periods),))
-        vecs = np.zeros((len(periods),))
+        counts = np.zeros(num_bins, dtype='<u4')
+        sums = np.zeros(num_bins, dtype='<f4') if with_values else None
+        sumsqs = np.zeros(num_bins, dtype='<f4') if with_values else None
+        moments = np.zeros(max_harmonic, dtype='complex')
+        total_weight = 0
 
-        self.logger.info('  Generating %d histograms:', len(hists))
-        for i, period in enumerate(periods, 1):
-            hist = self.calculate_histogram_for(t0, period, data_as_seconds)
-            ent = entropy(hist, base=2)
-            sum = np.sum(hist[np.isnan(hist) == False])
-            if np.isnan(sum) or sum == 0:
-                sum = 1
+        for t, weights, chunk_sums, chunk_sumsqs in self.weighted_event_chunks():
+            scheduler.checkpoint()
 
-            hist = np.asfarray(hist) / sum
-            vec, _ = vectorstrength(data_as_seconds - t0, period)
+            phases = np.remainder(t, period) / period
+            bins = np.minimum((phases * num_bins).astype('int64'), num_bins - 1)
 
-            hists[i-1, :] = hist
-            ents[i-1] = ent
-            vecs[i-1] = vec
+            counts += np.bincount(bins, weights=weights, minlength=num_bins).astype('<u4')
+            if with_values:
+                sums += np.bincount(bins, weights=chunk_sums, minlength=num_bins)
+                sumsqs += np.bincount(bins, weights=chunk_sumsqs, minlength=num_bins)
 
-            if i % 500 == 0:
-                self.logger.info('    Generated %d/%d histograms', i, len(periods))
+            if exact_moments:
+                for k in range(1, max_harmonic + 1):
+                    angles = 2 * np.pi * k * phases
+                    moments[k-1] += complex(np.dot(weights, np.cos(angles)), np.dot(weights, np.sin(angles)))
 
-        self.logger.info('  Generated %d histograms', len(hists))
+            total_weight += weights.sum()
 
-        return hists, ents, vecs
+        if exact_moments:
+            moments /= max(total_weight, 1)
+        else:
+            chunks = ( (t, weights) for t, weights, _, _ in self.weighted_event_chunks() )
+            moments = fft_vectorstrength.chunked_circular_moments(chunks, 0, self.dt, [period], max_harmonic)[0]
+
+        self.fine_histogram = (period, (counts, sums, sumsqs, moments))
+        return self.fine_histogram[1]
 
 
-    def calculate_histogram_for(self, t0, period, data_as_seconds):
-        if self.method == 'count':
-            phases = np.remainder(data_as_seconds - t0, period) / period
-            hist, _ = np.histogram(phases, bins=self.num_bins, range=(0, 1))
-            return hist
+    def calculate_harmonic_base_statistics(self, periods, base_period):
+        '''
+        `calculate_base_statistics` for `periods`, where those that are
+        sub-harmonics `base_period` / k (for k in `harmonics`) are derived by
+        folding the fine histogram of `base_period`, without the events. The
+        k-th circular moment of `base_period` is the first one of its k-th
+        sub-harmonic. Periods near but not at a sub-harmonic cannot be
+        derived, as their phases do not follow from those for `base_period`.
+        '''
+        periods = np.asarray(periods, dtype='float')
+        k = np.rint(base_period / periods).astype('int64')
+        derived = np.isin(k, harmonics) & (np.abs(periods * k - base_period) <= 1e-12 * base_period)
+
+        if not np.any(derived):
+            return self.calculate_base_statistics(periods)
+
+        fine_counts, fine_sums, fine_sumsqs, fine_moments = self.calculate_fine_histogram(base_period)
+        with_values = fine_sums is not None
+
+        counts = np.zeros((len(periods), self.base_num_bins), dtype='<u4')
+        sums = np.zeros((len(periods), self.base_num_bins), dtype='<f4') if with_values else None
+        sumsqs = np.zeros((len(periods), self.base_num_bins), dtype='<f4') if with_values else None
+        moments = np.zeros(len(periods), dtype='complex')
 
-        elif self.method == 'average value':
-            phases = np.remainder(data_as_seconds - t0, period) / period
-            bin_edges = np.histogram_bin_edges(phases, bins=self.num_bins, range=(0, 1))
-            bin_idxs = np.digitize(phases, bin_edges)
-            hist = np.zeros(self.num_bins)
+        for i in np.flatnonzero(derived):
+            counts[i] = _fold(fine_counts, k[i], self.base_num_bins)
+            if with_values:
+                sums[i] = _fold(fine_sums, k[i], self.base_num_bins)
+                sumsqs[i] = _fold(fine_sumsqs, k[i], self.base_num_bins)
+            moments[i] = fine_moments[k[i] - 1]
+
+        self.logger.info('  Derived %d sub-harmonics of period %g', np.count_nonzero(derived), base_period)
+
+        if not np.all(derived):
+            rest_counts, rest_sums, rest_sumsqs, moments[~derived] = \
+                    self.calculate_base_statistics(periods[~derived], with_values=with_values)
+            counts[~derived] = rest_counts
+            if with_values:
+                sums[~derived], sumsqs[~derived] = rest_sums, rest_sumsqs
+
+        return counts, sums, sumsqs, moments
 
-            for i in range(1, self.num_bins + 1):
-                hist[i-1] = self.values[bin_idxs == i].mean()
 
-            return hist
+    def histograms_from_statistics(self, counts, sums, sumsqs):
+        '''
+        Normalized histograms with `num_bins` bins for the current display
+        attribute, and their entropies, from base statistics. The sums and
+        sums of squares are not used (and may be None) for "count".
+        '''
+        # sum adjacent bins of the base resolution (or of any resolution
+        # that `num_bins` divides)
+        factor = counts.shape[1] // self.num_bins
+        shape = (counts.shape[0], self.num_bins, factor)
+
+        def binned(arr):
+            return arr.reshape(shape).sum(axis=2, dtype='float')
+
+        counts = binned(counts)
 
-        elif self.method == 'variance':
-            phases = np.remainder(data_as_seconds - t0, period) / period
-            bin_edges = np.histogram_bin_edges([], bins=self.num_bins, range=(0, 1))
-            bin_idxs = np.digitize(phases, bin_edges)
-            hist = np.zeros(self.num_bins)
-            for i in range(1, self.num_bins + 1):
-                hist[i-1] = self.values[bin_idxs == i].var()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if self.method == 'count':
+                hists = counts
+
+            elif self.method == 'average value':
+                hists = self.value_shift + binned(sums) / counts
+
+            elif self.method == 'variance':
+                # the sums are relative to `value_shift`, which keeps the
+                # cancellation small; rounding can still make it negative
+                means = binned(sums) / counts
+                hists = np.maximum(binned(sumsqs) / counts - means ** 2, 0)
+
+            ents = entropy(hists, base=2, axis=1)
+
+        totals = np.nansum(hists, axis=1)
+        totals[np.isnan(totals) | (totals == 0)] = 1
+
+        return (hists / totals[:, np.newaxis]).astype('<f4'), ents.astype('<f4')
+
+
+    def metrics_from_statistics(self, counts, moments):
+        '''Values of the selected quality metrics, from base statistics.'''
+        return quality_metrics.evaluate(self.metrics, dict(counts=counts, moments=moments), self.num_bins)
+
+
+    def update_histograms(self):
+        '''
+        Histograms, entropies and metric values of the period grid for the
+        current display attribute and number of bins. With pages, periods
+        on pages that have not been calculated have NaN values. The value
+        statistics are calculated when a display attribute first needs them.
+        '''
+        with_values = self.method != 'count'
+
+        if self.page_size is None:
+            if with_values and self.base_statistics[1] is None:
+                self.logger.info('Calculating value statistics for "%s"', self.method)
+                _, sums, sumsqs, _ = self.calculate_base_statistics(self.periods, with_moments=False)
+                self.base_statistics = (self.base_statistics[0], sums, sumsqs)
+
+            self.hists, self.ents = self.histograms_from_statistics(*self.base_statistics)
+            self.metric_values = self.metrics_from_statistics(self.base_statistics[0], self.moments)
+            return
+
+        missing = [ page for page, statistics in self.pages.items() if statistics[1] is None ]
+        if with_values and len(missing) > 0:
+            self.logger.info('Calculating value statistics of period pages for "%s"', self.method)
+            self.pages.update(self._page_statistics(missing))
+
+        num_periods = len(self.periods)
+        hists = np.full((num_periods, self.num_bins), np.nan, dtype='<f4')
+        ents = np.full(num_periods, np.nan, dtype='<f4')
+        metric_values = { k: np.full(num_periods, np.nan, dtype='<f4') for k in self.metrics }
+
+        for page, (counts, sums, sumsqs) in self.pages.items():
+            start, end = self._page_range(page)
+            hists[start:end], ents[start:end] = self.histograms_from_statistics(counts, sums, sumsqs)
+            for k, v in self.metrics_from_statistics(counts, self.moments[start:end]).items():
+                metric_values[k][start:end] = v
+
+        self.hists, self.ents, self.metric_values = hists, ents, metric_values
+
+
+    def _page_range(self, page):
+        '''Indices [start, end) of the periods on `page`.'''
+        return page * self.page_size, min((page + 1) * self.page_size, len(self.periods))
+
+
+    def calculate_pages(self, pages):
+        '''
+        Base statistics of those of `pages` that have not been calculated,
+        in one pass over the events, and the histograms of all calculated
+        pages.
+        '''
+        missing = sorted(set(pages) - set(self.pages))
+        if len(missing) == 0:
+            return
 
-            return hist
+        self.logger.info('Calculating period pages %s', ', '.join(str(page) for page in missing))
+        self.pages.update(self._page_statistics(missing))
+        self.update_histograms()
 
 
-        else:
-            self.logger.error('no such method: "%s"', self.method)
+    def _page_statistics(self, pages):
+        '''Base statistics of `pages` by page, in one pass over the events.'''
+        ranges = [ self._page_range(page) for page in pages ]
+        periods = np.concatenate([ self.periods[start:end] for start, end in ranges ])
+        statistics = self.calculate_base_statistics(periods, with_moments=False)[:3]
+
+        result = dict()
+        offset = 0
+        for page, (start, end) in zip(pages, ranges):
+            length = end - start
+            result[page] = tuple(None if arr is None else arr[offset:offset + length] for arr in statistics)
+            offset += length
+
+        return result
+
+
+    def prefetch_page(self, stop=None):
+        '''
+        Calculate the next page queued by `period_page_websocket_data`, in
+        slices of `prefetch_slice_size` periods. If `stop` returns True
+        after a slice, the page stays queued, and the next call continues
+        with its next slice.
+        '''
+        page = self.prefetch[0]
+        if page in self.pages:
+            self.prefetch.pop(0)
+            return
+
+        if self.prefetch_partial is None or self.prefetch_partial[0] != page:
+            self.logger.info('Prefetching period page %d', page)
+            self.prefetch_partial = (page, [])
+
+        slices = self.prefetch_partial[1]
+        start, end = self._page_range(page)
+        for slice_start in range(start + prefetch_slice_size * len(slices), end, prefetch_slice_size):
+            slice_end = min(slice_start + prefetch_slice_size, end)
+            slices.append(self.calculate_base_statistics(self.periods[slice_start:slice_end], with_moments=False)[:3])
+
+            if slice_end < end and stop is not None and stop():
+                return
+
+        # slices calculated before a change of the display attribute may lack the value statistics
+        self.pages[page] = tuple(None if any(arr is None for arr in statistics) else np.concatenate(statistics)
+                for statistics in zip(*slices))
+        self.prefetch.pop(0)
+        self.prefetch_partial = None
+        self.update_histograms()
 
 
     def precalculate_binning(self):
@@ -189,13 +853,788 @@ class Dataset:
         # XXX: take min_period as the bin size
         min_period = self.min_period
         num_bins = math.ceil(self.dt / min_period)
-        bins, _ = np.histogram(self.ts - self.t0, bins=num_bins, range=(0, num_bins * min_period))
+        bins = np.zeros(num_bins)
+        for t, weights, _, _ in self.weighted_event_chunks():
+            bins += np.histogram(t, bins=num_bins, range=(0, num_bins * min_period), weights=weights)[0]
         bins = bins.astype('<f4') / max(np.max(bins), 1)
 
         self.binning = bins
         self.binning_bin_size = min_period
 
 
+    def calculate_period_raster(self, width, height):
+        '''
+        Dominant period per cell of a width x height grid over the spatial
+        extent of the data. For each cell, the period of the period grid
+        with the lowest entropy of the count histogram is chosen. Returns
+        (periods, entropies, vectorstrengths, counts), each with one value per
+        cell in row-major order; cells without events have NaN values.
+        '''
+        key = (width, height, self.num_bins)
+        if key in self.period_rasters:
+            return self.period_rasters[key]
+
+        self.logger.info('Calculating period raster of %dx%d cells', width, height)
+
+        num_cells = width * height
+        x0, x_extent = self.xs.min(), max(np.ptp(self.xs), 1e-12)
+        y0, y_extent = self.ys.min(), max(np.ptp(self.ys), 1e-12)
+        span = int(self.dt) + 1
+
+        def cell_event_chunks():
+            for ts, xs, ys, _ in self.event_chunks():
+                cx = np.floor((xs - x0) / x_extent * width).astype('int64')
+                cy = np.floor((ys - y0) / y_extent * height).astype('int64')
+                cells = np.clip(cy, 0, height - 1) * width + np.clip(cx, 0, width - 1)
+
+                # collapse events with the same cell and timestamp into weighted events
+                pairs, weights = np.unique(cells * span + (ts - self.t0), return_counts=True)
+                yield pairs // span, (pairs % span).astype('float'), weights.astype('float')
+
+        chunks = _Chunks(cell_event_chunks, self.chunk_size is None)
+        chunk_length = self.chunk_size or max(len(t) for _, t, _ in chunks)
+
+        counts = np.zeros(num_cells, dtype='int64')
+        for cells, _, weights in chunks:
+            counts += np.bincount(cells, weights=weights, minlength=num_cells).astype('int64')
+
+        best_periods = np.full(num_cells, np.nan)
+        best_entropies = np.full(num_cells, np.inf)
+        best_vecs = np.full(num_cells, np.nan)
+
+        # all histograms of a block of periods from one bincount per chunk,
+        # with the index of (period in block, cell, bin)
+        block_size = max(1, max_block_elements // max(chunk_length, num_cells * self.num_bins, 1))
+        for start in range(0, len(self.periods), block_size):
+            periods = self.periods[start:start + block_size]
+            num_periods = len(periods)
+
+            hists = np.zeros(num_periods * num_cells * self.num_bins)
+            cos = np.zeros(num_periods * num_cells)
+            sin = np.zeros(num_periods * num_cells)
+            for cells, t, weights in chunks:
+                scheduler.checkpoint()
+
+                phases = np.remainder(t[np.newaxis, :], periods[:, np.newaxis]) / periods[:, np.newaxis]
+                bins = np.minimum((phases * self.num_bins).astype('int64'), self.num_bins - 1)
+                period_cells = np.arange(num_periods)[:, np.newaxis] * num_cells + cells[np.newaxis, :]
+
+                block_weights = np.broadcast_to(weights, bins.shape).ravel()
+                hists += np.bincount((period_cells * self.num_bins + bins).ravel(), weights=block_weights, minlength=hists.size)
+
+                angles = 2 * np.pi * phases
+                cos += np.bincount(period_cells.ravel(), weights=(weights * np.cos(angles)).ravel(), minlength=cos.size)
+                sin += np.bincount(period_cells.ravel(), weights=(weights * np.sin(angles)).ravel(), minlength=sin.size)
+
+            hists = hists.reshape(num_periods, num_cells, self.num_bins)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                ents = entropy(hists, base=2, axis=2)
+
+            with np.errstate(invalid='ignore', divide='ignore'):
+                vecs = np.hypot(cos, sin).reshape(num_periods, num_cells) / counts[np.newaxis, :]
+
+            # first period with lowest entropy per cell
+            ents = np.where(np.isnan(ents), np.inf, ents)
+            idx = np.argmin(ents, axis=0)
+            block_best = ents[idx, np.arange(num_cells)]
+            better = block_best < best_entropies
+
+            best_entropies[better] = block_best[better]
+            best_periods[better] = periods[idx[better]]
+            best_vecs[better] = vecs[idx[better], np.arange(num_cells)[better]]
+
+        best_entropies[np.isinf(best_entropies)] = np.nan
+
+        raster = (best_periods, best_entropies, best_vecs, counts)
+        self.period_rasters[key] = raster
+
+        return raster
+
+
+    def period_raster_websocket_data(self, width, height, requestId):
+        periods, ents, vecs, counts = self.calculate_period_raster(width, height)
+
+        b = b''
+
+        # message type: 4
+        dataset_type = np.zeros(1, dtype='<u4')
+        dataset_type[0] = 4
+
+        # requestId
+        request_id = np.zeros(1, dtype='<u4')
+        request_id[0] = requestId
+
+        metadata = dict(
+            width=width,
+            height=height,
+            xDomain=[float(self.xs.min()), float(self.xs.max())],
+            yDomain=[float(self.ys.min()), float(self.ys.max())],
+            numBins=self.num_bins,
+                )
+
+        metadata_bytes = json.dumps(metadata).encode()
+        metadata_length = len(metadata_bytes)
+
+        # metadata size
+        metadata_size = np.zeros(1, dtype='<u4')
+        metadata_size[0] = metadata_length
+
+        b += dataset_type.tobytes()
+        b += request_id.tobytes()
+        b += metadata_size.tobytes()
+        b += metadata_bytes
+
+        # best periods
+        b += periods.astype('<f4').tobytes()
+
+        # entropies
+        b += ents.astype('<f4').tobytes()
+
+        # vectorstrengths
+        b += vecs.astype('<f4').tobytes()
+
+        # event counts
+        b += counts.astype('<u4').tobytes()
+
+        return b
+
+
+    def calculate_spectrogram(self, width, stride):
+        '''
+        Entropy and vector strength per window and period for windows of
+        `width` seconds, starting every `stride` seconds at t0. Only periods
+        of at most `width` are included. Returns (window starts, periods,
+        entropies, vectorstrengths, counts), where entropies and
+        vectorstrengths have the shape (windows, periods).
+
+        The histograms are not recomputed for each window. Instead, each
+        event adds to the histogram of the window in which it enters and
+        subtracts from the one in which it leaves, and a cumulative sum over
+        the windows yields the histograms of all windows.
+        '''
+        key = (width, stride, self.num_bins)
+        if key in self.spectrograms:
+            return self.spectrograms[key]
+
+        num_windows = max(1, math.floor((self.dt - width) / stride) + 1)
+        starts = self.t0 + np.arange(num_windows) * stride
+        periods = self.periods[self.periods <= width]
+        num_periods = len(periods)
+
+        self.logger.info('Calculating spectrogram with %d windows and %d periods', num_windows, num_periods)
+
+        def window_event_chunks():
+            for t, weights, _, _ in self.weighted_event_chunks():
+                # window in which each event enters and leaves (num_windows: never)
+                enter = np.searchsorted(starts + width, t + self.t0, side='right')
+                leave = np.searchsorted(starts, t + self.t0, side='right')
+                in_window = enter < leave
+                yield enter[in_window], leave[in_window], t[in_window].astype('float'), weights[in_window]
+
+        chunks = _Chunks(window_event_chunks, self.chunk_size is None)
+        chunk_length = self.chunk_size or max(len(t) for _, _, t, _ in chunks)
+
+        counts = np.zeros(num_windows + 1)
+        for enter, leave, _, weights in chunks:
+            counts += np.bincount(enter, weights=weights, minlength=num_windows + 1) - np.bincount(leave, weights=weights, minlength=num_windows + 1)
+        counts = np.cumsum(counts)[:num_windows].astype('int64')
+
+        ents = np.zeros((num_windows, num_periods))
+        vecs = np.zeros((num_windows, num_periods))
+
+        # enter and leave events of a chunk are counted separately, each into
+        # a histogram of (window, period in block, bin)
+        block_size = max(1, max_block_elements // (2 * max(chunk_length, (num_windows + 1) * self.num_bins, 1)))
+        for start in range(0, num_periods, block_size):
+            block = periods[start:start + block_size]
+            num_block = len(block)
+
+            # index of (window, period in block) and (window, period in block, bin)
+            block_index = np.arange(num_block)[np.newaxis, :]
+            size = (num_windows + 1) * num_block
+
+            hist_deltas = np.zeros(size * self.num_bins)
+            cos_deltas = np.zeros(size)
+            sin_deltas = np.zeros(size)
+            for enter, leave, t, weights in chunks:
+                scheduler.checkpoint()
+
+                phases = np.remainder(t[np.newaxis, :], block[:, np.newaxis]) / block[:, np.newaxis]
+                bins = np.minimum((phases * self.num_bins).astype('int64'), self.num_bins - 1)
+                angles = 2 * np.pi * phases
+
+                def deltas(windows, weights=None):
+                    index = windows[:, np.newaxis] * num_block + block_index
+                    return np.bincount(index.ravel(), weights=weights, minlength=size)
+
+                block_weights = np.broadcast_to(weights[:, np.newaxis], (len(t), num_block)).ravel()
+
+                def bin_deltas(windows):
+                    index = (windows[:, np.newaxis] * num_block + block_index) * self.num_bins + bins.T
+                    return np.bincount(index.ravel(), weights=block_weights, minlength=size * self.num_bins)
+
+                hist_deltas += bin_deltas(enter) - bin_deltas(leave)
+                cos = (weights[:, np.newaxis] * np.cos(angles).T).ravel()
+                sin = (weights[:, np.newaxis] * np.sin(angles).T).ravel()
+                cos_deltas += deltas(enter, cos) - deltas(leave, cos)
+                sin_deltas += deltas(enter, sin) - deltas(leave, sin)
+
+            hists = np.cumsum(hist_deltas.reshape(num_windows + 1, num_block, self.num_bins), axis=0)
+            cos_sums = np.cumsum(cos_deltas.reshape(num_windows + 1, num_block), axis=0)
+            sin_sums = np.cumsum(sin_deltas.reshape(num_windows + 1, num_block), axis=0)
+
+            with np.errstate(invalid='ignore', divide='ignore'):
+                ents[:, start:start + num_block] = entropy(hists[:num_windows], base=2, axis=2)
+                vecs[:, start:start + num_block] = np.hypot(cos_sums, sin_sums)[:num_windows] / counts[:, np.newaxis]
+
+        spectrogram = (starts, periods, ents, vecs, counts)
+        self.spectrograms[key] = spectrogram
+
+        return spectrogram
+
+
+    def spectrogram_websocket_data(self, width, stride, requestId):
+        starts, periods, ents, vecs, counts = self.calculate_spectrogram(width, stride)
+
+        b = b''
+
+        # message type: 5
+        dataset_type = np.zeros(1, dtype='<u4')
+        dataset_type[0] = 5
+
+        # requestId
+        request_id = np.zeros(1, dtype='<u4')
+        request_id[0] = requestId
+
+        metadata = dict(
+            windowCount=len(starts),
+            periodCount=len(periods),
+            windowWidth=width,
+            windowStride=stride,
+            firstWindowStart=int(starts[0]),
+                )
+
+        metadata_bytes = json.dumps(metadata).encode()
+        metadata_length = len(metadata_bytes)
+
+        # metadata size
+        metadata_size = np.zeros(1, dtype='<u4')
+        metadata_size[0] = metadata_length
+
+        b += dataset_type.tobytes()
+        b += request_id.tobytes()
+        b += metadata_size.tobytes()
+        b += metadata_bytes
+
+        # entropies
+        b += ents.astype('<f4').tobytes()
+
+        # vectorstrengths
+        b += vecs.astype('<f4').tobytes()
+
+        # periods
+        b += periods.astype('<f4').tobytes()
+
+        # event counts per window
+        b += counts.astype('<u4').tobytes()
+
+        return b
+
+
+    def _group_event_chunks(self, selected):
+        '''
+        Chunks of the events of the groups `selected` (group indices) for
+        `_set_statistic_blocks`, with the position of the group among the
+        selected ones as set, and the maximum chunk length.
+        '''
+        span = int(self.dt) + 1
+
+        # position of each group among the selected ones, or -1
+        position = np.full(len(self.group_keys), -1, dtype='int64')
+        position[selected] = np.arange(len(selected))
+
+        def group_event_chunks():
+            offset = 0
+            for ts, _, _, values in self.event_chunks():
+                groups = position[np.asarray(self.groups[offset:offset + len(ts)])]
+                offset += len(ts)
+                selected_events = groups >= 0
+
+                # collapse events with the same group and timestamp into weighted events
+                pairs, inverse, weights = np.unique(groups[selected_events] * span + (ts[selected_events] - self.t0),
+                        return_inverse=True, return_counts=True)
+                values = values[selected_events].astype('float') - self.value_shift
+                sums = np.bincount(inverse, weights=values, minlength=len(pairs))
+                sumsqs = np.bincount(inverse, weights=values ** 2, minlength=len(pairs))
+                yield pairs // span, (pairs % span).astype('float'), weights.astype('float'), sums, sumsqs
+
+        chunks = _Chunks(group_event_chunks, self.chunk_size is None)
+        return chunks, self.chunk_size or max((len(t) for _, t, _, _, _ in chunks), default=0)
+
+
+    def _set_statistic_blocks(self, chunks, num_sets, chunk_length, periods=None):
+        '''
+        Counts, sums and sums of squares of the values per phase bin at the
+        displayed resolution, and first circular moments, for each of
+        `num_sets` sets of weighted events (e.g., groups) and each of
+        `periods` (default: the period grid). `chunks` yields (set, times
+        relative to t0, weights, value sums, sums of squared values) per
+        weighted event, in chunks of at most `chunk_length`.
+
+        For each block of periods, the statistics of all sets are
+        accumulated in one pass over the chunks, with one bincount per chunk
+        over the index of (period in block, set, bin). Yields (index of the
+        first period of the block, counts, sums, sumsqs, moments), with the
+        shapes (periods in block, sets, bins) and (periods in block, sets).
+        Sums and sums of squares stay 0 for the "count" display attribute,
+        which does not use them. The moments are summed from single
+        precision cosines and sines, which is exact to the precision of the
+        vector strengths that are sent.
+        '''
+        num_bins = self.num_bins
+        periods = self.periods if periods is None else periods
+        with_values = self.method != 'count'
+
+        block_size = max(1, max_block_elements // max(chunk_length, num_sets * num_bins, 1))
+        for start in range(0, len(periods), block_size):
+            block = periods[start:start + block_size]
+            frequencies = 1 / block
+            num_periods = len(block)
+            size = num_periods * num_sets
+
+            counts = np.zeros(size * num_bins)
+            sums = np.zeros(size * num_bins)
+            sumsqs = np.zeros(size * num_bins)
+            cos = np.zeros(size)
+            sin = np.zeros(size)
+            for sets, t, weights, chunk_sums, chunk_sumsqs in chunks:
+                scheduler.checkpoint()
+
+                cycles = t[np.newaxis, :] * frequencies[:, np.newaxis]
+                phases = cycles - np.floor(cycles)
+                bins = np.minimum((phases * num_bins).astype('int64'), num_bins - 1)
+                period_sets = (np.arange(num_periods)[:, np.newaxis] * num_sets + sets[np.newaxis, :]).ravel()
+                index = period_sets * num_bins + bins.ravel()
+
+                def bin_sums(w):
+                    return np.bincount(index, weights=np.broadcast_to(w, bins.shape).ravel(), minlength=size * num_bins)
+
+                counts += bin_sums(weights)
+                if with_values:
+                    sums += bin_sums(chunk_sums)
+                    sumsqs += bin_sums(chunk_sumsqs)
+
+                angles = (2 * np.pi * phases).astype('<f4')
+                cos += np.bincount(period_sets, weights=(weights * np.cos(angles)).ravel(), minlength=size)
+                sin += np.bincount(period_sets, weights=(weights * np.sin(angles)).ravel(), minlength=size)
+
+            shape = (num_periods, num_sets, num_bins)
+            counts = counts.reshape(shape)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                moments = (cos + 1j * sin).reshape(shape[:2]) / counts.sum(axis=2)
+
+            yield start, counts, sums.reshape(shape), sumsqs.reshape(shape), moments
+
+
+    def _set_histogram_blocks(self, chunks, num_sets, chunk_length, periods=None):
+        '''
+        Histograms, entropies, vector strengths and metric values for the
+        current display attribute per block of `_set_statistic_blocks`,
+        with the shapes (sets, periods in block, bins) and (sets, periods in
+        block), and the event counts of the sets. The metrics are evaluated
+        at the displayed resolution.
+        '''
+        for start, counts, sums, sumsqs, moments in self._set_statistic_blocks(chunks, num_sets, chunk_length, periods):
+            num_periods, num_sets, num_bins = counts.shape
+            flat = [ arr.transpose(1, 0, 2).reshape(-1, num_bins) for arr in (counts, sums, sumsqs) ]
+            moments = moments.T.ravel()
+
+            hists, ents = self.histograms_from_statistics(*flat)
+            vecs = np.abs(moments).astype('<f4')
+            metric_values = self.metrics_from_statistics(flat[0], moments)
+
+            shape = (num_sets, num_periods)
+            yield start, hists.reshape(*shape, num_bins), ents.reshape(shape), vecs.reshape(shape), \
+                    { k: v.reshape(shape) for k, v in metric_values.items() }, counts[0].sum(axis=1)
+
+
+    def _best_entropies(self, ents, start=0):
+        '''
+        Lowest entropy per group of `ents` (shape (groups, periods), for the
+        periods from index `start`) and its period; inf and NaN for groups
+        without any entropy.
+        '''
+        ents = np.where(np.isnan(ents), np.inf, ents)
+        idx = np.argmin(ents, axis=1)
+        best_entropies = ents[np.arange(len(ents)), idx].astype('float')
+        best_periods = np.where(np.isinf(best_entropies), np.nan, self.periods[start + idx])
+
+        return best_entropies, best_periods
+
+
+    def _expected_entropies(self, counts):
+        '''
+        Expected entropy of the count histogram of each of `counts` events
+        with uniformly random phases, which is lower for fewer events.
+        '''
+        expected = np.zeros(len(counts))
+        p = 1 / self.num_bins
+        for n in np.unique(counts[counts > 0]).tolist():
+            # the bin counts are binomial; bins further than 12 standard
+            # deviations from the mean do not contribute
+            spread = 12 * math.sqrt(n * p * (1 - p)) + 1
+            k = np.arange(max(1, math.floor(n * p - spread)), min(n, math.ceil(n * p + spread)) + 1)
+            expected[counts == n] = -self.num_bins * np.sum(binom.pmf(k, n, p) * k / n * np.log2(k / n))
+
+        return expected
+
+
+    def _rank_groups(self, best_entropies, counts):
+        '''
+        Group indices by ascending best entropy relative to the entropy
+        expected for their event count, groups with fewer than
+        `min_ranked_group_events` events and then groups without any entropy
+        last.
+        '''
+        with np.errstate(invalid='ignore', divide='ignore'):
+            scores = best_entropies / self._expected_entropies(counts)
+
+        scores[~np.isfinite(scores)] = np.inf
+        return np.lexsort((scores, counts < min_ranked_group_events))
+
+
+    def calculate_group_ranking(self):
+        '''
+        Ranking of the groups by their best (lowest) entropy over the period
+        grid, for the current display attribute and number of bins. Returns
+        (group indices in rank order, event counts, best entropies, best
+        periods), the latter three by group index; groups without any
+        entropy have NaN values.
+        '''
+        key = (self.num_bins, self.method)
+        if key in self.group_rankings:
+            return self.group_rankings[key]
+
+        num_groups = len(self.group_keys)
+        self.logger.info('Ranking %d groups', num_groups)
+
+        best_entropies = np.full(num_groups, np.inf)
+        best_periods = np.full(num_groups, np.nan)
+        chunks, chunk_length = self._group_event_chunks(np.arange(num_groups))
+        for start, _, ents, _, _, counts in self._set_histogram_blocks(chunks, num_groups, chunk_length):
+            block_entropies, block_periods = self._best_entropies(ents, start)
+            better = block_entropies < best_entropies
+
+            best_entropies[better] = block_entropies[better]
+            best_periods[better] = block_periods[better]
+
+        best_entropies[np.isinf(best_entropies)] = np.nan
+
+        counts = counts.astype('int64')
+        ranking = (self._rank_groups(best_entropies, counts), counts, best_entropies, best_periods)
+        self.group_rankings[key] = ranking
+
+        return ranking
+
+
+    def calculate_group_histograms(self, selected):
+        '''
+        Histograms, entropies, vector strengths and metric values for the
+        current display attribute of the groups `selected` (group indices)
+        and all periods of the period grid, with the shapes (groups,
+        periods, bins) and (groups, periods), and the event counts of the
+        groups.
+        '''
+        num_periods = len(self.periods)
+        shape = (len(selected), num_periods)
+
+        hists = np.zeros((*shape, self.num_bins), dtype='<f4')
+        ents = np.zeros(shape, dtype='<f4')
+        vecs = np.zeros(shape, dtype='<f4')
+        metric_values = { k: np.zeros(shape, dtype='<f4') for k in self.metrics }
+
+        self.logger.info('Calculating histograms of %d groups for %d periods', len(selected), num_periods)
+        chunks, chunk_length = self._group_event_chunks(selected)
+        for start, block_hists, block_ents, block_vecs, block_metrics, counts in self._set_histogram_blocks(chunks, len(selected), chunk_length):
+            end = start + block_ents.shape[1]
+            hists[:, start:end] = block_hists
+            ents[:, start:end] = block_ents
+            vecs[:, start:end] = block_vecs
+            for k, v in block_metrics.items():
+                metric_values[k][:, start:end] = v
+
+        return hists, ents, vecs, metric_values, counts.astype('int64')
+
+
+    def groups_websocket_data(self, requestId, top_k=None):
+        '''
+        GROUPS message with the results of the `top_k` best-ranked groups
+        (all groups if None), see README.md.
+        '''
+        num_groups = len(self.group_keys)
+        key = (self.num_bins, self.method)
+        if (top_k is None or top_k >= num_groups) and key not in self.group_rankings:
+            # all groups: rank them from the same pass that calculates their histograms
+            hists, ents, vecs, metric_values, counts = self.calculate_group_histograms(np.arange(num_groups))
+
+            best_entropies, best_periods = self._best_entropies(ents)
+            best_entropies[np.isinf(best_entropies)] = np.nan
+
+            order = self._rank_groups(best_entropies, counts)
+            self.group_rankings[key] = (order, counts, best_entropies, best_periods)
+
+            hists, ents, vecs = hists[order], ents[order], vecs[order]
+            metric_values = { k: v[order] for k, v in metric_values.items() }
+
+        else:
+            order, counts, best_entropies, best_periods = self.calculate_group_ranking()
+            order = order[:top_k]
+            hists, ents, vecs, metric_values, _ = self.calculate_group_histograms(order)
+
+        b = b''
+
+        # message type: 10
+        dataset_type = np.zeros(1, dtype='<u4')
+        dataset_type[0] = 10
+
+        # requestId
+        request_id = np.zeros(1, dtype='<u4')
+        request_id[0] = requestId
+
+        metadata = dict(
+            groupCount=len(order),
+            totalGroupCount=num_groups,
+            groups=[ self.group_keys[i] for i in order ],
+            periodCount=len(self.periods),
+            numBins=self.num_bins,
+            metrics=self.metrics,
+                )
+
+        metadata_bytes = json.dumps(metadata).encode()
+        metadata_length = len(metadata_bytes)
+
+        # metadata size
+        metadata_size = np.zeros(1, dtype='<u4')
+        metadata_size[0] = metadata_length
+
+        b += dataset_type.tobytes()
+        b += request_id.tobytes()
+        b += metadata_size.tobytes()
+        b += metadata_bytes
+
+        # event counts
+        b += counts[order].astype('<u4').tobytes()
+
+        # best entropies
+        b += best_entropies[order].astype('<f4').tobytes()
+
+        # best periods
+        b += best_periods[order].astype('<f4').tobytes()
+
+        # histograms
+        b += hists.tobytes()
+
+        # entropies
+        b += ents.tobytes()
+
+        # vectorstrengths
+        b += vecs.tobytes()
+
+        # quality metrics, in the order of the metadata
+        for k in self.metrics:
+            b += metric_values[k].tobytes()
+
+        return b
+
+
+    def _surrogate_event_chunks(self, surrogates, method, seed, jitter_width, with_data=False):
+        '''
+        Chunks of the weighted events of the surrogate event sets
+        `surrogates` (indices) for `_set_statistic_blocks`, with the position
+        of the surrogate among `surrogates` as set, and the maximum chunk
+        length. With `with_data`, the events themselves follow as the last
+        set. Surrogate i of chunk c is generated from the seed (seed, i, c),
+        so it is the same in each pass over the chunks and does not depend
+        on the surrogates it is calculated with.
+
+        "shuffle" surrogates permute the intervals between the unique times
+        of a chunk, which keeps the interval distribution, the event count
+        and the time extent of the chunk. "jitter" surrogates move each time
+        to a uniformly random time in its bin of `jitter_width`, which keeps
+        the event rate at that scale.
+        '''
+        def surrogate_event_chunks():
+            for chunk, (t, weights, sums, sumsqs) in enumerate(self.weighted_event_chunks()):
+                if len(t) == 0:
+                    continue
+
+                t = t.astype('float')
+                times = []
+                for i in surrogates:
+                    rng = np.random.default_rng([seed, i, chunk])
+                    if method == 'shuffle':
+                        times.append(t[0] + np.concatenate(([0], np.cumsum(rng.permutation(np.diff(t))))))
+                    else:
+                        times.append(np.floor(t / jitter_width) * jitter_width + rng.uniform(0, jitter_width, len(t)))
+
+                if with_data:
+                    times.append(t)
+
+                n = len(times)
+                yield np.repeat(np.arange(n), len(t)), np.concatenate(times), np.tile(weights, n), np.tile(sums, n), \
+                        np.tile(sumsqs, n)
+
+        chunks = _Chunks(surrogate_event_chunks, self.chunk_size is None)
+        return chunks, (len(surrogates) + with_data) * (self.chunk_size or len(self.unique_ts))
+
+
+    def calculate_significance(self, count, method='shuffle', seed=0, time_budget=None, jitter_width=None, progress=None):
+        '''
+        Significance of the entropies and vector strengths of the period
+        grid (for the current display attribute and number of bins) against
+        `count` surrogate event sets, see `_surrogate_event_chunks`. The
+        surrogates are swept over the periods in batches of
+        `surrogate_batch_size`; with pages, only over the periods of the
+        pages that have been calculated. The entropies and vector strengths
+        of the data are calculated in the same way, together with the first
+        batch. The sweep stops after `time_budget` seconds (None: no limit),
+        and only the completed batches are used; `progress` is called with
+        the number of completed surrogates after each batch.
+
+        Returns (number of completed surrogates, entropy p-values, entropy
+        z-scores, vector strength p-values, vector strength z-scores), with
+        one value per period, NaN for periods that are not swept. Low entropies and high vector strengths are
+        significant: the p-value is the fraction of the surrogates and the
+        data itself with an entropy at most (a vector strength at least)
+        that of the data, and the z-score is the number of surrogate
+        standard deviations by which the data is below (above) the surrogate
+        mean.
+        '''
+        if method not in surrogate_methods:
+            raise ValueError(F'no such surrogate method: "{method}"')
+
+        jitter_width = self.binning_bin_size if jitter_width is None else jitter_width
+        deadline = None if time_budget is None else time.monotonic() + time_budget
+
+        self.logger.info('Calculating significance against %d %s surrogates', count, method)
+
+        # with pages, the periods of the calculated pages
+        swept = np.arange(len(self.periods)) if self.page_size is None else np.flatnonzero(~np.isnan(self.ents))
+        periods = self.periods[swept]
+        num_periods = len(periods)
+
+        data_ents = np.full(num_periods, np.nan, dtype='<f4')
+        data_vecs = np.full(num_periods, np.nan, dtype='<f4')
+        surrogate_ents = np.zeros((count, num_periods), dtype='<f4')
+        surrogate_vecs = np.zeros((count, num_periods), dtype='<f4')
+        completed = 0
+        while completed < count:
+            surrogates = np.arange(completed, min(completed + surrogate_batch_size, count))
+            with_data = completed == 0
+            chunks, chunk_length = self._surrogate_event_chunks(surrogates, method, seed, jitter_width, with_data)
+
+            timed_out = False
+            for start, _, ents, vecs, _, _ in self._set_histogram_blocks(chunks, len(surrogates) + with_data,
+                    chunk_length, periods):
+                if deadline is not None and time.monotonic() > deadline:
+                    timed_out = True
+                    break
+
+                end = start + ents.shape[1]
+                surrogate_ents[surrogates, start:end] = ents[:len(surrogates)]
+                surrogate_vecs[surrogates, start:end] = vecs[:len(surrogates)]
+                if with_data:
+                    data_ents[start:end] = ents[-1]
+                    data_vecs[start:end] = vecs[-1]
+
+            if timed_out:
+                self.logger.info('  Time budget exhausted after %d surrogates', completed)
+                break
+
+            completed += len(surrogates)
+            if progress is not None:
+                progress(completed)
+
+        surrogate_ents = surrogate_ents[:completed]
+        surrogate_vecs = surrogate_vecs[:completed]
+
+        ent_pvalues, ent_zscores, vec_pvalues, vec_zscores = np.full((4, len(self.periods)), np.nan)
+        ent_pvalues[swept] = (1 + np.count_nonzero(surrogate_ents <= data_ents, axis=0)) / (completed + 1)
+        vec_pvalues[swept] = (1 + np.count_nonzero(surrogate_vecs >= data_vecs, axis=0)) / (completed + 1)
+
+        # periods without entropy, e.g., without any value for the display attribute
+        ent_pvalues[swept[np.isnan(data_ents)]] = np.nan
+
+        if completed > 0:
+            with np.errstate(invalid='ignore', divide='ignore'):
+                ent_zscores[swept] = (surrogate_ents.mean(axis=0) - data_ents) / surrogate_ents.std(axis=0)
+                vec_zscores[swept] = (data_vecs - surrogate_vecs.mean(axis=0)) / surrogate_vecs.std(axis=0)
+
+        return completed, ent_pvalues, ent_zscores, vec_pvalues, vec_zscores
+
+
+    def significance_progress_websocket_data(self, requestId, completed, count):
+        '''SIGNIFICANCE PROGRESS message, see README.md.'''
+        metadata_bytes = json.dumps(dict(completed=completed, count=count)).encode()
+
+        header = np.zeros(3, dtype='<u4')
+        header[0] = 11  # message type 11: significance progress
+        header[1] = requestId
+        header[2] = len(metadata_bytes)
+
+        return header.tobytes() + metadata_bytes
+
+
+    def significance_websocket_data(self, requestId, count, method='shuffle', seed=0, time_budget=None,
+            jitter_width=None, progress=None):
+        completed, ent_pvalues, ent_zscores, vec_pvalues, vec_zscores = \
+                self.calculate_significance(count, method, seed, time_budget, jitter_width, progress)
+
+        b = b''
+
+        # message type: 12
+        dataset_type = np.zeros(1, dtype='<u4')
+        dataset_type[0] = 12
+
+        # requestId
+        request_id = np.zeros(1, dtype='<u4')
+        request_id[0] = requestId
+
+        metadata = dict(
+            surrogateCount=completed,
+            requestedCount=count,
+            timedOut=completed < count,
+            method=method,
+            seed=seed,
+            jitterWidth=self.binning_bin_size if jitter_width is None else jitter_width,
+            periodCount=len(self.periods),
+            numBins=self.num_bins,
+            attribute=self.method,
+                )
+
+        metadata_bytes = json.dumps(metadata).encode()
+        metadata_length = len(metadata_bytes)
+
+        # metadata size
+        metadata_size = np.zeros(1, dtype='<u4')
+        metadata_size[0] = metadata_length
+
+        b += dataset_type.tobytes()
+        b += request_id.tobytes()
+        b += metadata_size.tobytes()
+        b += metadata_bytes
+
+        # entropy p-values and z-scores
+        b += ent_pvalues.astype('<f4').tobytes()
+        b += ent_zscores.astype('<f4').tobytes()
+
+        # vector strength p-values and z-scores
+        b += vec_pvalues.astype('<f4').tobytes()
+        b += vec_zscores.astype('<f4').tobytes()
+
+        return b
+
+
     def to_json(self, outfile):
         self.logger.info('Writing JSON to output %s', outfile.name)
 
@@ -227,25 +1666,71 @@ class Dataset:
         json.dump(data, outfile)
 
 
-    def to_websocket_bytestring(self, message_type = 0):
-        b = b''
-
-        # message type
-        dataset_type = np.zeros(1, dtype='<u4')
-        dataset_type[0] = message_type
-
+    def _wire_array_bytes(self, name):
+        # arrays are stored in their wire types, so they are not converted here
+        if name == 'histograms':
+            return self.hists.tobytes()
+        if name == 'entropies':
+            return self.ents.tobytes()
+        if name == 'vectorstrengths':
+            return self.vecs.tobytes()
+        if name == 'periods':
+            return self.periods.astype('<f4').tobytes()
+        if name == 'xs':
+            return self.xs.tobytes()
+        if name == 'ys':
+            return self.ys.tobytes()
+        if name == 'values':
+            return self.values.tobytes()
+        if name == 'binning':
+            return self.binning.tobytes()
+        if name == 'ts':
+            return self.ts.view('<u4').tobytes()
+        if name == 'metrics':
+            # quality metrics, in the order of the metadata
+            return b''.join(self.metric_values[key].tobytes() for key in self.metrics)
+
+        raise ValueError(F'no such array: "{name}"')
+
+
+    def _websocket_metadata(self):
         metadata = dict(
             dataCount=len(self.xs),
             periodCount=len(self.periods),
             numBins=self.num_bins,
+            baseNumBins=self.base_num_bins,
             phaseDomain=[0,1],
             periodDomain=[self.min_period, int(self.dt)],
             temporalDomain=[int(self.t0), int(self.t1)],
             numBinningBins=len(self.binning),
             binningBinSize=self.binning_bin_size,
             temporalDomainScaling=self.scaling,
+            metrics=self.metrics,
+            pageSize=self.page_size,
+            groupCount=0 if self.group_keys is None else len(self.group_keys),
                 )
 
+        if self.session_token is not None:
+            metadata['sessionToken'] = self.session_token
+
+        return metadata
+
+
+    def to_websocket_bytestring(self, message_type = 0, columns=event_columns):
+        '''
+        BEGIN DATASET (or REPLACE DATASET) message, with only the per-event
+        arrays in `columns`, see README.md.
+        '''
+        b = b''
+
+        # message type
+        dataset_type = np.zeros(1, dtype='<u4')
+        dataset_type[0] = message_type
+
+        columns = [ name for name in event_columns if name in columns ]
+        metadata = self._websocket_metadata()
+        metadata['columns'] = columns
+
         metadata_bytes = json.dumps(metadata).encode()
         metadata_length = len(metadata_bytes)
 
@@ -257,39 +1742,104 @@ class Dataset:
         b += metadata_size.tobytes()
         b += metadata_bytes
 
-        # histograms
-        b += self.hists.flatten().astype('<f4').tobytes()
+        for name in wire_arrays:
+            if name in event_columns and name not in columns:
+                continue
 
-        # entropies
-        b += self.ents.astype('<f4').tobytes()
+            b += self._wire_array_bytes(name)
 
-        # vectorstrengths
-        b += self.vecs.astype('<f4').tobytes()
+        return b
 
-        # periods
-        b += self.periods.astype('<f4').tobytes()
 
-        # xs
-        b += self.xs.astype('<f4').tobytes()
+    def select_events(self, time_range=None, max_count=None):
+        '''
+        Indices of the events with times in `time_range` (start inclusive,
+        end exclusive; all events if None), subsampled to at most
+        `max_count` events by taking every n-th. Returns the indices, the
+        number of events in the time range, and n.
+        '''
+        if time_range is None:
+            index = np.arange(len(self.ts))
+        else:
+            start, end = time_range
+            index = []
+            offset = 0
+            for ts, _, _, _ in self.event_chunks():
+                index.append(offset + np.flatnonzero((ts >= start) & (ts < end)))
+                offset += len(ts)
+            index = np.concatenate(index) if len(index) > 0 else np.zeros(0, dtype='int64')
+
+        total = len(index)
+        stride = 1 if max_count is None or total <= max_count else math.ceil(total / max_count)
+
+        return index[::stride], total, stride
+
+
+    def columns_websocket_data(self, columns, requestId, time_range=None, max_count=None):
+        '''
+        COLUMNS message with the per-event arrays `columns` for the events
+        selected by `select_events`, see README.md.
+        '''
+        columns = [ name for name in event_columns if name in columns ]
+        index, total, stride = self.select_events(time_range, max_count)
+
+        self.logger.info('Sending %d of %d events for columns %s (request ID %d)', len(index), total, ', '.join(columns), requestId)
+
+        metadata = dict(
+            count=len(index),
+            totalCount=total,
+            stride=stride,
+            timeRange=None if time_range is None else list(time_range),
+            columns=columns,
+                )
+        metadata_bytes = json.dumps(metadata).encode()
 
-        # ys
-        b += self.ys.astype('<f4').tobytes()
+        header = np.zeros(3, dtype='<u4')
+        header[0] = 9  # message type 9: columns
+        header[1] = requestId
+        header[2] = len(metadata_bytes)
 
-        # values
-        b += self.values.astype('<f4').tobytes()
+        b = header.tobytes() + metadata_bytes
+        for name in columns:
+            if name == 'ts':
+                b += np.asarray(self.ts[index]).view('<u4').tobytes()
+            else:
+                b += np.asarray(getattr(self, name)[index]).tobytes()
 
-        # binning
-        b += self.binning.astype('<f4').tobytes()
+        return b
+
+
+    def to_partial_websocket_bytestring(self, arrays=replaced_arrays):
+        '''
+        PARTIAL REPLACE message with only the `arrays` (names from
+        `wire_arrays`), see README.md.
+        '''
+        header = np.zeros(3, dtype='<u4')
+        header[0] = 8  # message type 8: partial replace
+
+        for name in arrays:
+            header[1] |= 1 << wire_arrays.index(name)
+
+        metadata_bytes = json.dumps(self._websocket_metadata()).encode()
+        header[2] = len(metadata_bytes)
 
-        # ts
-        b += self.ts.astype('<u4').tobytes()
+        b = header.tobytes() + metadata_bytes
+        for i, name in enumerate(wire_arrays):
+            if header[1] & (1 << i):
+                b += self._wire_array_bytes(name)
 
         return b
 
 
-    def calculate_additional_websocket_data(self, periods, requestId):
+    def calculate_additional_websocket_data(self, periods, requestId, base_period=None):
         self.logger.info('Calculating data for %d additional periods (request ID %d)', len(periods), requestId)
-        hists, ents, vecs = self.calculate_histograms_entropies(periods)
+
+        # calculate duplicate periods only once, but answer in request order
+        unique_periods, inverse = np.unique(np.asarray(periods, dtype='float'), return_inverse=True)
+        hists, ents, vecs, metric_values = self.calculate_histograms_entropies(unique_periods, base_period)
+        hists = hists[inverse]
+        ents = ents[inverse]
+        vecs = vecs[inverse]
 
         b = b''
 
@@ -304,6 +1854,7 @@ class Dataset:
         metadata = dict(
             periodCount=len(periods),
             periodDomain=[self.min_period, int(self.dt)],
+            metrics=self.metrics,
                 )
 
         metadata_bytes = json.dumps(metadata).encode()
@@ -319,27 +1870,128 @@ class Dataset:
         b += metadata_bytes
 
         # histograms
-        b += hists.flatten().astype('<f4').tobytes()
+        b += hists.tobytes()
 
         # entropies
-        b += ents.astype('<f4').tobytes()
+        b += ents.tobytes()
 
         # vectorstrengths
-        b += vecs.astype('<f4').tobytes()
+        b += vecs.tobytes()
 
         # periods
         b += np.array(periods, dtype='<f4').tobytes()
 
+        # quality metrics, in the order of the metadata
+        for key in self.metrics:
+            b += metric_values[key][inverse].tobytes()
+
+        return b
+
+
+    def period_page_websocket_data(self, start, end, requestId):
+        '''
+        PERIOD PAGE message with the histograms, entropies, vector strengths
+        and metric values of the periods [start, end) of the period grid,
+        see README.md. With pages, the pages of these periods are calculated
+        if needed, and the pages next to them are queued for prefetching.
+        '''
+        if self.page_size is not None:
+            first, last = start // self.page_size, (end - 1) // self.page_size
+            self.calculate_pages(range(first, last + 1))
+
+            num_pages = math.ceil(len(self.periods) / self.page_size)
+            self.prefetch = [ page for page in (first - 1, last + 1) if 0 <= page < num_pages and page not in self.pages ]
+
+        b = b''
+
+        # message type: 13
+        dataset_type = np.zeros(1, dtype='<u4')
+        dataset_type[0] = 13
+
+        # requestId
+        request_id = np.zeros(1, dtype='<u4')
+        request_id[0] = requestId
+
+        metadata = dict(
+            start=start,
+            end=end,
+            periodCount=end - start,
+            numBins=self.num_bins,
+            pageSize=self.page_size,
+            metrics=self.metrics,
+                )
+
+        metadata_bytes = json.dumps(metadata).encode()
+        metadata_length = len(metadata_bytes)
+
+        # metadata size
+        metadata_size = np.zeros(1, dtype='<u4')
+        metadata_size[0] = metadata_length
+
+        b += dataset_type.tobytes()
+        b += request_id.tobytes()
+        b += metadata_size.tobytes()
+        b += metadata_bytes
+
+        # histograms
+        b += self.hists[start:end].tobytes()
+
+        # entropies
+        b += self.ents[start:end].tobytes()
+
+        # vectorstrengths
+        b += self.vecs[start:end].tobytes()
+
+        # periods
+        b += self.periods[start:end].astype('<f4').tobytes()
+
+        # quality metrics, in the order of the metadata
+        for key in self.metrics:
+            b += self.metric_values[key][start:end].tobytes()
+
         return b
 
 
     def change_attribute_type(self, method):
+        if method not in methods:
+            raise ValueError(F'no such method: "{method}"')
+
         self.method = method
+        self.update_histograms()
 
-        hists, ents, vecs = self.calculate_histograms_entropies(self.periods)
 
-        self.hists = hists
-        self.ents = ents
-        self.vecs = vecs
+    def change_num_bins(self, num_bins):
+        if num_bins <= 0 or self.base_num_bins % num_bins != 0:
+            raise ValueError(F'number of bins ({num_bins}) must divide base number of bins ({self.base_num_bins})')
 
-        self.precalculate_binning()
+        self.num_bins = num_bins
+        self.update_histograms()
+
+
+def estimate_footprint(num_events, dt, minutes=5, num_bins=25, base_num_bins=default_base_num_bins, grouped=False):
+    '''
+    Estimated `memory_footprint` of a dataset with `num_events` events
+    spanning `dt` seconds (with group ids if `grouped`), before creating it
+    with `create_dataset`, including the value statistics that a display
+    attribute other than "count" adds.
+    '''
+    min_period = timedelta(minutes=minutes).total_seconds()
+    num_periods = len(generate_periods(dt, min_period))
+
+    # events, and at most as many unique timestamps
+    events = num_events * (4 + 4 + 4 + 4) + num_events * (4 + 4 + 8 + 8)
+    if grouped:
+        events += num_events * 4
+    base_statistics = num_periods * base_num_bins * (4 + 4 + 4)
+    histograms = num_periods * (4 * num_bins + 4 + 4 + 8 + 16 + 4 * len(quality_metrics.registry))
+    binning = 4 * math.ceil(dt / min_period)
+    fine_histogram = base_num_bins * harmonic_resolution * (4 + 4 + 4)
+
+    return events + base_statistics + histograms + binning + fine_histogram
+
+
+def create_dataset(data, logger, minutes=5, num_bins=25, scaling=1, vectorstrength_method='exact', base_num_bins=default_base_num_bins,
+        metrics=None, chunk_size=None, page_size=None):
+    '''Create a dataset, with the dataset generation args of a `DatasetDefinition`.'''
+    return Dataset(data, timedelta(minutes=minutes).total_seconds(), num_bins, logger, scaling, vectorstrength_method,
+            base_num_bins, metrics, chunk_size, page_size)
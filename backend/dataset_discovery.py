@@ -1,10 +1,23 @@
+import csv
+import functools
+import os
 import os.path
 import sys
 import logging
+import math
+import threading
+import queue
+import hashlib
+from concurrent.futures import Future
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Callable
+from typing import Any, Dict, List, Optional, Callable, Union
 import flask
+import numpy as np
 
+from . import columnar
+from . import scheduler
+from . import shared_arrays
+from .dataset import Dataset, create_dataset, estimate_footprint
 from .dataset_generation import synthetic, synthetic2, synthetic3, sunspots, tides
 
 _logger = logging.getLogger(vars(sys.modules[__name__])['__package__'])
@@ -26,8 +39,9 @@ class DatasetDefinition:
     # path to the source file for the dataset
     file: Optional[str]
 
-    # function generating the dataset from the (optional) file
-    run_function: Callable[..., List[Dict[str, Any]]]
+    # function generating the dataset from the (optional) file, either as a
+    # list of events or as a dict of columns (x, y, time, value)
+    run_function: Callable[..., Union[List[Dict[str, Any]], Dict[str, Any]]]
 
     # optional arguments for the run function
     run_function_args: Optional[Dict[str, Any]]
@@ -35,6 +49,16 @@ class DatasetDefinition:
     # optional arguments for the dataset generation function
     dataset_generation_args: Optional[Dict[str, Any]]
 
+    # whether the dataset is loaded and precomputed at server start
+    prewarm: bool = True
+
+    # path to the same data in the columnar format (see columnar.py), which
+    # is memory-mapped instead of running the run function if it exists
+    columnar_file: Optional[str] = None
+
+    def uses_columnar_file(self):
+        return self.columnar_file is not None and os.path.exists(self.columnar_file)
+
 
 _dataset_definitions = [
     DatasetDefinition(
@@ -64,6 +88,16 @@ _dataset_definitions = [
         run_function_args=dict(number=2000),
         dataset_generation_args=None,
         ),
+    DatasetDefinition(
+        key='synthetic-large',
+        title='Synthetic (large)',
+        description='Large synthetic dataset with spatio-temporal patterns, for load testing.',
+        file=None,
+        run_function=synthetic._run_columns,
+        run_function_args=dict(number=1_000_000),
+        dataset_generation_args=dict(vectorstrength_method='fft', page_size=200),
+        prewarm=False,
+        ),
     DatasetDefinition(
         key='sunspots',
         title='Sunspots',
@@ -73,6 +107,7 @@ _dataset_definitions = [
         run_function_args=None,
         # minutes are days here, because of int32 overflow
         dataset_generation_args=dict(minutes=7, scaling=24 * 60,),
+        columnar_file='datasets/sunspots_us_daily.columns',
         ),
     DatasetDefinition(
         key='tides_us',
@@ -83,6 +118,8 @@ _dataset_definitions = [
         run_function_args=dict(specialization='US', time_scaling=1.0 / (24 * 60)),
         # minutes are days here, because of int32 overflow
         dataset_generation_args=dict(minutes=7, scaling=24 * 60,),
+        # converted with --time-scaling 1/1440
+        columnar_file='datasets/tides_us.columns',
         ),
     DatasetDefinition(
         key='tides-honolulu',
@@ -93,6 +130,7 @@ _dataset_definitions = [
         run_function_args=dict(specialization='Honolulu'),
         # minutes are days here, because of int32 overflow
         dataset_generation_args=dict(minutes=7, scaling=24 * 60,),
+        columnar_file='datasets/tides_honolulu.columns',
         ),
         ]
 
@@ -100,13 +138,264 @@ _dataset_definitions = [
 datasets = dict()
 _logger.info('Finding available datasets:')
 for dd in _dataset_definitions:
-    if dd.file is None or os.path.exists(dd.file):
+    if dd.file is None or os.path.exists(dd.file) or dd.uses_columnar_file():
         datasets[dd.key] = dd
         _logger.info('  Dataset "%s" available.', dd.title)
     else:
         _logger.info('  Dataset "%s" not available.', dd.title)
 
 
+def estimate_event_count(definition):
+    '''Rough number of events of a dataset, without loading it.'''
+    run_args = definition.run_function_args or dict()
+    if 'number' in run_args:
+        return run_args['number']
+
+    if definition.uses_columnar_file():
+        return int(columnar.read_header(definition.columnar_file)['count'])
+
+    if definition.file is None:
+        return None
+
+    # extrapolate from the line length at the start of the file
+    with open(definition.file, 'rb') as f:
+        sample = f.read(1 << 16)
+
+    num_lines = max(1, sample.count(b'\n'))
+    return round(os.path.getsize(definition.file) / len(sample) * num_lines) - 1
+
+
+# loaded datasets by key, as futures so that concurrent requests wait for one
+# load instead of starting their own
+_loaded = dict()
+_loaded_lock = threading.Lock()
+
+# whether precomputed datasets are shared between worker processes, see shared_arrays.py
+share_datasets = os.environ.get('SHARE_DATASETS', '1') == '1'
+
+# scheduler owner of all loads of registered datasets, which thereby get a
+# fair share of the compute slots together instead of one per dataset
+_scheduler_owner = 'dataset loading'
+
+
+def inputs_digest(definition):
+    '''Hex digest of the inputs of a dataset, which changes whenever the precomputed dataset may.'''
+    h = hashlib.sha256()
+    h.update(repr((Dataset.state_version, definition.key, definition.run_function_args,
+        definition.dataset_generation_args)).encode())
+    if not definition.uses_columnar_file():
+        run_function = definition.run_function
+        module_file = sys.modules[run_function.__module__].__file__
+        stat = os.stat(module_file)
+        h.update(repr((run_function.__module__, run_function.__qualname__, stat.st_size, stat.st_mtime_ns)).encode())
+    source = definition.columnar_file if definition.uses_columnar_file() else definition.file
+    if source is not None:
+        stat = os.stat(source)
+        h.update(repr((source, stat.st_size, stat.st_mtime_ns)).encode())
+
+    return h.hexdigest()
+
+
+def _shared_name(definition):
+    '''Name of the shared arrays of a dataset, which changes with its inputs.'''
+    return F'{definition.key}-{inputs_digest(definition)[:16]}'
+
+
+def _create_dataset(definition):
+    # in a compute slot, but only for the computation itself: waiting for
+    # another worker process to publish the dataset does not hold one
+    with scheduler.task(_scheduler_owner, scheduler.sweep):
+        if definition.uses_columnar_file():
+            data = columnar.load_columns(definition.columnar_file)
+        else:
+            run_args = definition.run_function_args or dict()
+            data = definition.run_function(filename=definition.file, **run_args)
+
+        gen_args = definition.dataset_generation_args or dict()
+        return create_dataset(data, _logger, **gen_args)
+
+
+def _create_shared_dataset(definition):
+    '''
+    Attach to the dataset precomputed by another worker process, or compute
+    and publish it. The lock makes other workers wait instead of computing
+    the same dataset.
+    '''
+    name = _shared_name(definition)
+    with shared_arrays.locked(name):
+        shared = shared_arrays.attach(name)
+        if shared is None:
+            dataset = _create_dataset(definition)
+            shared_arrays.publish(name, *dataset.state())
+            shared = shared_arrays.attach(name)
+        else:
+            _logger.info('Attached to shared dataset "%s"', definition.key)
+
+    return Dataset.from_state(*shared, _logger)
+
+
+def _load_dataset(key):
+    with _loaded_lock:
+        future = _loaded.get(key, None)
+        is_owner = future is None
+        if is_owner:
+            future = Future()
+            _loaded[key] = future
+
+    if is_owner:
+        definition = datasets[key]
+        try:
+            # chunked datasets are not published, which would copy their
+            # events; they are memory-mapped by each worker instead
+            chunked = (definition.dataset_generation_args or dict()).get('chunk_size', None) is not None
+            if share_datasets and not chunked:
+                try:
+                    dataset = _create_shared_dataset(definition)
+                except OSError as err:
+                    _logger.error('Could not share dataset "%s": %s', key, err)
+                    dataset = _create_dataset(definition)
+            else:
+                dataset = _create_dataset(definition)
+
+            future.set_result(dataset)
+
+        except Exception as err:
+            with _loaded_lock:
+                del _loaded[key]
+
+            future.set_exception(err)
+
+    return future.result()
+
+
+def get_dataset(key, logger):
+    '''
+    Dataset for the registered dataset `key`, loaded and precomputed if it
+    is not yet. The returned copy belongs to the caller.
+    '''
+    return _load_dataset(key).copy(logger)
+
+
+@functools.lru_cache(maxsize=None)
+def _csv_time_span(filename, mtime_ns, time_scaling):
+    '''
+    Time span of the `time` column of a CSV file, scaled as by the run
+    functions (or None without rows), and whether it has a `group` column.
+    '''
+    t0, t1 = math.inf, -math.inf
+    with open(filename) as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            t = float(row['time'])
+            t0, t1 = min(t0, t), max(t1, t)
+
+        grouped = 'group' in (reader.fieldnames or ())
+
+    return (int((t1 - t0) * time_scaling) if t0 <= t1 else None), grouped
+
+
+def estimate_bytes(definition):
+    '''
+    `estimate_footprint` of a dataset, from its columnar file or the `time`
+    column of its CSV file before it is loaded. None for generated datasets
+    that have not been loaded.
+    '''
+    num_events = estimate_event_count(definition)
+
+    with _loaded_lock:
+        future = _loaded.get(definition.key, None)
+
+    if future is not None and future.done() and future.exception() is None:
+        dataset = future.result()
+        num_events, dt, grouped = len(dataset.ts), int(dataset.dt), dataset.group_keys is not None
+
+    elif definition.uses_columnar_file():
+        # only the first and last times of sorted files are read
+        header = columnar.read_header(definition.columnar_file)
+        if int(header['count']) == 0:
+            return None
+        ts = np.memmap(definition.columnar_file, dtype='<i4', mode='r', offset=int(header['offsets'][0]),
+                shape=(int(header['count']),))
+        if header['flags'] & columnar.flag_sorted:
+            dt = int(ts[-1]) - int(ts[0])
+        else:
+            dt = int(ts.max()) - int(ts.min())
+        grouped = bool(header['flags'] & columnar.flag_groups)
+
+    elif definition.file is not None:
+        time_scaling = (definition.run_function_args or dict()).get('time_scaling', 1.0)
+        dt, grouped = _csv_time_span(definition.file, os.stat(definition.file).st_mtime_ns, time_scaling)
+        if dt is None:
+            return None
+
+    else:
+        return None
+
+    if num_events is None:
+        return None
+
+    gen_args = definition.dataset_generation_args or dict()
+    footprint_args = { k: gen_args[k] for k in ('minutes', 'num_bins', 'base_num_bins') if k in gen_args }
+    return estimate_footprint(num_events, max(dt, 1), grouped=grouped, **footprint_args)
+
+
+def dataset_status(key):
+    '''One of "cold", "warming" and "warm".'''
+    with _loaded_lock:
+        future = _loaded.get(key, None)
+
+    if future is None:
+        return 'cold'
+    if not future.done():
+        return 'warming'
+    return 'warm'
+
+
+def _prewarm_worker(keys):
+    while True:
+        try:
+            key = keys.get_nowait()
+        except queue.Empty:
+            return
+
+        try:
+            _logger.info('Prewarming dataset "%s"', key)
+            _load_dataset(key)
+            _logger.info('Prewarmed dataset "%s"', key)
+        except Exception as err:
+            _logger.error('Could not prewarm dataset "%s": %s', key, err)
+
+
+def start_prewarm(selection=None, num_workers=None):
+    '''
+    Load and precompute datasets in background threads, cheapest first.
+
+    `selection` is a comma-separated list of dataset keys, "*" for all
+    datasets marked with `prewarm`, or an empty string for none; it defaults
+    to the environment variable PREWARM_DATASETS or "*". `num_workers`
+    defaults to the environment variable PREWARM_WORKERS or 1.
+    '''
+    if selection is None:
+        selection = os.environ.get('PREWARM_DATASETS', '*')
+    if num_workers is None:
+        num_workers = int(os.environ.get('PREWARM_WORKERS', '1'))
+
+    if selection.strip() == '*':
+        keys = [ k for k, v in datasets.items() if v.prewarm ]
+    else:
+        keys = [ k.strip() for k in selection.split(',') if k.strip() in datasets ]
+
+    keys.sort(key=lambda k: estimate_event_count(datasets[k]) or 0)
+
+    key_queue = queue.Queue()
+    for k in keys:
+        key_queue.put(k)
+
+    _logger.info('Prewarming %d datasets with %d workers', len(keys), num_workers)
+    for _ in range(num_workers):
+        threading.Thread(target=_prewarm_worker, args=(key_queue,), daemon=True).start()
+
+
 blueprint = flask.Blueprint('dataset-discovery', __name__, template_folder=None, static_folder=None)
 
 @blueprint.get('/datasets')
@@ -117,6 +406,9 @@ def get_datasets():
             key=v.key,
             title=v.title,
             description=v.description,
+            status=dataset_status(v.key),
+            estimatedEventCount=estimate_event_count(v),
+            estimatedBytes=estimate_bytes(v),
             ))
 
     return flask.jsonify(d)
@@ -5,6 +5,9 @@ import uuid
 import math
 from collections import namedtuple
 from datetime import datetime
+import numpy as np
+
+from .vectorized import iter_chunks, concatenate, default_chunk_size, random_period_times
 
 logger = logging.getLogger(vars(sys.modules[__name__])['__package__'])
 
@@ -31,6 +34,10 @@ def _random_time(period, phase):
     return _to_time(time)
 
 
+def _random_times(rng, period, phase, size):
+    return _to_time(random_period_times(rng, _domain_tn, period, phase, size))
+
+
 def uniform(period, phase):
     return dict(id=str(uuid.uuid1()),
             x=random.uniform(*_domain_x),
@@ -83,6 +90,49 @@ def cubic_spline_segment(period, phase, p0=(0,0), p1=(0,1), p2=(1,0), p3=(1,1),
             )
 
 
+def uniform_columns(rng, size, period, phase):
+    return dict(
+            x=rng.uniform(*_domain_x, size=size),
+            y=rng.uniform(*_domain_y, size=size),
+            time=_to_time(rng.uniform(*_domain_tn, size=size)),
+            value=np.zeros(size),  # XXX
+            )
+
+
+def spot_columns(rng, size, period, phase, x=0, y=0):
+    delta = rng.uniform(0, (_domain_x[1] - _domain_x[0]) / 12, size=size)
+    angle = rng.uniform(0, math.pi * 2, size=size)
+
+    return dict(
+            x=x + np.cos(angle) * delta,
+            y=y + np.sin(angle) * delta,
+            time=_random_times(rng, period, phase, size),
+            value=np.zeros(size),  # XXX
+            )
+
+
+def cubic_spline_segment_columns(rng, size, period, phase, p0=(0,0), p1=(0,1), p2=(1,0), p3=(1,1), spread=0.3):
+    delta = rng.uniform(0, spread, size=size)
+    angle = rng.uniform(0, math.pi * 2, size=size)
+
+    t = rng.uniform(0, 1, size=size)
+    x, y = _spline(t, p0, p1, p2, p3)
+
+    return dict(
+            x=x + np.cos(angle) * delta,
+            y=y + np.sin(angle) * delta,
+            time=_random_times(rng, period, phase, size),
+            value=np.zeros(size),  # XXX
+            )
+
+
+_columns_functions = {
+    uniform: uniform_columns,
+    spot: spot_columns,
+    cubic_spline_segment: cubic_spline_segment_columns,
+        }
+
+
 RandomClass = namedtuple('RandomClass', 'func,period,phase,params,weight')
 _data_weights = [
     RandomClass(uniform, None, None, dict(), 1),
@@ -107,3 +157,33 @@ def _run(number: int, filename = None):
         datapoints.append(i.func(i.period, i.phase, **i.params))
 
     return datapoints
+
+
+def _generate_chunk(rng, start, stop, number):
+    size = stop - start
+    weights = np.array([ d.weight for d in _data_weights ], dtype='float')
+    classes = rng.choice(len(_data_weights), size=size, p=weights / weights.sum())
+
+    columns = dict(
+            x=np.zeros(size),
+            y=np.zeros(size),
+            time=np.zeros(size),
+            value=np.zeros(size),
+            )
+
+    for i, d in enumerate(_data_weights):
+        mask = classes == i
+        c = _columns_functions[d.func](rng, np.count_nonzero(mask), d.period, d.phase, **d.params)
+        for k, v in c.items():
+            columns[k][mask] = v
+
+    return columns
+
+
+def _iter_columns(number: int, chunk_size: int = default_chunk_size, seed: int = 123456, filename = None):
+    logger.info('Creating %d data points at random in chunks of %d.', number, chunk_size)
+    return iter_chunks(_generate_chunk, number, chunk_size, seed)
+
+
+def _run_columns(number: int, seed: int = 123456, filename = None):
+    return concatenate(_iter_columns(number, seed=seed))
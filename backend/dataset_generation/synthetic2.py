@@ -4,6 +4,9 @@ import sys
 import uuid
 import math
 from datetime import datetime
+import numpy as np
+
+from .vectorized import iter_chunks, concatenate, default_chunk_size, random_period_times
 
 logger = logging.getLogger(vars(sys.modules[__name__])['__package__'])
 
@@ -34,6 +37,9 @@ def _random_time(period, phase):
 
     return _to_time(time)
 
+def _random_times(rng, period, phase, size):
+    return _to_time(random_period_times(rng, _domain_tn, period, phase, size))
+
 def random_point():
     x = random.uniform(*_domain_x)
     y = random.uniform(*_domain_y)
@@ -68,3 +74,31 @@ def _run(number: int, filename=None):
         datapoints.append(random_point())
 
     return datapoints
+
+
+def _generate_chunk(rng, start, stop, number):
+    size = stop - start
+    x = rng.uniform(*_domain_x, size=size)
+    y = rng.uniform(*_domain_y, size=size)
+    delta = (x - _cx)**2 + (y - _cy)**2
+    inside = delta < _r2
+    num_inside = np.count_nonzero(inside)
+
+    time = np.zeros(size)
+    time[inside] = _random_times(rng, 45 / (24 * 60), 0, num_inside)
+    time[~inside] = _random_times(rng, 5 / 24, 1 / 24, size - num_inside)
+
+    difference_from_noon = np.abs(np.remainder(time - 43200, 86400)) / 43200
+    diff = difference_from_noon * difference_from_noon
+    value = np.where(inside, 2, rng.normal(8, diff))
+
+    return dict(x=x, y=y, time=time, value=value)
+
+
+def _iter_columns(number: int, chunk_size: int = default_chunk_size, seed: int = 123456, filename=None):
+    logger.info('Creating %d data points at random in chunks of %d.', number, chunk_size)
+    return iter_chunks(_generate_chunk, number, chunk_size, seed)
+
+
+def _run_columns(number: int, seed: int = 123456, filename=None):
+    return concatenate(_iter_columns(number, seed=seed))
@@ -4,6 +4,9 @@ import sys
 import uuid
 import math
 from datetime import datetime, timezone
+import numpy as np
+
+from .vectorized import iter_chunks, concatenate, default_chunk_size
 
 logger = logging.getLogger(vars(sys.modules[__name__])['__package__'])
 
@@ -42,6 +45,23 @@ def _random_time():
     return datetime(year, month, dom, hour, minute, second, tzinfo=timezone.utc).timestamp()
 
 
+def _random_times(rng, size):
+    '''Vectorized version of `_random_time`.'''
+    dom = rng.integers(1, 7, size=size)
+
+    monthyears = np.arange(2011 * 12, 2020 * 12 + 12)
+    monthyear = rng.choice(monthyears[monthyears % 3 == 2], size=size)
+
+    hour = rng.integers(0, 24, size=size)
+    minute = rng.integers(0, 60, size=size)
+    second = rng.integers(0, 60, size=size)
+
+    # months since 1970-01 as datetime64, then seconds since epoch (UTC)
+    month_start = (monthyear - 1970 * 12).astype('datetime64[M]').astype('datetime64[s]').astype('<i8')
+
+    return month_start + (dom - 1) * 86400 + hour * 3600 + minute * 60 + second
+
+
 def random_point(index, length):
     num_xy = math.ceil(math.sqrt(length))
 
@@ -76,3 +96,35 @@ def _run(number: int, filename=None):
         datapoints.append(random_point(i, number))
 
     return datapoints
+
+
+def _generate_chunk(rng, start, stop, number):
+    size = stop - start
+    num_xy = math.ceil(math.sqrt(number))
+
+    index = np.arange(start, stop)
+    ix = index % num_xy
+    iy = index // num_xy
+
+    x = _domain_x[0] + ix / (num_xy - 1) * (_domain_x[1] - _domain_x[0])
+    y = _domain_y[0] + iy / (num_xy - 1) * (_domain_y[1] - _domain_y[0])
+
+    delta = (x - _cx)**2 + (y - _cy)**2
+    delta2 = np.abs(np.sqrt(delta) - _r)
+    ring = delta2 < 10
+    num_ring = np.count_nonzero(ring)
+
+    time = np.zeros(size)
+    time[ring] = _random_times(rng, num_ring)
+    time[~ring] = _to_time(rng.uniform(*_domain_tn, size=size - num_ring))
+
+    return dict(x=x, y=y, time=time, value=np.zeros(size))  # XXX
+
+
+def _iter_columns(number: int, chunk_size: int = default_chunk_size, seed: int = 123456, filename=None):
+    logger.info('Creating %d data points at random in chunks of %d.', number, chunk_size)
+    return iter_chunks(_generate_chunk, number, chunk_size, seed)
+
+
+def _run_columns(number: int, seed: int = 123456, filename=None):
+    return concatenate(_iter_columns(number, seed=seed))
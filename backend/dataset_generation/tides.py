@@ -13,11 +13,16 @@ def _run(filename: str, specialization: str, time_scaling: float = 1.0):
         data = []
 
         for d in c:
-            data.append(dict(
+            event = dict(
                 x=float(d['x']),
                 y=float(d['y']),
                 time=int(float(d['time']) * time_scaling),
-                value=float(d['value']))
-                        )
+                value=float(d['value']),
+                    )
+            # the measuring station, if the converter recorded it
+            if d.get('group') is not None:
+                event['group'] = int(d['group'])
+
+            data.append(event)
 
         return data
@@ -0,0 +1,64 @@
+import logging
+import sys
+import math
+import numpy as np
+
+logger = logging.getLogger(vars(sys.modules[__name__])['__package__'])
+
+
+# number of events generated per chunk if no chunk size is given
+default_chunk_size = 1 << 20
+
+# dtypes of the columns of a generated chunk
+column_dtypes = dict(
+    x='<f4',
+    y='<f4',
+    time='<f8',
+    value='<f4',
+        )
+
+
+def iter_chunks(generate_chunk, number: int, chunk_size: int = default_chunk_size, seed: int = 123456):
+    '''
+    Generate `number` events in chunks of at most `chunk_size` events.
+
+    `generate_chunk(rng, start, stop, number)` must return a dict with the
+    columns `x`, `y`, `time` and `value` for the events with indices
+    `start` to `stop`. Each chunk gets its own random generator, which is
+    derived from `seed` and the chunk index, so the output only depends on
+    `seed`, `number` and `chunk_size`.
+    '''
+    num_chunks = max(1, math.ceil(number / chunk_size))
+    seeds = np.random.SeedSequence(seed).spawn(num_chunks)
+
+    for i, chunk_seed in enumerate(seeds):
+        start = i * chunk_size
+        stop = min(number, start + chunk_size)
+
+        rng = np.random.default_rng(chunk_seed)
+        chunk = generate_chunk(rng, start, stop, number)
+
+        yield { k: np.asarray(chunk[k], dtype=dtype) for k, dtype in column_dtypes.items() }
+
+
+def concatenate(chunks):
+    '''Concatenate column chunks into one dict of columns.'''
+    chunks = list(chunks)
+    return { k: np.concatenate([ c[k] for c in chunks ]) for k in column_dtypes.keys() }
+
+
+def random_period_times(rng, domain, period, phase, size):
+    '''
+    Draw `size` times `domain[0] + k * period + phase` that lie within
+    `domain`, with the period number `k` chosen uniformly. This is the
+    vectorized counterpart of the generators' `_random_time`: instead of
+    retrying, `k` is drawn directly from those within the domain, which
+    yields the same distribution. The result is in the units of `domain`.
+    '''
+    span = domain[1] - domain[0]
+    num_periods = math.ceil(span / period)
+    k0 = max(-1, math.ceil(-phase / period))
+    k1 = min(num_periods, math.floor((span - phase) / period))
+
+    period_number = rng.integers(k0, k1 + 1, size=size)
+    return domain[0] + period_number * period + phase
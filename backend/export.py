@@ -0,0 +1,96 @@
+'''
+HTTP export of precomputed datasets.
+
+`GET /export/<dataset_id>?numBins=<bins>&attribute=<display attribute>`
+returns the BEGIN DATASET message of the dataset (see README.md) as a
+file, so that browsers and reverse proxies can cache it. The strong ETag
+is derived from the dataset inputs and the parameters, and the responses
+are written to a cache directory (`EXPORT_CACHE_DIR`) once and served from
+there afterwards, with support for conditional and range requests.
+'''
+
+import hashlib
+import logging
+import os
+import os.path
+import sys
+import tempfile
+import flask
+import werkzeug.exceptions
+
+from .dataset import default_base_num_bins, methods
+from .dataset_discovery import datasets, get_dataset, inputs_digest
+
+logger = logging.getLogger(vars(sys.modules[__name__])['__package__'])
+
+
+# incremented whenever the layout of the exported message changes
+_format_version = 5
+
+directory = os.environ.get('EXPORT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'periodic-time-vis-export'))
+
+
+def _etag(dataset_id, num_bins, attribute):
+    h = hashlib.sha256()
+    h.update(repr((_format_version, inputs_digest(datasets[dataset_id]), num_bins, attribute)).encode())
+
+    return h.hexdigest()[:32]
+
+
+def _write_export(path, dataset_id, num_bins, attribute):
+    dataset = get_dataset(dataset_id, logger)
+    dataset.change_num_bins(num_bins)
+    dataset.change_attribute_type(attribute)
+
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(prefix='.export-', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(dataset.to_websocket_bytestring())
+
+        # concurrent requests may write the same file, the last one wins
+        os.replace(tmp, path)
+
+    except:
+        os.remove(tmp)
+        raise
+
+
+blueprint = flask.Blueprint('export', __name__, template_folder=None, static_folder=None)
+
+@blueprint.get('/export/<string:dataset_id>')
+def export_dataset(dataset_id):
+    if dataset_id not in datasets:
+        raise werkzeug.exceptions.NotFound(F'No such dataset: {dataset_id}')
+
+    # validated before answering revalidations, which do not create the dataset
+    try:
+        num_bins = int(flask.request.args.get('numBins', '25'))
+    except ValueError:
+        raise werkzeug.exceptions.BadRequest(F'Invalid number of bins: {flask.request.args["numBins"]}')
+    base_num_bins = (datasets[dataset_id].dataset_generation_args or dict()).get('base_num_bins', default_base_num_bins)
+    if num_bins <= 0 or base_num_bins % num_bins != 0:
+        raise werkzeug.exceptions.BadRequest(F'Number of bins ({num_bins}) must divide base number of bins ({base_num_bins})')
+
+    attribute = flask.request.args.get('attribute', 'count')
+    if attribute not in methods:
+        raise werkzeug.exceptions.BadRequest(F'No such display attribute: {attribute}')
+
+    etag = _etag(dataset_id, num_bins, attribute)
+
+    # answer revalidations without touching the dataset
+    if etag in flask.request.if_none_match:
+        response = flask.Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    path = os.path.join(directory, F'{dataset_id}-{etag}.bin')
+    if not os.path.exists(path):
+        logger.info('Exporting dataset "%s" with %d bins (%s)', dataset_id, num_bins, attribute)
+        try:
+            _write_export(path, dataset_id, num_bins, attribute)
+        except ValueError as err:
+            raise werkzeug.exceptions.BadRequest(str(err))
+
+    return flask.send_file(path, mimetype='application/octet-stream', conditional=True, etag=etag,
+            download_name=F'{dataset_id}.bin')
@@ -0,0 +1,69 @@
+import os
+import threading
+import time
+
+
+def _default_limit():
+    '''Half of the physical memory, in bytes.'''
+    try:
+        return os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE') // 2
+    except (ValueError, OSError):
+        return 0
+
+
+class MemoryBudget:
+    '''
+    Server-wide memory budget for the datasets of sessions. Sessions reserve
+    their estimated footprint before their dataset is built, wait while the
+    budget is exhausted, and update the reservation with the actual
+    footprint later. A limit of 0 disables the budget.
+    '''
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, amount, timeout):
+        '''
+        Reserve `amount` bytes, waiting up to `timeout` seconds for other
+        sessions to release theirs. Returns whether the reservation was made.
+        '''
+        deadline = time.monotonic() + timeout
+
+        with self.condition:
+            if self.limit > 0 and amount > self.limit:
+                return False
+
+            while self.limit > 0 and self.used + amount > self.limit:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+
+                self.condition.wait(remaining)
+
+            self.used += amount
+            return True
+
+    def resize(self, old_amount, new_amount):
+        '''Change a reservation without waiting, e.g., to the measured footprint.'''
+        with self.condition:
+            self.used += new_amount - old_amount
+            if new_amount < old_amount:
+                self.condition.notify_all()
+
+    def release(self, amount):
+        with self.condition:
+            self.used -= amount
+            self.condition.notify_all()
+
+    @property
+    def available(self):
+        with self.condition:
+            return max(0, self.limit - self.used) if self.limit > 0 else None
+
+
+budget = MemoryBudget(int(float(os.environ['MEMORY_BUDGET_MB']) * 1e6) if 'MEMORY_BUDGET_MB' in os.environ else _default_limit())
+
+# seconds a new session waits for memory before it is refused
+wait_timeout = float(os.environ.get('MEMORY_BUDGET_WAIT', '30'))
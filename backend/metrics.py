@@ -0,0 +1,118 @@
+'''
+Registry of quality metrics for periods, in addition to the entropy and
+vector strength that every dataset has.
+
+Each metric declares the statistics it needs per period, and is evaluated
+from those alone, without going back to the events. The statistics are
+accumulated for all metrics together in one pass over the events (see
+`Dataset.calculate_base_statistics`):
+
+    - "counts": event counts per phase bin at the base resolution, shape
+      (periods, base number of bins)
+    - "moments": first circular moment, normalized by the event count,
+      complex with shape (periods,)
+
+Metrics are also passed `num_bins`, the current number of displayed bins.
+'''
+
+from dataclasses import dataclass
+from typing import Callable, FrozenSet
+import numpy as np
+
+
+statistics = ('counts', 'moments')
+
+
+@dataclass(frozen=True)
+class Metric:
+    '''A quality metric, evaluated per period.'''
+
+    # identifier of the metric, used as column name in messages
+    key: str
+
+    # display name of the metric
+    title: str
+
+    # statistics the metric needs, see module docstring
+    statistics: FrozenSet[str]
+
+    # function from the statistics (as keyword arguments) and num_bins to
+    # one value per period
+    function: Callable[..., np.ndarray]
+
+
+registry = dict()
+
+
+def register(metric):
+    unknown = metric.statistics - set(statistics)
+    if len(unknown) > 0:
+        raise ValueError(F'metric "{metric.key}" needs unknown statistics: {", ".join(sorted(unknown))}')
+
+    registry[metric.key] = metric
+    return metric
+
+
+def _binned(counts, num_bins):
+    '''Counts summed to `num_bins` bins.'''
+    return counts.reshape(counts.shape[0], num_bins, -1).sum(axis=2).astype('float')
+
+
+def rayleigh_z(counts, moments, num_bins):
+    '''Rayleigh test statistic n R^2, with R the vector strength.'''
+    n = counts.sum(axis=1)
+    return n * np.abs(moments) ** 2
+
+
+def chi_square(counts, num_bins):
+    '''Pearson's chi-square statistic of the displayed bins against a uniform distribution.'''
+    observed = _binned(counts, num_bins)
+    n = observed.sum(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        expected = n / num_bins
+        return np.sum((observed - expected) ** 2 / expected, axis=1)
+
+
+def kuiper(counts, num_bins):
+    '''
+    Kuiper's statistic V = D+ + D- of the phases against a uniform
+    distribution, from the cumulative distribution at the edges of the
+    base-resolution bins.
+    '''
+    n = counts.sum(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cdf = np.cumsum(counts, axis=1) / n
+
+    uniform = np.arange(1, counts.shape[1] + 1) / counts.shape[1]
+    difference = cdf - uniform[np.newaxis, :]
+
+    # the cumulative distributions agree at phase 0, so D+ and D- are at least 0
+    return np.maximum(difference.max(axis=1), 0) + np.maximum(-difference.min(axis=1), 0)
+
+
+register(Metric(key='rayleighZ', title='Rayleigh Z', statistics=frozenset(['counts', 'moments']), function=rayleigh_z))
+register(Metric(key='chiSquare', title='Chi-square (uniform)', statistics=frozenset(['counts']), function=chi_square))
+register(Metric(key='kuiper', title='Kuiper V', statistics=frozenset(['counts']), function=kuiper))
+
+
+def required_statistics(keys):
+    '''Union of the statistics needed by the metrics `keys`.'''
+    required = set()
+    for key in keys:
+        required |= registry[key].statistics
+
+    return required
+
+
+def evaluate(keys, available, num_bins):
+    '''
+    Values of the metrics `keys` as a dict of f32 arrays, from the dict of
+    `available` statistics.
+    '''
+    values = dict()
+    for key in keys:
+        metric = registry[key]
+        kwargs = { s: available[s] for s in metric.statistics }
+        values[key] = np.asarray(metric.function(num_bins=num_bins, **kwargs), dtype='<f4')
+
+    return values
@@ -0,0 +1,203 @@
+'''
+Scheduler for the computations of all sockets of a worker.
+
+Computations run on the request thread of their socket (or the thread
+loading a registered dataset), but only after acquiring one of a bounded
+number of compute slots (`COMPUTE_WORKERS`, default: number of CPUs). Waiting computations are granted slots by
+priority (`interactive` before `update` before `sweep`), and within a
+priority by fair share: the socket that has used the least compute time
+goes first.
+
+Long computations call `checkpoint()` between chunks of work. If a
+computation that would be scheduled before them is waiting, they give up
+their slot there and queue again, so that a sweep does not hold a slot
+while an interactive request waits.
+
+`GET /scheduler` reports the queue depth and recent wait times.
+'''
+
+import collections
+import contextlib
+import itertools
+import os
+import threading
+import time
+import flask
+
+
+# priorities, lower goes first
+interactive = 0  # small requests for which a user waits, e.g., additional periods
+update = 1  # recomputations of the dataset, e.g., after changing the display attribute
+sweep = 2  # long computations over all periods, e.g., period rasters
+
+priority_names = { interactive: 'interactive', update: 'update', sweep: 'sweep' }
+
+# compute seconds by which a computation may lead a waiting one of the same
+# priority before it gives up its slot at a checkpoint
+quantum = 0.1
+
+# number of recent wait times kept per priority for the statistics
+_wait_history = 256
+
+
+class _Ticket:
+    def __init__(self, owner, priority, sequence):
+        self.owner = owner
+        self.priority = priority
+        self.sequence = sequence
+        self.granted = False
+        self.started = None  # time at which the slot was granted
+
+
+class Scheduler:
+    def __init__(self, workers):
+        self.workers = workers
+        self.running = 0
+        self.condition = threading.Condition()
+        self.waiting = []
+        self.sequence = itertools.count()
+
+        # compute seconds used per owner, for fair share
+        self.usage = dict()
+
+        self.waits = { p: collections.deque(maxlen=_wait_history) for p in priority_names }
+        self.completed = { p: 0 for p in priority_names }
+
+    def _key(self, ticket):
+        return (ticket.priority, self.usage.get(ticket.owner, 0), ticket.sequence)
+
+    def _enqueue(self, ticket):
+        # owners that were idle start from the least usage of the others,
+        # instead of having a lead over everyone that has been computing
+        if ticket.owner not in self.usage:
+            self.usage[ticket.owner] = min(self.usage.values(), default=0)
+
+        self.waiting.append(ticket)
+        self._grant()
+
+    def _grant(self):
+        while self.running < self.workers and len(self.waiting) > 0:
+            ticket = min(self.waiting, key=self._key)
+            self.waiting.remove(ticket)
+            ticket.granted = True
+            self.running += 1
+
+        self.condition.notify_all()
+
+    def _wait(self, ticket):
+        enqueued = time.monotonic()
+        while not ticket.granted:
+            self.condition.wait()
+
+        ticket.started = time.monotonic()
+        return ticket.started - enqueued
+
+    def _release(self, ticket):
+        self.usage[ticket.owner] = self.usage.get(ticket.owner, 0) + time.monotonic() - ticket.started
+        ticket.granted = False
+        self.running -= 1
+
+    def acquire(self, owner, priority):
+        '''Wait for a compute slot. Returns the ticket holding the slot.'''
+        with self.condition:
+            ticket = _Ticket(owner, priority, next(self.sequence))
+            self._enqueue(ticket)
+            self.waits[priority].append(self._wait(ticket))
+
+        return ticket
+
+    def release(self, ticket):
+        with self.condition:
+            self._release(ticket)
+            self.completed[ticket.priority] += 1
+            self._grant()
+
+    def preempt(self, ticket):
+        '''
+        Give up the slot of `ticket` if a computation that goes first is
+        waiting, and wait for a slot again.
+        '''
+        with self.condition:
+            if len(self.waiting) == 0:
+                return
+
+            self.usage[ticket.owner] = self.usage.get(ticket.owner, 0) + time.monotonic() - ticket.started
+            ticket.started = time.monotonic()
+            first = min(self.waiting, key=self._key, default=None)
+            if first is None or first.priority > ticket.priority:
+                return
+            if first.priority == ticket.priority and self.usage.get(first.owner, 0) + quantum >= self.usage[ticket.owner]:
+                return
+
+            self._release(ticket)
+            ticket.sequence = next(self.sequence)
+            self._enqueue(ticket)
+            self._wait(ticket)
+
+    def forget(self, owner):
+        '''Drop the usage of an owner that will not compute anymore.'''
+        with self.condition:
+            self.usage.pop(owner, None)
+
+    def statistics(self):
+        with self.condition:
+            queued = collections.Counter(t.priority for t in self.waiting)
+            priorities = dict()
+            for p, name in priority_names.items():
+                waits = list(self.waits[p])
+                priorities[name] = dict(
+                    queued=queued[p],
+                    completed=self.completed[p],
+                    meanWait=sum(waits) / len(waits) if len(waits) > 0 else None,
+                    maxWait=max(waits, default=None),
+                        )
+
+            return dict(
+                workers=self.workers,
+                running=self.running,
+                queued=len(self.waiting),
+                priorities=priorities,
+                    )
+
+
+pool = Scheduler(int(os.environ.get('COMPUTE_WORKERS', '0')) or os.cpu_count() or 1)
+
+_current = threading.local()
+
+
+@contextlib.contextmanager
+def task(owner, priority, scheduler=pool):
+    '''
+    Run the body in a compute slot of `scheduler` for `owner` (e.g., the
+    socket) with `priority`. Nested tasks run in the slot of the outermost
+    one.
+    '''
+    if getattr(_current, 'ticket', None) is not None:
+        yield
+        return
+
+    ticket = scheduler.acquire(owner, priority)
+    _current.ticket = ticket
+    _current.scheduler = scheduler
+    try:
+        yield
+    finally:
+        _current.ticket = None
+        scheduler.release(ticket)
+
+
+def checkpoint():
+    '''
+    Point between chunks of a long computation at which it can be preempted.
+    Does nothing outside of a task.
+    '''
+    ticket = getattr(_current, 'ticket', None)
+    if ticket is not None:
+        _current.scheduler.preempt(ticket)
+
+
+blueprint = flask.Blueprint('scheduler', __name__, template_folder=None, static_folder=None)
+
+@blueprint.get('/scheduler')
+def get_statistics():
+    return flask.jsonify(pool.statistics())
@@ -0,0 +1,179 @@
+'''
+Sessions that outlive their websocket.
+
+Each session has a token, which is sent to the client in the BEGIN DATASET
+metadata. When the websocket of a session closes, the session is kept,
+with its dataset and its reservation in the memory budget, for a grace
+period (`SESSION_GRACE_PERIOD` seconds, default 300). A new websocket that
+presents the token within the grace period takes over the session.
+
+The handler of the previous websocket may still be computing on the
+dataset when a new one takes over, so handlers hold the session lock while
+they use the dataset. Background computations of the session (see
+`socket.start_significance`) send through `send`, which holds their
+messages while no websocket is ready for them and sends them on the
+websocket that resumes the session.
+'''
+
+import logging
+import os
+import secrets
+import sys
+import threading
+from simple_websocket import ConnectionClosed
+
+from . import memory_budget
+
+logger = logging.getLogger(vars(sys.modules[__name__])['__package__'])
+
+
+grace_period = float(os.environ.get('SESSION_GRACE_PERIOD', '300'))
+
+
+class Session:
+    def __init__(self, dataset, charge, key=None):
+        self.token = secrets.token_urlsafe(24)
+        self.dataset = dataset
+        self.key = key  # dataset ID, or None for uploaded datasets
+
+        # memory reserved in the memory budget
+        self.charge = charge
+
+        self.socket = None
+        self.timer = None
+
+        # held while a handler uses the dataset
+        self.lock = threading.Lock()
+
+        # thread of the running background computation, or None
+        self.background = None
+
+        # socket on which background computations send, and the messages
+        # held while there is none, see `send`
+        self.sender = None
+        self.pending = []
+        self.send_lock = threading.Lock()
+
+        # incremented on each detach, so that a stale timer does not expire
+        # a session that was resumed and detached again in the meantime
+        self.detachments = 0
+
+
+_sessions = dict()
+_sessions_lock = threading.Lock()
+
+
+def create(dataset, charge, key, socket):
+    '''Register a new session for `dataset`, attached to `socket`.'''
+    session = Session(dataset, charge, key)
+    session.socket = socket
+    session.sender = socket
+    dataset.session_token = session.token
+
+    with _sessions_lock:
+        _sessions[session.token] = session
+
+    return session
+
+
+def resume(token, key, socket):
+    '''
+    Attach `socket` to the session with `token` for dataset `key`. A socket
+    still attached to the session is closed. Returns the session, or None if
+    there is no such session (anymore). Messages of background computations
+    are held until `start_sending`.
+    '''
+    with _sessions_lock:
+        session = _sessions.get(token, None)
+        if session is None or session.key != key:
+            return None
+
+        if session.timer is not None:
+            session.timer.cancel()
+            session.timer = None
+
+        previous = session.socket
+        session.socket = socket
+
+    with session.send_lock:
+        session.sender = None
+
+    if previous is not None:
+        logger.info('Session taken over by a new socket, closing the previous one')
+        previous.close()
+
+    return session
+
+
+def detach(session, socket):
+    '''
+    Detach `socket` from its session, which then expires after the grace
+    period unless it is resumed.
+    '''
+    with _sessions_lock:
+        if session.socket is not socket:
+            return  # taken over by another socket
+
+        session.socket = None
+        session.detachments += 1
+        detachment = session.detachments
+
+        if grace_period > 0:
+            session.timer = threading.Timer(grace_period, _expire, (session, detachment))
+            session.timer.daemon = True
+            session.timer.start()
+
+    # hold the messages of background computations until the session is resumed
+    with session.send_lock:
+        if session.sender is socket:
+            session.sender = None
+
+    if grace_period <= 0:
+        _expire(session, detachment)
+
+
+def start_sending(session):
+    '''
+    Send the held messages of background computations on the socket
+    attached to `session`, and later ones right away.
+    '''
+    with session.send_lock:
+        socket = session.socket
+        if socket is None:
+            return
+
+        while len(session.pending) > 0:
+            socket.send(session.pending[0])
+            session.pending.pop(0)
+
+        session.sender = socket
+
+
+def send(session, data):
+    '''
+    Send `data` from a background computation of `session` on its socket,
+    or hold it until a socket resumes the session.
+    '''
+    with session.send_lock:
+        if session.sender is None:
+            session.pending.append(data)
+            return
+
+        try:
+            session.sender.send(data)
+        except ConnectionClosed:
+            # closed, but not detached yet
+            session.sender = None
+            session.pending.append(data)
+
+
+def _expire(session, detachment):
+    with _sessions_lock:
+        if session.socket is not None or session.detachments != detachment \
+                or _sessions.get(session.token, None) is not session:
+            return
+
+        del _sessions[session.token]
+
+    memory_budget.budget.release(session.charge)
+    session.dataset.logger.info('Session expired')
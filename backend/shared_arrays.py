@@ -0,0 +1,170 @@
+'''
+Read-only numpy arrays shared between processes through memory-mapped files.
+
+A named set of arrays is published once into a directory (by default in
+/dev/shm, so the files live in memory), and each process attaches to it
+with read-only memory maps, so the pages exist only once no matter how
+many gunicorn workers use them. Each attached process holds a marker file
+in the directory; when the last live holder releases the set, the
+directory and its lock file are removed.
+'''
+
+import atexit
+import fcntl
+import json
+import logging
+import os
+import os.path
+import shutil
+import sys
+import tempfile
+import threading
+from contextlib import contextmanager
+import numpy as np
+
+logger = logging.getLogger(vars(sys.modules[__name__])['__package__'])
+
+
+def _default_directory():
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(base, 'periodic-time-vis')
+
+
+directory = os.environ.get('SHARED_ARRAYS_DIR', _default_directory())
+
+# names attached by this process
+_attached = set()
+_attached_lock = threading.Lock()
+
+
+def _lock_path(name):
+    return os.path.join(directory, F'{name}.lock')
+
+
+@contextmanager
+def locked(name):
+    '''
+    Exclusive lock on `name` across processes. The lock file is removed
+    (with the lock held) by `release`, so a lock taken on a file that has
+    been removed or replaced in the meantime is taken again.
+    '''
+    os.makedirs(directory, exist_ok=True)
+    path = _lock_path(name)
+    while True:
+        with open(path, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                current = os.stat(path).st_ino == os.fstat(f.fileno()).st_ino
+            except FileNotFoundError:
+                current = False
+
+            try:
+                if current:
+                    yield
+                    return
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+
+    return True
+
+
+def publish(name, arrays, attributes):
+    '''
+    Write `arrays` (a dict of numpy arrays) and the JSON-serializable
+    `attributes` as the shared set `name`. Must be called with `locked(name)`
+    held. Does nothing if the set already exists.
+    '''
+    target = os.path.join(directory, name)
+    if os.path.exists(target):
+        return
+
+    tmp = tempfile.mkdtemp(prefix=F'.{name}-', dir=directory)
+    try:
+        for key, arr in arrays.items():
+            np.save(os.path.join(tmp, F'{key}.npy'), np.ascontiguousarray(arr), allow_pickle=False)
+
+        with open(os.path.join(tmp, 'attributes.json'), 'w') as f:
+            json.dump(attributes, f)
+
+        os.mkdir(os.path.join(tmp, 'holders'))
+        os.rename(tmp, target)
+
+    except:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+    logger.info('Published shared arrays "%s" (%.1f MB)', name, sum(a.nbytes for a in arrays.values()) / 1e6)
+
+
+def attach(name):
+    '''
+    Attach to the shared set `name`. Returns (arrays, attributes), with the
+    arrays as read-only memory maps, or None if the set does not exist.
+    Must be called with `locked(name)` held.
+    '''
+    target = os.path.join(directory, name)
+    if not os.path.exists(target):
+        return None
+
+    with open(os.path.join(target, 'attributes.json')) as f:
+        attributes = json.load(f)
+
+    arrays = dict()
+    for filename in os.listdir(target):
+        if filename.endswith('.npy'):
+            arrays[filename[:-4]] = np.load(os.path.join(target, filename), mmap_mode='r', allow_pickle=False)
+
+    open(os.path.join(target, 'holders', str(os.getpid())), 'w').close()
+    with _attached_lock:
+        _attached.add(name)
+
+    return arrays, attributes
+
+
+def release(name):
+    '''
+    Stop holding the shared set `name`. If no live process holds it
+    anymore, it is removed with its lock file. Existing memory maps stay
+    valid until they are garbage collected.
+    '''
+    with _attached_lock:
+        _attached.discard(name)
+
+    with locked(name):
+        target = os.path.join(directory, name)
+        holders = os.path.join(target, 'holders')
+        if not os.path.exists(holders):
+            return
+
+        try:
+            os.remove(os.path.join(holders, str(os.getpid())))
+        except FileNotFoundError:
+            pass
+
+        if any(_is_alive(int(pid)) for pid in os.listdir(holders)):
+            return
+
+        logger.info('Removing shared arrays "%s"', name)
+        shutil.rmtree(target, ignore_errors=True)
+        os.remove(_lock_path(name))
+
+
+@atexit.register
+def _release_all():
+    with _attached_lock:
+        names = list(_attached)
+
+    for name in names:
+        try:
+            release(name)
+        except OSError as err:
+            logger.error('Could not release shared arrays "%s": %s', name, err)
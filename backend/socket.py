@@ -4,13 +4,17 @@ from flask_sock import Sock
 from simple_websocket import ConnectionClosed
 import numpy as np
 import json
-from datetime import timedelta
 import werkzeug.exceptions
 import logging
+import math
 import sys
+import threading
 
-from .dataset import Dataset
-from .dataset_discovery import datasets
+from .dataset import create_dataset, estimate_footprint, event_columns, surrogate_methods
+from .dataset_discovery import datasets, get_dataset
+from . import memory_budget
+from . import scheduler
+from . import sessions
 
 
 blueprint = flask.Blueprint('socket', __name__, template_folder=None, static_folder=None)
@@ -24,6 +28,32 @@ class SocketLoggerAdapter(logging.LoggerAdapter):
 
 
 
+class LockedSocket:
+    '''
+    Socket whose sends are serialized, so that computations running in the
+    background of a session (see `start_significance`) can send messages
+    while the session serves other requests.
+    '''
+
+    def __init__(self, socket):
+        self.socket = socket
+        self.send_lock = threading.Lock()
+
+        # session served on the socket, see `handle_dataset`
+        self.session = None
+
+    def send(self, data):
+        with self.send_lock:
+            self.socket.send(data)
+
+    def has_message(self):
+        '''Whether a received message is waiting.'''
+        return len(self.socket.input_buffer) > 0
+
+    def __getattr__(self, name):
+        return getattr(self.socket, name)
+
+
 logger_id = 1
 def _create_socket_logger():
     global logger_id
@@ -35,28 +65,52 @@ def _create_socket_logger():
 
 @sockets.route('/dataset/<string:dataset_id>')
 def get_dataset_with_socket(socket, dataset_id):
+    socket = LockedSocket(socket)
     if dataset_id not in datasets:
         _logger.error('No such dataset: %s', dataset_id)
         socket.close()
         return
 
     logger = _create_socket_logger()
-    definition = datasets[dataset_id]
-    run_args = definition.run_function_args or dict()
-    data = definition.run_function(filename=definition.file, **run_args)
     sockname = F'{socket.environ["SERVER_NAME"]}:{socket.environ["SERVER_PORT"]}{socket.environ["RAW_URI"]} -> {socket.environ["REMOTE_ADDR"]}:{socket.environ["REMOTE_PORT"]}'
+
+    try:
+        session = resume_session(socket, dataset_id, logger)
+        if session is not None:
+            logger.info('Resumed session for dataset %s on socket "%s"', dataset_id, sockname)
+            handle_dataset(socket, session, logger)
+            return
+
+    except ConnectionClosed:
+        logger.info('Closed socket')
+        return
+
+    dataset = get_dataset(dataset_id, logger)
     logger.info('Initialized dataset %s for socket "%s"', dataset_id, sockname)
 
-    gen_args = definition.dataset_generation_args or dict()
-    handle_dataset(socket, data, logger, **gen_args)
+    # the copy of a registered dataset borrows its arrays, so reserve memory
+    # for the results the session will calculate
+    footprint = max(dataset.memory_footprint(), dataset.session_reserve())
+    if not memory_budget.budget.acquire(footprint, memory_budget.wait_timeout):
+        send_over_capacity(socket, footprint, logger)
+        return
+
+    handle_dataset(socket, sessions.create(dataset, footprint, dataset_id, socket), logger)
 
 
 @sockets.route('/dataset/')
 def upload_dataset(socket):
+    socket = LockedSocket(socket)
     logger = _create_socket_logger()
 
-    # first, receive dataset
     try:
+        session = resume_session(socket, None, logger)
+        if session is not None:
+            logger.info('Resumed session for uploaded dataset')
+            handle_dataset(socket, session, logger)
+            return
+
+        # first, receive dataset
         message = socket.receive()
         if type(message) != bytes:
             logger.error('Did not receive correct data')
@@ -76,43 +130,308 @@ def upload_dataset(socket):
             values = np.frombuffer(message, dtype='<f4', count=length, offset=8 + 8*length)
             ts = np.frombuffer(message, dtype='<u4', count=length, offset=8 + 12*length)
 
+            # optional group ids
+            groups = None
+            if len(message) >= 8 + 20*length:
+                groups = np.frombuffer(message, dtype='<u4', count=length, offset=8 + 16*length)
+
         except ValueError as err:
             logger.error('Malformatted dataset: %s', err)
             socket.close()
             return
 
-        data = [ dict(x=xs[i], y=ys[i], time=ts[i], value=values[i]) for i in range(length) ]
+        if length == 0:
+            logger.error('Received empty dataset')
+            socket.close()
+            return
+
+        data = dict(x=xs, y=ys, value=values, time=ts)
+        if groups is not None:
+            data['group'] = groups
         sockname = F'{socket.environ["SERVER_NAME"]}:{socket.environ["SERVER_PORT"]}{socket.environ["RAW_URI"]} -> {socket.environ["REMOTE_ADDR"]}:{socket.environ["REMOTE_PORT"]}'
         logger.info('Received dataset of length %d for socket "%s"', length, sockname)
 
-        handle_dataset(socket, data, logger)
+        # reserve memory for the dataset before creating it; the message
+        # itself is kept alive by the arrays viewing it
+        footprint = estimate_footprint(int(length), int(ts.max()) - int(ts.min()), grouped=groups is not None)
+        if not memory_budget.budget.acquire(footprint, memory_budget.wait_timeout):
+            send_over_capacity(socket, footprint, logger)
+            return
+
+        try:
+            with scheduler.task(socket, scheduler.sweep):
+                dataset = create_dataset(data, logger)
+        except:
+            memory_budget.budget.release(footprint)
+            raise
+
+        handle_dataset(socket, sessions.create(dataset, footprint, None, socket), logger)
 
     except ConnectionClosed:
         logger.info('Closed socket')
         socket.close()
 
 
-def handle_dataset(socket, data, logger, minutes=5, num_bins=25, scaling=1):
-    dataset = Dataset(data, timedelta(minutes=minutes).total_seconds(), num_bins, logger, scaling)
+def send_over_capacity(socket, requested, logger):
+    '''Refuse a session because the memory budget is exhausted, see README.md.'''
+    budget = memory_budget.budget
+    logger.error('Memory budget exhausted: %.1f MB requested, %.1f MB available', requested / 1e6, budget.available / 1e6)
+
+    metadata = dict(
+        reason='memory budget exhausted',
+        requested=requested,
+        available=budget.available,
+        budget=budget.limit,
+            )
+    metadata_bytes = json.dumps(metadata).encode()
+
+    header = np.zeros(2, dtype='<u4')
+    header[0] = 101  # message type 101: over capacity
+    header[1] = len(metadata_bytes)
+
+    try:
+        socket.send(header.tobytes() + metadata_bytes)
+    except ConnectionClosed:
+        pass
+
+    socket.close()
+
+
+def resume_session(socket, key, logger):
+    '''
+    If the socket URL has a `session` token, resume that session for dataset
+    `key` and tell the client whether this succeeded (see README.md).
+    Returns the session, or None.
+    '''
+    token = flask.request.args.get('session', None)
+    if token is None:
+        return None
+
+    session = sessions.resume(token, key, socket)
+    if session is None:
+        logger.info('Session to resume does not exist (anymore)')
+
+    metadata = dict(resumed=session is not None)
+    metadata_bytes = json.dumps(metadata).encode()
+
+    header = np.zeros(2, dtype='<u4')
+    header[0] = 7  # message type 7: session
+    header[1] = len(metadata_bytes)
+    socket.send(header.tobytes() + metadata_bytes)
+
+    # messages of background computations follow the SESSION message
+    if session is not None:
+        sessions.start_sending(session)
+
+    return session
+
+
+def handle_dataset(socket, session, logger):
+    '''
+    Serve the messages of a session. The memory reserved for the session in
+    the memory budget is updated to the footprint of the dataset after each
+    message, but kept at least at the estimate of the results the session
+    may still calculate. The computations for the messages go through the scheduler
+    (see scheduler.py), with the socket as owner. While no message is
+    waiting, pages of periods queued for prefetching are calculated, one at
+    a time, in slices between which the calculation gives way to arriving
+    messages. When the socket closes, the session is kept for resuming until
+    it expires, see sessions.py. The dataset is only used with the session
+    lock held, as the handler of a socket that the session was taken from
+    may still be computing on it.
+    '''
+    dataset = session.dataset
+    socket.session = session
 
     try:
         while socket.connected:
-            message = socket.receive()
-            handle_message(dataset, message, socket, logger)
+            message = socket.receive(timeout=0) if len(dataset.prefetch) > 0 else socket.receive()
+
+            with session.lock:
+                if session.socket is not socket:
+                    logger.info('Session taken over by another socket')
+                    break
+
+                dataset.logger = logger
+                if message is None:
+                    with scheduler.task(socket, scheduler.sweep):
+                        dataset.prefetch_page(stop=socket.has_message)
+                else:
+                    handle_message(dataset, message, socket, logger)
+
+                footprint = max(dataset.memory_footprint(), dataset.session_reserve())
+                memory_budget.budget.resize(session.charge, footprint)
+                session.charge = footprint
     except ConnectionClosed:
         logger.info('Closed socket')
         socket.close()
+    finally:
+        scheduler.pool.forget(socket)
+        sessions.detach(session, socket)
+
+
+# maximum number of periods in one request for additional data
+max_additional_periods = 100000
+# maximum number of cells of a period raster
+max_raster_cells = 4096
+# maximum number of windows of a spectrogram
+max_spectrogram_windows = 1000
+# maximum number of groups in a GROUPS message
+max_group_results = 64
+
+
+def _expand_period_range(p0, p1, count):
+    '''`count` periods from `p0` to `p1` (inclusive) in a geometric series.'''
+    if type(count) is not int or not 0 < count <= max_additional_periods:
+        raise ValueError(F'invalid number of periods: {count}')
+    if not (math.isfinite(p0) and math.isfinite(p1) and 0 < p0 <= p1):
+        raise ValueError(F'invalid period range: {p0} to {p1}')
+
+    return np.geomspace(p0, p1, count)
+
+
+def _validate_base_period(base_period):
+    if base_period is not None and (type(base_period) not in (int, float) or not (math.isfinite(base_period) and base_period > 0)):
+        raise ValueError(F'invalid base period: {base_period}')
+
+    return base_period
+
+
+def _parse_binary_period_request(message):
+    '''
+    Request ID, periods and base period (or None) of a binary REQUEST
+    ADDITIONAL DATA message, see README.md.
+    '''
+    requestId, encoding, count = np.frombuffer(message, dtype='<u4', count=3, offset=4)
+
+    if encoding == 0:
+        periods = np.frombuffer(message, dtype='<f4', count=count, offset=16)
+        end = 16 + 4 * int(count)
+    elif encoding == 1:
+        periods = np.frombuffer(message, dtype='<f8', count=count, offset=16)
+        end = 16 + 8 * int(count)
+    elif encoding == 2:
+        p0, p1 = np.frombuffer(message, dtype='<f8', count=2, offset=16)
+        periods = _expand_period_range(float(p0), float(p1), int(count))
+        end = 32
+    else:
+        raise ValueError(F'unknown period encoding: {encoding}')
+
+    base_period = None
+    if len(message) >= end + 8:
+        base_period = _validate_base_period(float(np.frombuffer(message, dtype='<f8', count=1, offset=end)[0]))
+
+    return int(requestId), periods, base_period
+
+
+def send_additional_data(dataset, periods, requestId, socket, logger, base_period=None):
+    try:
+        # raises for elements that are not numbers and for ragged lists
+        periods = np.asarray(periods, dtype='float')
+        if periods.ndim != 1 or not 0 < len(periods) <= max_additional_periods \
+                or not np.all(np.isfinite(periods) & (periods > 0)):
+            raise ValueError(F'{periods.size} periods of shape {periods.shape}')
+    except (TypeError, ValueError) as err:
+        logger.error('Additional data requested, but no valid periods passed: %s', err)
+        errmsg = np.zeros(1, dtype='<u4')
+        errmsg[0] = 100  # message type 100: error
+        socket.send(errmsg.tobytes())
+        return
+
+    logger.info('Calculating %d additional periods', len(periods))
+    try:
+        with scheduler.task(socket, scheduler.interactive):
+            b = dataset.calculate_additional_websocket_data(periods, requestId, base_period)
+        socket.send(b)
+    except:
+        logger.error('Something went wrong')  # TODO
+        errmsg = np.zeros(1, dtype='<u4')
+        errmsg[0] = 100  # message type 100: error
+        socket.send(errmsg.tobytes())
+
+
+# limits of significance calculations: number of surrogates and time budget
+# in seconds (the default if none is requested)
+max_surrogates = 1000
+max_significance_time = 600
+default_significance_time = 60
+
+
+def start_significance(dataset, socket, logger, requestId, count, method, seed, time_budget, jitter_width):
+    '''
+    Calculate significance scores in a background thread, which sends
+    SIGNIFICANCE PROGRESS messages and finally a SIGNIFICANCE message (see
+    README.md), while the session serves other requests. The thread works
+    on a copy of the dataset, so that changes of the display attribute or
+    the bin count in the meantime do not affect the result. The messages go
+    to the socket attached to the session when they are sent, so that a
+    socket that resumes the session receives them (see sessions.py).
+    '''
+    session = socket.session
+    snapshot = dataset.copy(logger)
+
+    def progress(completed):
+        sessions.send(session, snapshot.significance_progress_websocket_data(requestId, completed, count))
+
+    def run():
+        try:
+            with scheduler.task(socket, scheduler.sweep):
+                b = snapshot.significance_websocket_data(requestId, count, method, seed, time_budget, jitter_width, progress)
+            sessions.send(session, b)
+
+        except Exception as err:
+            logger.error('Could not calculate significance: %s', err)
+            errmsg = np.zeros(1, dtype='<u4')
+            errmsg[0] = 100  # message type 100: error
+            sessions.send(session, errmsg.tobytes())
+
+    session.background = threading.Thread(target=run, daemon=True)
+    session.background.start()
+
+
+def handle_binary_message(dataset, message, socket, logger):
+    try:
+        message_type = np.frombuffer(message, dtype='<u4', count=1, offset=0)[0]
+        if message_type == 6:
+            requestId, periods, base_period = _parse_binary_period_request(message)
+            send_additional_data(dataset, periods, requestId, socket, logger, base_period)
+
+        else:
+            logger.error('unknown binary message type: %d', message_type)
+
+            errmsg = np.zeros(1, dtype='<u4')
+            errmsg[0] = 100  # message type 100: error
+            socket.send(errmsg.tobytes())
+
+    except ValueError as err:
+        logger.error('Malformatted binary message: %s', err)
+
+        errmsg = np.zeros(1, dtype='<u4')
+        errmsg[0] = 100  # message type 100: error
+        socket.send(errmsg.tobytes())
 
 
 def handle_message(dataset, message, socket, logger):
+    if type(message) == bytes:
+        return handle_binary_message(dataset, message, socket, logger)
+
     try:
         j = json.loads(message)
         msgtype = j.get('type', None)
         if msgtype == 'ready':
+            columns = j.get('columns', None)
+            if columns is not None and (type(columns) is not list or any(c not in event_columns for c in columns)):
+                logger.error('Invalid columns requested: %s', columns)
+                errmsg = np.zeros(1, dtype='<u4')
+                errmsg[0] = 100  # message type 100: error
+                socket.send(errmsg.tobytes())
+                return
+
             logger.info('Sending data to socket')
 
             try:
-                b = dataset.to_websocket_bytestring()
+                with scheduler.task(socket, scheduler.update):
+                    b = dataset.to_websocket_bytestring(columns=event_columns if columns is None else columns)
                 socket.send(b)
             except:
                 logger.error('Something went wrong')  # TODO
@@ -121,37 +440,210 @@ def handle_message(dataset, message, socket, logger):
                 socket.send(errmsg.tobytes())
 
         elif msgtype == 'request additional data':
-            periods = j.get('periods', None)
-            if periods is None or not type(periods) == list or len(periods) == 0:
-                logger.error('Additional data requested, but no valid periods passed: %s', periods)
-                return
-
             requestId = j.get('requestId', None)
             if requestId is None or type(requestId) is not int:
                 logger.error('Invalid requestId: %s', requestId)
+                errmsg = np.zeros(1, dtype='<u4')
+                errmsg[0] = 100  # message type 100: error
+                socket.send(errmsg.tobytes())
+                return
+
+            period_range = j.get('periodRange', None)
+            if period_range is not None:
+                try:
+                    periods = _expand_period_range(period_range['min'], period_range['max'], period_range['count'])
+                except (TypeError, KeyError, ValueError) as err:
+                    logger.error('Additional data requested, but no valid period range passed: %s (%s)', period_range, err)
+                    errmsg = np.zeros(1, dtype='<u4')
+                    errmsg[0] = 100  # message type 100: error
+                    socket.send(errmsg.tobytes())
+                    return
+
+            else:
+                periods = j.get('periods', None)
+                if periods is None or not type(periods) == list or len(periods) == 0:
+                    logger.error('Additional data requested, but no valid periods passed: %s', periods)
+                    errmsg = np.zeros(1, dtype='<u4')
+                    errmsg[0] = 100  # message type 100: error
+                    socket.send(errmsg.tobytes())
+                    return
+
+            try:
+                base_period = _validate_base_period(j.get('basePeriod', None))
+            except ValueError as err:
+                logger.error('Additional data requested, but %s', err)
+                errmsg = np.zeros(1, dtype='<u4')
+                errmsg[0] = 100  # message type 100: error
+                socket.send(errmsg.tobytes())
+                return
+
+            send_additional_data(dataset, periods, requestId, socket, logger, base_period)
+
+        elif msgtype == 'request period range':
+            requestId = j.get('requestId', None)
+            start = j.get('start', None)
+            end = j.get('end', None)
+            if any(type(v) is not int for v in (requestId, start, end)) or not 0 <= start < end <= len(dataset.periods):
+                logger.error('Period range requested, but no valid range or requestId passed: %s, %s, %s', start, end, requestId)
+                # with the request ID, so that the client can tell which request failed
+                errmsg = np.zeros(2 if type(requestId) is int and 0 <= requestId < 1 << 32 else 1, dtype='<u4')
+                errmsg[0] = 100  # message type 100: error
+                errmsg[1:] = requestId
+                socket.send(errmsg.tobytes())
+                return
+
+            with scheduler.task(socket, scheduler.interactive):
+                b = dataset.period_page_websocket_data(start, end, requestId)
+            socket.send(b)
+
+        elif msgtype == 'request period raster':
+            width = j.get('width', None)
+            height = j.get('height', None)
+            requestId = j.get('requestId', None)
+            if any(type(v) is not int for v in (width, height, requestId)) or not (0 < width and 0 < height and width * height <= max_raster_cells):
+                logger.error('Period raster requested, but no valid size or requestId passed: %s, %s, %s', width, height, requestId)
+                errmsg = np.zeros(1, dtype='<u4')
+                errmsg[0] = 100  # message type 100: error
+                socket.send(errmsg.tobytes())
+                return
+
+            logger.info('Calculating period raster of %dx%d cells', width, height)
+            with scheduler.task(socket, scheduler.sweep):
+                b = dataset.period_raster_websocket_data(width, height, requestId)
+            socket.send(b)
+
+        elif msgtype == 'request spectrogram':
+            width = j.get('width', None)
+            stride = j.get('stride', None)
+            requestId = j.get('requestId', None)
+            if any(type(v) not in (int, float) or v <= 0 for v in (width, stride)) or type(requestId) is not int \
+                    or (dataset.dt - width) / stride > max_spectrogram_windows:
+                logger.error('Spectrogram requested, but no valid window or requestId passed: %s, %s, %s', width, stride, requestId)
+                errmsg = np.zeros(1, dtype='<u4')
+                errmsg[0] = 100  # message type 100: error
+                socket.send(errmsg.tobytes())
+                return
+
+            with scheduler.task(socket, scheduler.sweep):
+                b = dataset.spectrogram_websocket_data(width, stride, requestId)
+            socket.send(b)
+
+        elif msgtype == 'request groups':
+            requestId = j.get('requestId', None)
+            top_k = j.get('topK', None)
+            if type(requestId) is not int or not (top_k is None or type(top_k) is int and top_k > 0) \
+                    or dataset.group_keys is None:
+                logger.error('Groups requested, but no valid topK or requestId passed, or the dataset has no groups: %s, %s',
+                        top_k, requestId)
+                errmsg = np.zeros(1, dtype='<u4')
+                errmsg[0] = 100  # message type 100: error
+                socket.send(errmsg.tobytes())
+                return
+
+            # the results of each group span all periods, so their number is bounded, and
+            # their memory is reserved while they are calculated and sent
+            top_k = min(top_k or max_group_results, max_group_results, len(dataset.group_keys))
+            reserve = dataset.groups_reserve(top_k)
+            if not memory_budget.budget.acquire(reserve, memory_budget.wait_timeout):
+                logger.error('Groups requested, but their %.1f MB exceed the memory budget', reserve / 1e6)
+                errmsg = np.zeros(1, dtype='<u4')
+                errmsg[0] = 100  # message type 100: error
+                socket.send(errmsg.tobytes())
                 return
 
-            logger.info('Calculating %d additional periods', len(periods))
             try:
-                b = dataset.calculate_additional_websocket_data(periods, requestId)
+                with scheduler.task(socket, scheduler.sweep):
+                    b = dataset.groups_websocket_data(requestId, top_k)
                 socket.send(b)
-            except:
-                logger.error('Something went wrong')  # TODO
+            finally:
+                memory_budget.budget.release(reserve)
+
+        elif msgtype == 'request significance':
+            requestId = j.get('requestId', None)
+            count = j.get('count', None)
+            method = j.get('method', 'shuffle')
+            seed = j.get('seed', 0)
+            time_budget = j.get('timeBudget', default_significance_time)
+            jitter_width = j.get('jitterWidth', None)
+            if type(requestId) is not int or type(count) is not int or not 0 < count <= max_surrogates \
+                    or method not in surrogate_methods or type(seed) is not int or seed < 0 \
+                    or type(time_budget) not in (int, float) or not 0 < time_budget <= max_significance_time \
+                    or not (jitter_width is None or type(jitter_width) in (int, float) and math.isfinite(jitter_width) and jitter_width > 0):
+                logger.error('Significance requested, but no valid parameters passed: %s', j)
+                errmsg = np.zeros(1, dtype='<u4')
+                errmsg[0] = 100  # message type 100: error
+                socket.send(errmsg.tobytes())
+                return
+
+            if socket.session.background is not None and socket.session.background.is_alive():
+                logger.error('Significance requested, but a background calculation is still running')
                 errmsg = np.zeros(1, dtype='<u4')
-                errmsg[0] = 2  # message type 2: error
+                errmsg[0] = 100  # message type 100: error
                 socket.send(errmsg.tobytes())
+                return
+
+            start_significance(dataset, socket, logger, requestId, count, method, seed, time_budget, jitter_width)
+
+        elif msgtype == 'request columns':
+            requestId = j.get('requestId', None)
+            columns = j.get('columns', None)
+            time_range = j.get('timeRange', None)
+            max_count = j.get('maxCount', None)
+            if type(requestId) is not int or type(columns) is not list or len(columns) == 0 \
+                    or any(c not in event_columns for c in columns) \
+                    or not (time_range is None or type(time_range) is list and len(time_range) == 2
+                            and all(type(v) in (int, float) and math.isfinite(v) for v in time_range)) \
+                    or not (max_count is None or type(max_count) is int and max_count > 0):
+                logger.error('Columns requested, but no valid columns, range or requestId passed: %s, %s, %s, %s',
+                        columns, time_range, max_count, requestId)
+                errmsg = np.zeros(1, dtype='<u4')
+                errmsg[0] = 100  # message type 100: error
+                socket.send(errmsg.tobytes())
+                return
+
+            with scheduler.task(socket, scheduler.update):
+                b = dataset.columns_websocket_data(columns, requestId, time_range, max_count)
+            socket.send(b)
 
         elif msgtype == 'set display attribute':
             attribute = j.get('attribute', None)
             if attribute is None:
                 logger.error('Set display attribute requested, but no valid attribute set')
                 errmsg = np.zeros(1, dtype='<u4')
-                errmsg[0] = 2  # message type 2: error
+                errmsg[0] = 100  # message type 100: error
+                socket.send(errmsg.tobytes())
+                return
+
+            try:
+                with scheduler.task(socket, scheduler.update):
+                    dataset.change_attribute_type(attribute)
+                    b = dataset.to_partial_websocket_bytestring()
+            except ValueError as err:
+                logger.error('Invalid display attribute: %s', err)
+                errmsg = np.zeros(1, dtype='<u4')
+                errmsg[0] = 100  # message type 100: error
+                socket.send(errmsg.tobytes())
+                return
+
+            socket.send(b)
+
+        elif msgtype == 'set bin count':
+            num_bins = j.get('numBins', None)
+            try:
+                if type(num_bins) is not int:
+                    raise ValueError(F'not an integer: {num_bins}')
+
+                with scheduler.task(socket, scheduler.update):
+                    dataset.change_num_bins(num_bins)
+                    b = dataset.to_partial_websocket_bytestring()
+            except ValueError as err:
+                logger.error('Invalid bin count: %s', err)
+                errmsg = np.zeros(1, dtype='<u4')
+                errmsg[0] = 100  # message type 100: error
                 socket.send(errmsg.tobytes())
                 return
 
-            dataset.change_attribute_type(attribute)
-            b = dataset.to_websocket_bytestring(message_type = 3)  # replace dataset
+            logger.info('Changed bin count to %d', num_bins)
             socket.send(b)
 
         else:
@@ -0,0 +1,198 @@
+'''
+Vector strength and circular moments for a whole grid of periods at once.
+
+The k-th circular moment of events at times t for period p is
+
+    C_k(p) = sum_e w_e exp(2 pi i k t_e / p) / sum_e w_e,
+
+and the vector strength is |C_1(p)|. Evaluated directly, this costs
+O(n * P) complex exponentials for n events and P periods. Here, the events
+are instead binned onto a uniform grid of spacing h, and the sum is
+evaluated for all frequencies f = k / p at once from a few FFTs of the
+binned event train:
+
+    - each event time is split into a grid point and an offset u, with
+      |u| <= h / 2, and exp(-2 pi i f u) is expanded into a Taylor series
+      (the m-th term needs the bin sums of w * u^m);
+    - each frequency f is split into the nearest FFT frequency and an
+      offset delta, and exp(-2 pi i delta tau) is expanded into a Taylor
+      series around the center of the grid (the l-th term needs the FFT of
+      the binned sums multiplied by tau^l).
+
+Both expansions have arguments of magnitude at most pi / 2 with the
+oversampling factors used here, so their truncation errors are bounded by
+x^(K+1) / (K+1)!. The orders are chosen so that the error of every
+returned moment is at most `tolerance` (in absolute terms, moments are in
+[0, 1]), see `error_bound`. The total cost is O(n + F log F) per term,
+where F is proportional to (t1 - t0) / min(periods).
+'''
+
+import logging
+import sys
+import math
+import numpy as np
+import scipy.fft
+
+logger = logging.getLogger(vars(sys.modules[__name__])['__package__'])
+
+
+# grid points per shortest evaluated wavelength; bounds the event offset term
+# (must be at least 2, so that all frequencies are below the Nyquist limit)
+_time_oversampling = 2
+
+# FFT length relative to the grid length; bounds the frequency offset term
+_frequency_oversampling = 1
+
+
+def _taylor_order(x, tolerance):
+    '''Smallest order K for which x^(K+1) / (K+1)! <= tolerance.'''
+    order = 0
+    term = x
+    while term > tolerance:
+        order += 1
+        term *= x / (order + 1)
+
+    return order
+
+
+def _taylor_error(x, order):
+    return x ** (order + 1) / math.factorial(order + 1)
+
+
+def error_bound(x_offset, order_offset, x_delta, order_delta):
+    '''
+    Upper bound for the absolute error of a normalized moment, given the
+    maximum arguments and truncation orders of both Taylor expansions.
+    '''
+    e_offset = _taylor_error(x_offset, order_offset)
+    e_delta = _taylor_error(x_delta, order_delta)
+
+    return e_offset + e_delta + e_offset * e_delta
+
+
+def circular_moments(ts, periods, num_moments=1, weights=None, t0=None, tolerance=1e-6):
+    '''
+    Circular moments C_1 to C_num_moments of the events `ts` for each of
+    `periods`, as a complex array of shape (len(periods), num_moments). The
+    phase is measured relative to `t0`, which defaults to the earliest
+    event.
+    '''
+    ts = np.asarray(ts)
+    weights = np.ones(len(ts)) if weights is None else np.asarray(weights, dtype='float')
+
+    return chunked_circular_moments([(ts, weights)], ts.min(), ts.max(), periods, num_moments, t0, tolerance)
+
+
+def chunked_circular_moments(chunks, tmin, tmax, periods, num_moments=1, t0=None, tolerance=1e-6):
+    '''
+    `circular_moments` of events given as `chunks`, an iterable of (ts,
+    weights) pairs with all times in [`tmin`, `tmax`], which is iterated
+    once. Only the binned event train is kept in memory, so the events do
+    not have to fit into memory at once. Times are integers if `tmin` is.
+    '''
+    periods = np.asarray(periods, dtype='float')
+    t0 = tmin if t0 is None else t0
+
+    frequencies = np.arange(1, num_moments + 1)[np.newaxis, :] / periods[:, np.newaxis]
+    f_max = frequencies.max()
+
+    # grid spacing; integer timestamps on an integer grid have no offsets
+    h = 1 / (_time_oversampling * f_max)
+    integer_times = np.issubdtype(np.asarray(tmin).dtype, np.integer)
+    if integer_times and h <= 1 and f_max < 0.5:
+        h = 1
+
+    M = int(np.rint(float(tmax - tmin) / h)) + 1
+    F = 2 * scipy.fft.next_fast_len(math.ceil(_frequency_oversampling * M / 2), real=True)
+
+    # maximum arguments of both expansions
+    x_offset = 2 * math.pi * f_max * h / 2
+    x_delta = math.pi * (M - 1) / (2 * F) if M > 1 else 0
+
+    order_offset = 0 if integer_times and h == 1 else _taylor_order(x_offset, tolerance / 2)
+    order_delta = _taylor_order(x_delta, tolerance / 2)
+
+    logger.debug('Circular moments for %d frequencies: %d FFTs of length %d, error bound %g',
+            frequencies.size, (order_offset + 1) * (order_delta + 1), F,
+            error_bound(x_offset, order_offset, x_delta, order_delta))
+
+    # nearest FFT frequency and (normalized) offset from it
+    f = frequencies.ravel()
+    k = np.rint(f * F * h).astype('int64')
+    delta = f - k / (F * h)
+
+    # grid positions relative to the grid center, normalized to [-1, 1]
+    tc = (M - 1) * h / 2
+    tau = (np.arange(M) * h - tc) / tc if M > 1 else np.zeros(M)
+
+    # Taylor coefficients (-2 pi i f u)^m / m! and (-2 pi i delta tau)^l / l!,
+    # with u and tau normalized to [-1, 1]
+    a = -2j * math.pi * f * (h / 2)
+    b = -2j * math.pi * delta * tc
+
+    # bin sums of w * u^m per order m, accumulated over the chunks
+    binned = np.zeros((order_offset + 1, M))
+    total_weight = 0
+    for ts, weights in chunks:
+        t = (np.asarray(ts) - tmin).astype('float')
+        j = np.rint(t / h).astype('int64')
+        u_norm = (t - j * h) / (h / 2)
+
+        weighted_offsets = np.array(weights, dtype='float')
+        for m in range(order_offset + 1):
+            if m > 0:
+                weighted_offsets *= u_norm
+
+            binned[m] += np.bincount(j, weights=weighted_offsets, minlength=M)
+
+        total_weight += np.sum(weights)
+
+    result = np.zeros(f.shape, dtype='complex')
+    for m in range(order_offset + 1):
+        W = binned[m]
+        coefficient_m = a ** m / math.factorial(m)
+
+        for l in range(order_delta + 1):
+            if l > 0:
+                W *= tau
+
+            G = scipy.fft.rfft(W, n=F)[k]
+            result += coefficient_m * b ** l / math.factorial(l) * G
+
+    # frequency offset at the center of the grid, then shift to reference time t0
+    result *= np.exp(-2j * math.pi * (delta * tc + f * (tmin - t0)))
+
+    # conjugate for positive phase convention
+    return np.conj(result).reshape(frequencies.shape) / total_weight
+
+
+def direct_circular_moments(ts, periods, num_moments=1, weights=None, t0=None):
+    '''Reference implementation of `circular_moments`, O(n * P).'''
+    ts = np.asarray(ts)
+    weights = np.ones(len(ts)) if weights is None else np.asarray(weights, dtype='float')
+    t0 = ts.min() if t0 is None else t0
+    t = (ts - t0).astype('float')
+
+    result = np.zeros((len(periods), num_moments), dtype='complex')
+    for i, period in enumerate(periods):
+        phases = 2 * math.pi * np.remainder(t, period) / period
+        for k in range(1, num_moments + 1):
+            result[i, k - 1] = np.sum(weights * np.exp(1j * k * phases))
+
+    return result / weights.sum()
+
+
+def vectorstrengths(ts, periods, weights=None, tolerance=1e-6):
+    '''Vector strength of `ts` for each of `periods`.'''
+    return np.abs(circular_moments(ts, periods, weights=weights, tolerance=tolerance)[:, 0])
+
+
+def max_error(ts, periods, num_moments=1, weights=None, tolerance=1e-6):
+    '''
+    Largest absolute difference between `circular_moments` and
+    `direct_circular_moments`, to check the error bound on a dataset.
+    '''
+    approximate = circular_moments(ts, periods, num_moments, weights, tolerance=tolerance)
+    exact = direct_circular_moments(ts, periods, num_moments, weights)
+
+    return np.abs(approximate - exact).max()
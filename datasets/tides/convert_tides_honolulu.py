@@ -1,36 +1,55 @@
 #!/usr/bin/env python3
 
 import argparse
-import csv
 import numpy as np
-import datetime
 
-def work(infile, outfile):
-    c = list(csv.DictReader(infile))
-    ts = np.array([float(v['timestamp']) for v in c])
-    vals = np.array([float(v['value']) for v in c])
+import pipeline
 
-    # 0.5 might be a good threshold
-    print('values above 0.5:', len(vals[vals > 0.5]))
+# 0.5 might be a good threshold
+threshold = 0.5
 
-    i = (vals > 0.5)
+def convert_chunk(chunk):
+    ts = chunk['timestamp'].astype('float')
+    vals = chunk['value'].astype('float')
 
-    outfile.write('x,y,time,value\n')
+    i = (vals > threshold)
+    ts = ts[i]
+    vals = vals[i]
 
-    # create dataset. x/y positions are day in year/year
-    for t,v in zip(ts[i], vals[i]):
-        d = datetime.datetime.fromtimestamp(t)
-        day_of_year = int(d.strftime('%j'))
-        year = d.year
+    # create dataset. x/y positions are day in year/year (in UTC)
+    dates = ts.astype('int64').astype('datetime64[s]')
+    years = dates.astype('datetime64[Y]')
+    day_of_year = (dates.astype('datetime64[D]') - years).astype('int64') + 1
 
+    return dict(
+        x = day_of_year,
+        y = years.astype('int64') + 1970,
         # divide timestamp by 60*24 to make minutes days
-        outfile.write(F'{day_of_year},{year},{int(t / (24 * 60))},{v}\n')
+        time = np.trunc(ts / (24 * 60)),
+        value = vals,
+        )
+
+
+def work(infile, outfile, chunk_size=pipeline.default_chunk_size, sort=False):
+    count = 0
+
+    def chunks():
+        nonlocal count
+        for chunk in pipeline.read_chunks(infile, chunk_size):
+            converted = convert_chunk(chunk)
+            count += len(converted['time'])
+            yield converted
+
+    pipeline.write(outfile, chunks(), sort=sort)
+    print(F'values above {threshold}:', count)
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('infile', type=argparse.FileType('r'), help='input CSV file')
-    parser.add_argument('outfile', type=argparse.FileType('w'), help='output CSV file')
+    parser.add_argument('outfile', help='output CSV file, or columnar file if it ends with ".columns"')
+    parser.add_argument('--chunk-size', type=int, default=pipeline.default_chunk_size, help='number of rows processed at once (default: %(default)s)')
+    parser.add_argument('--sort', action='store_true', help='sort the events by time (columnar output only)')
 
     parsed = parser.parse_args()
-    work(parsed.infile, parsed.outfile)
+    work(parsed.infile, parsed.outfile, parsed.chunk_size, parsed.sort)
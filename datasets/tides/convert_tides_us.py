@@ -1,43 +1,57 @@
 #!/usr/bin/env python3
 
 import pyproj
-import csv
 import argparse
-import random
-import math
-import datetime
+import numpy as np
 
-def convert(infile, outfile):
-    proj = pyproj.Transformer.from_crs("EPSG:4326", "EPSG:3857")
+import pipeline
+
+def convert_chunk(chunk, proj, rng, stations):
+    # dates are month/day/year, interpreted as UTC
+    month, day, year = np.array(np.char.split(chunk['date'], '/').tolist(), dtype='int64').T
+    dates = (year - 1970).astype('datetime64[Y]').astype('datetime64[M]') + (month - 1)
+    dates = dates.astype('datetime64[D]') + (day - 1)
+    t = dates.astype('datetime64[s]').astype('int64')
+
+    x, y = proj.transform(chunk['lat'].astype('float'), chunk['lng'].astype('float'))
 
-    r = csv.DictReader(infile)
-    w = csv.DictWriter(outfile, ['x', 'y', 'time', 'value'])
+    # jitter positions uniformly within a 200 km radius
+    delta = np.sqrt(rng.uniform(0, 200000*200000, len(t)))
+    angle = rng.uniform(0, 2 * np.pi, len(t))
 
-    w.writeheader()
+    # group events by measuring station, with numbers shared across chunks
+    station_ids, station_index = np.unique(chunk['station_id'], return_inverse=True)
+    groups = np.array([ stations.setdefault(s, len(stations)) for s in station_ids.tolist() ], dtype='int64')
 
-    for val in r:
-        d = datetime.datetime.strptime(val['date'], '%m/%d/%Y')
-        t = d.timestamp()
+    return dict(
+        x = x + np.cos(angle) * delta,
+        y = y + np.sin(angle) * delta,
+        time = t,
+        value = np.zeros(len(t), dtype='int64'),
+        group = groups[station_index],
+        )
 
-        x, y = proj.transform(float(val['lat']), float(val['lng']))
 
-        delta = math.sqrt(random.uniform(0, 200000*200000))
-        angle = random.uniform(0, 2 * math.pi)
+def convert(infile, outfile, seed=123456, chunk_size=pipeline.default_chunk_size, sort=False):
+    proj = pyproj.Transformer.from_crs("EPSG:4326", "EPSG:3857")
+    rng = np.random.default_rng(seed)
+    stations = dict()
+
+    chunks = ( convert_chunk(chunk, proj, rng, stations) for chunk in pipeline.read_chunks(infile, chunk_size) )
 
-        w.writerow(dict(
-            x = x + math.cos(angle) * delta,
-            y = y + math.sin(angle) * delta,
-            time = t,
-            value = 0,
-            ))
+    # the dataset definition scales seconds to days-as-minutes
+    pipeline.write(outfile, chunks, time_scaling=1.0 / (24 * 60), sort=sort)
 
 
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('infile', type=argparse.FileType('r'), help='input CSV file')
-    parser.add_argument('outfile', type=argparse.FileType('w'), help='output CSV file')
+    parser.add_argument('outfile', help='output CSV file, or columnar file if it ends with ".columns"')
+    parser.add_argument('--seed', type=int, default=123456, help='random seed for the position jitter (default: %(default)s)')
+    parser.add_argument('--chunk-size', type=int, default=pipeline.default_chunk_size, help='number of rows processed at once (default: %(default)s)')
+    parser.add_argument('--sort', action='store_true', help='sort the events by time (columnar output only)')
 
     parsed = parser.parse_args()
 
-    convert(parsed.infile, parsed.outfile)
+    convert(parsed.infile, parsed.outfile, parsed.seed, parsed.chunk_size, parsed.sort)
@@ -0,0 +1,74 @@
+'''
+Chunked reading and writing for the tide converters, so that inputs larger
+than memory stream through them.
+'''
+
+import csv
+import functools
+import importlib.util
+import itertools
+import os.path
+import sys
+import numpy as np
+
+# loaded by path, as importing the backend package would start the server
+# application and discover the datasets
+_spec = importlib.util.spec_from_file_location('columnar',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'backend', 'columnar.py'))
+columnar = sys.modules[_spec.name] = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(columnar)
+
+
+default_chunk_size = 1 << 20
+
+
+def read_chunks(infile, chunk_size=default_chunk_size):
+    '''Chunks of up to `chunk_size` rows of a CSV file, as dicts of string arrays by column.'''
+    reader = csv.reader(infile)
+    header = next(reader)
+
+    while True:
+        rows = list(itertools.islice(reader, chunk_size))
+        if len(rows) == 0:
+            return
+
+        columns = np.array(rows, dtype='str').T
+        yield dict(zip(header, columns))
+
+
+def _write_csv(filename, chunks):
+    with open(filename, 'w') as f:
+        grouped = None
+        for chunk in chunks:
+            if grouped is None:
+                grouped = 'group' in chunk
+                f.write('x,y,time,value,group\n' if grouped else 'x,y,time,value\n')
+
+            # numpy converts floats to their shortest representation
+            x, y, value = ( np.asarray(chunk[k]).astype('str') for k in ('x', 'y', 'value') )
+            time = np.asarray(chunk['time']).astype('int64').astype('str')
+
+            columns = (x, ',', y, ',', time, ',', value)
+            if grouped:
+                columns += (',', np.asarray(chunk['group']).astype('int64').astype('str'))
+
+            lines = functools.reduce(np.char.add, columns)
+            if len(lines) > 0:
+                f.write('\n'.join(lines.tolist()) + '\n')
+
+        if grouped is None:
+            f.write('x,y,time,value\n')
+
+
+def write(filename, chunks, time_scaling=1.0, sort=False):
+    '''
+    Write the chunks (dicts of x, y, time, value and optionally group
+    arrays) as CSV or, if `filename` ends with ".columns", in the columnar
+    format. For the latter, times are multiplied by `time_scaling` and
+    truncated like the run function of the dataset definition does it.
+    '''
+    if filename.endswith('.columns'):
+        scaled = ( dict(chunk, time=np.trunc(chunk['time'] * time_scaling)) for chunk in chunks )
+        columnar.write(filename, scaled, sort)
+    else:
+        _write_csv(filename, chunks)
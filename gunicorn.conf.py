@@ -0,0 +1,7 @@
+# gunicorn configuration, loaded by default from the working directory
+
+
+def post_worker_init(worker):
+    # load and precompute datasets in the background, see dataset_discovery.py
+    from backend import dataset_discovery
+    dataset_discovery.start_prewarm()
@@ -4,6 +4,7 @@ set -euo pipefail
 
 poetry run python -m gunicorn \
   --reload \
+  --workers "${WORKERS:-1}" \
   --threads 100 \
   --access-logfile - \
   backend:app
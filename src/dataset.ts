@@ -7,7 +7,13 @@ enum BackendMessageType {
   SUPPLEMENT_DATASET = 1,
   UPLOAD_DATASET = 2,
   REPLACE_DATASET = 3,
+  REQUEST_ADDITIONAL_DATA = 6,
+  SESSION = 7,
+  PARTIAL_REPLACE = 8,
+  COLUMNS = 9,
+  PERIOD_PAGE = 13,
   ERROR = 100,
+  OVER_CAPACITY = 101,
 };
 
 export enum DisplayAttributeType {
@@ -62,6 +68,50 @@ class DatasetInternal extends EventTarget {  // {{{
     this.rebuildIndex();
   }
 
+  private sessionToken: string | null = null;
+
+  /**
+    * Reconnect with the session token whenever the socket closes, so that
+    * the backend reattaches the session instead of recomputing the dataset.
+    */
+  enableResume(sessionToken: string | null): void {
+    this.sessionToken = sessionToken;
+    if (sessionToken !== null) this.socket.addEventListener('close', () => this.reconnect(), { once: true });
+  }
+
+  private async reconnect(): Promise<void> {
+    if (this.sessionToken === null) return;
+
+    const url = new URL(this.socket.url);
+    url.searchParams.set('session', this.sessionToken);
+
+    const socket = new WebSocket(url.toString());
+    socket.binaryType = 'arraybuffer';
+
+    // the backend answers with a SESSION message telling whether it resumed the session
+    const resumed = await new Promise<boolean>(resolve => {
+      socket.addEventListener('message', event => {
+        const view = new DataView(event.data);
+        if (view.getUint32(0, true) !== BackendMessageType.SESSION) return resolve(false);
+
+        const metadataLength = view.getUint32(4, true);
+        const metadata = JSON.parse(new TextDecoder().decode(new Uint8Array(event.data, 8, metadataLength)));
+        resolve(metadata.resumed);
+      }, { once: true });
+      socket.addEventListener('close', () => resolve(false), { once: true });
+    });
+
+    if (!resumed) {
+      console.log(`could not resume session for dataset ${this.datasetId}`);
+      socket.close();
+      return;
+    }
+
+    console.log(`resumed session for dataset ${this.datasetId}`);
+    this.socket = socket;
+    this.socket.addEventListener('close', () => this.reconnect(), { once: true });
+  }
+
   private rebuildIndex() {
     const indexedBins: Array<[number, number]> = Array.from(this.binning)
       .map((value, index) => [value, index]);
@@ -154,6 +204,7 @@ class DatasetInternal extends EventTarget {  // {{{
     if (i < 0 || i >= this.periodCount) throw new Error(`cannot assign index ${i} to dataset`);
 
     this._index = i;
+    this.loadPageAround(this.period);
     this.notify();
   }
 
@@ -166,6 +217,7 @@ class DatasetInternal extends EventTarget {  // {{{
       throw new Error(`outside period domain (${this.periodDomain}): ${p}`);
 
     this._index = bisectCenter(this.periods, p);
+    this.loadPageAround(p);
     this.notify();
   }
 
@@ -222,15 +274,23 @@ class DatasetInternal extends EventTarget {  // {{{
   }
 
   private requestId: number = 0;
-  async loadAdditionalPeriods(periods: Array<number>, splice: boolean = false): Promise<AdditionalData> {
+  /**
+    * Request data for additional periods. Sub-harmonics `basePeriod / k` of
+    * the optional `basePeriod` are derived from its histogram by the backend.
+    */
+  async loadAdditionalPeriods(periods: Array<number>, splice: boolean = false, basePeriod?: number): Promise<AdditionalData> {
     const requestId = this.requestId++;
 
-    const message = {
-      type: 'request additional data',
-      periods: periods.map(d => d / this.temporalDomainScaling),
-      requestId,
-    };
-    const messageBytes = new TextEncoder().encode(JSON.stringify(message));
+    // binary request: message type, request ID, encoding (1: f64), count, periods, optional base period
+    const hasBasePeriod = basePeriod !== undefined;
+    const messageBytes = new ArrayBuffer(16 + 8 * periods.length + (hasBasePeriod ? 8 : 0));
+    const messageView = new DataView(messageBytes);
+    messageView.setUint32(0, BackendMessageType.REQUEST_ADDITIONAL_DATA, true);
+    messageView.setUint32(4, requestId, true);
+    messageView.setUint32(8, 1, true);
+    messageView.setUint32(12, periods.length, true);
+    periods.forEach((d, i) => messageView.setFloat64(16 + 8 * i, d / this.temporalDomainScaling, true));
+    if (hasBasePeriod) messageView.setFloat64(16 + 8 * periods.length, basePeriod / this.temporalDomainScaling, true);
 
     const viewPromise = new Promise<DataView>((resolve, reject) => {
       const fn = (event: MessageEvent) => {
@@ -238,6 +298,9 @@ class DatasetInternal extends EventTarget {  // {{{
 
         const view = new DataView(event.data);
         const first = view.getUint32(0, true);
+        if (first === BackendMessageType.COLUMNS) return;  // answer to `loadColumns`
+        if (first === BackendMessageType.PERIOD_PAGE) return;  // answer to `loadPeriodRange`
+        if (first === BackendMessageType.ERROR && view.byteLength >= 8) return;  // failed `loadPeriodRange`
         if (first !== BackendMessageType.SUPPLEMENT_DATASET) return reject(`unexpected message type: ${first}`);
 
         const second = view.getUint32(4, true);
@@ -301,6 +364,148 @@ class DatasetInternal extends EventTarget {  // {{{
     return additionalData;
   }
 
+  private pageSize: number | null = null;
+  private gridPeriods: Array<number> = [];
+  private requestedPages: Set<number> = new Set();
+
+  /**
+    * For datasets whose histograms are calculated in pages of `pageSize`
+    * periods of the period grid, load the page of the current period now
+    * and further pages when the period changes. Periods on pages that have
+    * not been loaded have NaN histograms and entropies.
+    */
+  enablePages(pageSize: number | null): void {
+    this.pageSize = pageSize;
+    this.gridPeriods = [...this.periods];
+    this.loadPageAround(this.period);
+  }
+
+  private loadPageAround(period: number): void {
+    if (this.pageSize === null || this.gridPeriods.length === 0) return;
+
+    const page = Math.floor(bisectCenter(this.gridPeriods, period) / this.pageSize);
+    if (this.requestedPages.has(page)) return;
+    this.requestedPages.add(page);
+
+    const start = page * this.pageSize;
+    const end = Math.min(start + this.pageSize, this.gridPeriods.length);
+    this.loadPeriodRange(start, end).catch(err => {
+      this.requestedPages.delete(page);
+      console.error(`could not load periods ${start} to ${end} of dataset ${this.datasetId}: ${err}`);
+    });
+  }
+
+  /**
+    * Fetch the histograms, entropies and vector strengths of the periods
+    * [start, end) of the period grid and write them into the rows of
+    * these periods.
+    */
+  async loadPeriodRange(start: number, end: number): Promise<void> {
+    const requestId = this.requestId++;
+
+    const viewPromise = new Promise<DataView>((resolve, reject) => {
+      const fn = (event: MessageEvent) => {
+        if (!(event.data instanceof ArrayBuffer)) return;
+
+        // errors for period ranges carry the request ID, other errors are not ours
+        const view = new DataView(event.data);
+        const first = view.getUint32(0, true);
+        if (view.byteLength < 8 || view.getUint32(4, true) !== requestId) return;
+        if (first !== BackendMessageType.PERIOD_PAGE && first !== BackendMessageType.ERROR) return;
+
+        this.socket.removeEventListener('message', fn);
+        if (first === BackendMessageType.ERROR) reject('error while loading periods');
+        else resolve(view);
+      };
+      this.socket.addEventListener('message', fn);
+    });
+    this.socket.send(JSON.stringify({ type: 'request period range', requestId, start, end }));
+
+    const view = await viewPromise;
+    const metadataLength = view.getUint32(8, true);
+    const metadata = JSON.parse(new TextDecoder().decode(new Uint8Array(view.buffer, 12, metadataLength)));
+    const { periodCount, numBins } = metadata;
+
+    // after a change of the bin count, the rows came with the replaced arrays already
+    if (numBins !== this.numBins) return;
+
+    // same layout as SUPPLEMENT DATASET messages: histograms, entropies, vector strengths, periods
+    const offset = 12 + metadataLength;
+    const entropiesOffset = offset + 4 * this.numBins * periodCount;
+    const vectorstrengthsOffset = entropiesOffset + 4 * periodCount;
+    const periodsOffset = vectorstrengthsOffset + 4 * periodCount;
+
+    // the rows of the periods may have moved through additional periods
+    const histograms = new Float32Array(this.histograms);
+    const entropies = new Float32Array(this.entropies);
+    const vectorstrengths = new Float32Array(this.vectorstrengths);
+    for (let i = 0; i < periodCount; ++i) {
+      const period = view.getFloat32(periodsOffset + 4 * i, true) * this.temporalDomainScaling;
+      const index = bisectLeft(this.periods, period);
+      if (this.periods[index] !== period) continue;
+
+      for (let j = 0; j < this.numBins; ++j) {
+        histograms[j + index * this.numBins] = view.getFloat32(offset + 4 * (j + i * this.numBins), true);
+      }
+      entropies[index] = view.getFloat32(entropiesOffset + 4 * i, true);
+      vectorstrengths[index] = view.getFloat32(vectorstrengthsOffset + 4 * i, true);
+    }
+
+    console.log(`received periods ${start} to ${end} for dataset ${this.datasetId}`);
+    this.histograms = histograms;
+    this.entropies = entropies;
+    this.vectorstrengths = vectorstrengths;
+    this.notify();
+  }
+
+  /**
+    * Fetch the per-event columns, which are left out of the BEGIN DATASET
+    * message, and replace the datapoints with them.
+    */
+  async loadColumns(): Promise<void> {
+    const requestId = this.requestId++;
+
+    const viewPromise = new Promise<DataView>((resolve, reject) => {
+      const fn = (event: MessageEvent) => {
+        if (!(event.data instanceof ArrayBuffer)) return;
+
+        const view = new DataView(event.data);
+        const first = view.getUint32(0, true);
+        if (first === BackendMessageType.ERROR) reject('error while loading columns');
+        if (first !== BackendMessageType.COLUMNS || view.getUint32(4, true) !== requestId) return;
+
+        this.socket.removeEventListener('message', fn);
+        resolve(view);
+      };
+      this.socket.addEventListener('message', fn);
+    });
+    this.socket.send(JSON.stringify({ type: 'request columns', requestId, columns: EVENT_COLUMNS }));
+
+    const view = await viewPromise;
+    const metadataLength = view.getUint32(8, true);
+    const metadata = JSON.parse(new TextDecoder().decode(new Uint8Array(view.buffer, 12, metadataLength)));
+    const { count } = metadata;
+
+    // xs, ys and values (f32), then ts (u32)
+    let offset = 12 + metadataLength;
+    const [xs, ys, values] = [0, 1, 2].map(_ => {
+      const data = new Float32Array(count);
+      for (let i = 0; i < count; ++i) data[i] = view.getFloat32(offset + i * 4, true);
+      offset += count * 4;
+      return data;
+    });
+
+    const datapoints: Array<Datapoint> = [];
+    for (let i = 0; i < count; ++i) {
+      const time = view.getUint32(offset + i * 4, true);
+      datapoints.push({ x: xs[i], y: ys[i], value: values[i], time: time * this.temporalDomainScaling });
+    }
+
+    console.log(`received ${count} events for dataset ${this.datasetId}`);
+    this.datapoints = datapoints;
+    this.notify();
+  }
+
   get displayAttribute(): DisplayAttributeType {
     return this._displayAttribute;
   }
@@ -313,50 +518,48 @@ class DatasetInternal extends EventTarget {  // {{{
     this._displayAttribute = type;
 
     const {
-      datapoints,
-      dataCount,
       numBins,
       numBinningBins,
       binningBinSize,
       periodCount,
       temporalDomain,
-      temporalDomainScaling,
       periodDomain,
-      histograms,
-      entropies,
-      vectorstrengths,
-      periods,
-      binning,
-    } = await loadDataFromBackend(
+      arrays,
+    } = await loadPartialReplaceFromBackend(
       this.socket,
       this.datasetId,
       `{"type":"set display attribute", "attribute": "${type}"}`,
-      BackendMessageType.REPLACE_DATASET,
-      'REPLACE DATASET'
     );
 
     const oldPeriod = this.period;
 
-    this.datapoints = datapoints;
-    this.dataCount = dataCount;
     this.numBins = numBins;
     this.numBinningBins = numBinningBins;
     this.binningBinSize = binningBinSize;
     this.periodCount = periodCount;
     this.temporalDomain = temporalDomain;
-    this.temporalDomainScaling = temporalDomainScaling;
     this.periodDomain = periodDomain;
-    this.histograms = histograms;
-    this.entropies = entropies;
-    this.vectorstrengths = vectorstrengths;
-    this.periods = periods;
-    this.binning = binning;
+
+    // arrays that were not sent keep their values
+    if (arrays.histograms) this.histograms = arrays.histograms;
+    if (arrays.entropies) this.entropies = arrays.entropies;
+    if (arrays.vectorstrengths) this.vectorstrengths = arrays.vectorstrengths;
+    if (arrays.periods) this.periods = Array.from(arrays.periods).map(d => d * this.temporalDomainScaling);
+    if (arrays.binning) this.binning = arrays.binning;
+
+    const { xs, ys, values, ts } = arrays;
+    this.datapoints.forEach((d, i) => {
+      if (xs) d.x = xs[i];
+      if (ys) d.y = ys[i];
+      if (values) d.value = values[i];
+      if (ts) d.time = ts[i] * this.temporalDomainScaling;
+    });
 
     // try to set _index to one day period
     const idx = bisectCenter(this.periods, oldPeriod);
     this._index = idx;
 
-    this.rebuildIndex();
+    if (arrays.binning) this.rebuildIndex();
     this.notify();
   }
 };  // }}}
@@ -380,9 +583,11 @@ async function handleAndCreateDataset(socket: WebSocket, datasetId: string): Pro
     vectorstrengths,
     periods,
     binning,
-  } = await loadDataFromBackend(socket, datasetId, '{"type":"ready"}', BackendMessageType.BEGIN_DATASET, 'BEGIN DATASET');
+    sessionToken,
+    pageSize,
+  } = await loadDataFromBackend(socket, datasetId, '{"type":"ready","columns":[]}', BackendMessageType.BEGIN_DATASET, 'BEGIN DATASET');
 
-  return new DatasetInternal(
+  const dataset = new DatasetInternal(
     socket,
     datapoints,
     dataCount,
@@ -400,6 +605,13 @@ async function handleAndCreateDataset(socket: WebSocket, datasetId: string): Pro
     binning,
     datasetId,
   );
+  dataset.enableResume(sessionToken);
+  dataset.enablePages(pageSize);
+
+  // the per-event columns follow, so that the period widgets can be drawn first
+  dataset.loadColumns().catch(err => console.error(`could not load events for dataset ${datasetId}: ${err}`));
+
+  return dataset;
 }
 
 interface DatasetConstructorArguments {
@@ -417,6 +629,8 @@ interface DatasetConstructorArguments {
   vectorstrengths: Float32Array,
   periods: Array<number>,
   binning: Float32Array,
+  sessionToken: string | null,
+  pageSize: number | null,
 };
 
 async function loadDataFromBackend(
@@ -432,6 +646,11 @@ async function loadDataFromBackend(
 
       const view = new DataView(event.data);
       const firstByte = view.getUint32(0, true);
+      if (firstByte === BackendMessageType.OVER_CAPACITY) {
+        const metadataLength = view.getUint32(4, true);
+        const metadata = JSON.parse(new TextDecoder().decode(new Uint8Array(event.data, 8, metadataLength)));
+        return reject(`server over capacity: ${metadata.reason}`);
+      }
       if (firstByte !== expectedResponseType) return reject(`unexpected message type: ${firstByte}`);
 
       console.groupCollapsed(`received ${responseLabel} message for ID ${datasetId}`);
@@ -452,21 +671,11 @@ async function loadDataFromBackend(
 
   const {
     numBins, periodCount, dataCount, temporalDomain, periodDomain,
-    numBinningBins, binningBinSize, temporalDomainScaling,
+    numBinningBins, binningBinSize, temporalDomainScaling, sessionToken,
   } = metadata;
   let offset = 8 + metadataLength;
 
-  // get float32 data from base64-encoded little-endian float data
-  const [histograms, entropies, vectorstrengths, periods, xs, ys, values, binning] = ([
-    ['histograms', numBins * periodCount],
-    ['entropies', periodCount],
-    ['vectorstrengths', periodCount],
-    ['periods', periodCount],
-    ['xs', dataCount],
-    ['ys', dataCount],
-    ['values', dataCount],
-    ['binning', numBinningBins],
-  ] as Array<[keyof RawDatasetBase64Arrays, number]>).map(([key, length]) => {
+  const readFloats = (key: string, length: number): Float32Array => {
     const data = new Float32Array(length);
     for (let i = 0; i < length; ++i) {
       data[i] = view.getFloat32(offset, true);
@@ -475,16 +684,33 @@ async function loadDataFromBackend(
 
     console.log(`received ${length} f32 values for ${key}`);
     return data;
-  });
+  };
+
+  // per-event columns that were left out are fetched later, see `loadColumns`
+  const columns: Array<EventColumn> = metadata.columns ?? [...EVENT_COLUMNS];
+
+  const histograms = readFloats('histograms', numBins * periodCount);
+  const entropies = readFloats('entropies', periodCount);
+  const vectorstrengths = readFloats('vectorstrengths', periodCount);
+  const periods = readFloats('periods', periodCount);
+  const xs = columns.includes('xs') ? readFloats('xs', dataCount) : null;
+  const ys = columns.includes('ys') ? readFloats('ys', dataCount) : null;
+  const values = columns.includes('values') ? readFloats('values', dataCount) : null;
+  const binning = readFloats('binning', numBinningBins);
 
   // timestamps are unsigned integers (32 bit)
-  const ts = new Int32Array(dataCount);
-  for (let i = 0; i < dataCount; ++i) ts[i] = view.getUint32(offset + i * 4, true);
+  let ts: Int32Array | null = null;
+  if (columns.includes('ts')) {
+    ts = new Int32Array(dataCount);
+    for (let i = 0; i < dataCount; ++i) ts[i] = view.getUint32(offset + i * 4, true);
 
-  console.log(`received ${dataCount} u32 values for ts`);
+    console.log(`received ${dataCount} u32 values for ts`);
+  }
 
   const data: Array<Datapoint> = [];
-  for (let i = 0; i < dataCount; ++i) data.push({ x: xs[i], y: ys[i], value: values[i], time: ts[i] * temporalDomainScaling });
+  if (xs && ys && values && ts) {
+    for (let i = 0; i < dataCount; ++i) data.push({ x: xs[i], y: ys[i], value: values[i], time: ts[i] * temporalDomainScaling });
+  }
 
   console.groupEnd();
 
@@ -510,10 +736,117 @@ async function loadDataFromBackend(
     vectorstrengths,
     periods: periodsScaled,
     binning,
+    sessionToken: sessionToken ?? null,
+    pageSize: metadata.pageSize ?? null,
+  };
+}
+
+
+// arrays of BEGIN DATASET messages in message order, bit i of the array mask of
+// PARTIAL REPLACE messages stands for entry i (see README.md); metrics are not read
+const WIRE_ARRAYS = [
+  'histograms', 'entropies', 'vectorstrengths', 'periods', 'xs', 'ys', 'values', 'binning', 'ts',
+] as const;
+
+interface PartialReplaceData {
+  numBins: number,
+  numBinningBins: number,
+  binningBinSize: number,
+  periodCount: number,
+  temporalDomain: [number, number],
+  periodDomain: [number, number],
+  arrays: Partial<Record<Exclude<typeof WIRE_ARRAYS[number], 'ts'>, Float32Array>> & { ts?: Float64Array },
+};
+
+async function loadPartialReplaceFromBackend(
+  socket: WebSocket,
+  datasetId: string,
+  requestMessage: string,
+): Promise<PartialReplaceData> {
+  const viewPromise = new Promise<DataView>((resolve, reject) => {
+    const fn = (event: MessageEvent) => {
+      if (!(event.data instanceof ArrayBuffer)) reject(`message is not an ArrayBuffer: ${event.data}`);
+
+      const view = new DataView(event.data);
+      const firstByte = view.getUint32(0, true);
+      if (firstByte === BackendMessageType.COLUMNS) return;  // answer to `loadColumns`
+      if (firstByte === BackendMessageType.PERIOD_PAGE) return;  // answer to `loadPeriodRange`
+      if (firstByte === BackendMessageType.ERROR && view.byteLength >= 8) return;  // failed `loadPeriodRange`
+
+      socket.removeEventListener('message', fn);
+      if (firstByte !== BackendMessageType.PARTIAL_REPLACE) return reject(`unexpected message type: ${firstByte}`);
+
+      console.groupCollapsed(`received PARTIAL REPLACE message for ID ${datasetId}`);
+      resolve(view);
+    };
+    socket.addEventListener('message', fn);
+  });
+  socket.send(requestMessage);
+
+  const view = await viewPromise;
+  const arrayMask = view.getUint32(4, true);
+  const metadataLength = view.getUint32(8, true);
+
+  const metadataString = new TextDecoder().decode(new Uint8Array(view.buffer, 12, metadataLength));
+  const metadata = JSON.parse(metadataString);
+  console.log(`metadata:`, metadata);
+
+  const {
+    numBins, periodCount, dataCount, temporalDomain, periodDomain,
+    numBinningBins, binningBinSize, temporalDomainScaling,
+  } = metadata;
+  let offset = 12 + metadataLength;
+
+  const lengths: Record<typeof WIRE_ARRAYS[number], number> = {
+    histograms: numBins * periodCount,
+    entropies: periodCount,
+    vectorstrengths: periodCount,
+    periods: periodCount,
+    xs: dataCount,
+    ys: dataCount,
+    values: dataCount,
+    binning: numBinningBins,
+    ts: dataCount,
+  };
+
+  const arrays: PartialReplaceData['arrays'] = {};
+  WIRE_ARRAYS.forEach((key, i) => {
+    if ((arrayMask & (1 << i)) === 0) return;
+
+    const length = lengths[key];
+    if (key === 'ts') {
+      // timestamps are unsigned integers (32 bit)
+      const ts = new Float64Array(length);
+      for (let j = 0; j < length; ++j) ts[j] = view.getUint32(offset + j * 4, true);
+      arrays.ts = ts;
+    } else {
+      const data = new Float32Array(length);
+      for (let j = 0; j < length; ++j) data[j] = view.getFloat32(offset + j * 4, true);
+      arrays[key] = data;
+    }
+    offset += length * 4;
+
+    console.log(`received ${length} values for ${key}`);
+  });
+
+  console.groupEnd();
+
+  return {
+    numBins,
+    numBinningBins,
+    binningBinSize: binningBinSize * temporalDomainScaling,
+    periodCount,
+    temporalDomain: [temporalDomain[0] * temporalDomainScaling, temporalDomain[1] * temporalDomainScaling],
+    periodDomain: [periodDomain[0] * temporalDomainScaling, periodDomain[1] * temporalDomainScaling],
+    arrays,
   };
 }
 
 
+const EVENT_COLUMNS = ['xs', 'ys', 'values', 'ts'] as const;
+type EventColumn = typeof EVENT_COLUMNS[number];
+
+
 function failUpload(extra: string) {
   const msg = `Uploaded dataset must be a JSON array whose entries are: "x" (number), "y" (number), "value" (number), "time" (epoch seconds or Date()-parsable string).\nError: ${extra}`;
   alert(msg);
@@ -310,7 +310,8 @@ class PeriodSuggestor {
         return range(-context, context + 1).map(d => Math.pow(1.005, d) * period);
       });
 
-    const additionalData = await this.dataset.loadAdditionalPeriods(periodData, false);
+    // the divisors of the current period are derived from its histogram
+    const additionalData = await this.dataset.loadAdditionalPeriods(periodData, false, currentPeriod);
 
     if (this.currentAdditionalDataRequestId > additionalData.requestId) {
       console.log(`SUPPLEMENT DATA (#${additionalData.requestId}) arrived too late. Currently waiting on #${this.currentAdditionalDataRequestId}. Discarding.`);
@@ -0,0 +1,76 @@
+import logging
+import numpy as np
+
+from backend.dataset import create_dataset
+
+
+logger = logging.getLogger(__name__)
+
+
+def duplicated_events():
+    '''Events with many duplicate timestamps, as in the tide and sunspot data.'''
+    rng = np.random.default_rng(9)
+    n = 4000
+    ts = np.sort(rng.integers(0, 500, n) * 3600 + rng.integers(0, 3, n) * 60).astype('float')
+    return dict(x=rng.uniform(0, 1, n), y=rng.uniform(0, 1, n), value=rng.uniform(-1, 1, n), time=ts)
+
+
+def test_weighted_events_match_individual_events():
+    dataset = create_dataset(duplicated_events(), logger, minutes=60)
+    assert len(dataset.unique_ts) < len(dataset.ts) / 2
+    dataset.change_attribute_type('average value')
+
+    t = dataset.ts.astype('float') - dataset.t0
+    values = dataset.values.astype('float') - dataset.value_shift
+    num_bins = dataset.base_num_bins
+    counts, sums, sumsqs = dataset.base_statistics
+    for i, period in enumerate(dataset.periods):
+        phases = np.remainder(t, period) / period
+        bins = np.minimum((phases * num_bins).astype('int64'), num_bins - 1)
+
+        np.testing.assert_array_equal(counts[i], np.bincount(bins, minlength=num_bins))
+        # the sums are kept in single precision
+        np.testing.assert_allclose(sums[i], np.bincount(bins, weights=values, minlength=num_bins), rtol=1e-6, atol=1e-5)
+        np.testing.assert_allclose(sumsqs[i], np.bincount(bins, weights=values ** 2, minlength=num_bins), rtol=1e-6, atol=1e-5)
+
+        moment = np.mean(np.exp(2j * np.pi * phases))
+        assert abs(dataset.moments[i] - moment) < 1e-12
+
+
+def test_chunked_dataset_matches_unchunked():
+    data = duplicated_events()
+    dataset = create_dataset(data, logger, minutes=60)
+    chunked = create_dataset(data, logger, minutes=60, chunk_size=97)
+
+    np.testing.assert_array_equal(chunked.periods, dataset.periods)
+    np.testing.assert_array_equal(chunked.base_statistics[0], dataset.base_statistics[0])
+    np.testing.assert_allclose(chunked.moments, dataset.moments, rtol=0, atol=1e-12)
+    np.testing.assert_array_equal(chunked.binning, dataset.binning)
+
+    dataset.change_attribute_type('variance')
+    chunked.change_attribute_type('variance')
+    for a, b in zip(chunked.base_statistics[1:], dataset.base_statistics[1:]):
+        np.testing.assert_allclose(a, b, rtol=1e-6, atol=1e-5)
+
+    for method in ('count', 'average value', 'variance'):
+        dataset.change_attribute_type(method)
+        chunked.change_attribute_type(method)
+        # both accumulate the value statistics in single precision, in different orders
+        np.testing.assert_allclose(chunked.hists, dataset.hists, rtol=1e-6, atol=1e-5)
+        np.testing.assert_allclose(chunked.ents, dataset.ents, rtol=1e-5)
+
+
+def test_value_statistics_are_calculated_on_demand():
+    dataset = create_dataset(duplicated_events(), logger, minutes=60)
+    counts, sums, sumsqs = dataset.base_statistics
+    assert sums is None and sumsqs is None
+    footprint = dataset.memory_footprint()
+
+    dataset.change_attribute_type('variance')
+    assert dataset.base_statistics[0] is counts
+    assert all(arr.dtype == np.dtype('<f4') for arr in dataset.base_statistics[1:])
+    assert dataset.memory_footprint() - footprint == 2 * counts.nbytes
+
+    # kept when going back to "count"
+    dataset.change_attribute_type('count')
+    assert dataset.base_statistics[1] is not None
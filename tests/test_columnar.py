@@ -0,0 +1,83 @@
+import io
+import logging
+import numpy as np
+import pytest
+
+from backend import columnar
+from backend.dataset import create_dataset
+
+
+logger = logging.getLogger(__name__)
+
+
+def unsorted_chunks():
+    '''Chunks of events with groups, out of time order within and across chunks, with duplicate times.'''
+    rng = np.random.default_rng(4)
+    chunks = []
+    for n in (500, 1, 0, 333):
+        ts = rng.integers(-10**6, 10**6, n) // 60 * 60
+        chunks.append(dict(x=rng.uniform(-180, 180, n), y=rng.uniform(-90, 90, n), value=rng.normal(0, 1, n),
+                time=ts, group=rng.integers(0, 5, n) * 3 + 1))
+    return chunks
+
+
+def concatenated(chunks):
+    return { key: np.concatenate([ chunk[key] for chunk in chunks ]) for key in chunks[0] }
+
+
+@pytest.mark.parametrize('sort', [ False, True ])
+def test_round_trip_with_groups(tmp_path, sort):
+    chunks = unsorted_chunks()
+    filename = str(tmp_path / 'events.columns')
+    columnar.write(filename, chunks, sort)
+
+    header = columnar.read_header(filename)
+    assert header['flags'] == (columnar.flag_sorted if sort else 0) | columnar.flag_groups
+
+    expected = concatenated(chunks)
+    assert np.any(np.diff(expected['time']) < 0)
+    # sorting is stable, so events with the same time keep their order
+    order = np.argsort(expected['time'], kind='stable') if sort else np.arange(len(expected['time']))
+
+    data = columnar.load_columns(filename)
+    assert set(data) == { 'x', 'y', 'value', 'time', 'group' }
+    for _, key, dtype in columnar.columns + (columnar.group_column,):
+        assert data[key].dtype == np.dtype(dtype)
+        assert not data[key].flags.writeable
+        np.testing.assert_array_equal(data[key], expected[key][order].astype(dtype))
+
+    dataset = create_dataset(data, logger, minutes=60)
+    assert dataset.group_keys == [ 1, 4, 7, 10, 13 ]
+    for key, group in enumerate(dataset.group_keys):
+        assert np.count_nonzero(dataset.groups == key) == np.count_nonzero(expected['group'] == group)
+
+
+def test_round_trip_without_groups(tmp_path):
+    chunks = [ { key: column for key, column in chunk.items() if key != 'group' } for chunk in unsorted_chunks() ]
+    filename = str(tmp_path / 'events.columns')
+    columnar.write(filename, chunks, sort=True)
+
+    assert columnar.read_header(filename)['flags'] == columnar.flag_sorted
+    data = columnar.load_columns(filename)
+    assert 'group' not in data
+    assert np.all(np.diff(data['time']) >= 0)
+    assert len(data['time']) == sum(len(chunk['time']) for chunk in chunks)
+
+
+def test_csv_chunks_round_trip(tmp_path):
+    infile = io.StringIO('time,x,y,value,group\n3.5,1,2,0.5,7\n1.25,3,4,1.5,2\n2,5,6,2.5,7\n')
+    filename = str(tmp_path / 'events.columns')
+    columnar.write(filename, columnar.read_csv_chunks(infile, time_scaling=2, chunk_size=2), sort=True)
+
+    data = columnar.load_columns(filename)
+    np.testing.assert_array_equal(data['time'], [ 2, 4, 7 ])
+    np.testing.assert_array_equal(data['x'], [ 3, 5, 1 ])
+    np.testing.assert_array_equal(data['value'], [ 1.5, 2.5, 0.5 ])
+    np.testing.assert_array_equal(data['group'], [ 2, 7, 7 ])
+
+
+def test_mixed_group_columns_are_rejected(tmp_path):
+    chunks = unsorted_chunks()
+    del chunks[-1]['group']
+    with pytest.raises(ValueError):
+        columnar.write(str(tmp_path / 'events.columns'), chunks)
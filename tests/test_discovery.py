@@ -0,0 +1,34 @@
+import dataclasses
+import numpy as np
+
+from backend import app, columnar, dataset_discovery
+from backend.dataset import estimate_footprint
+
+
+def test_columnar_dataset_size_is_estimated_before_loading(tmp_path):
+    rng = np.random.default_rng(2)
+    n = 3000
+    ts = rng.integers(-10**6, 10**7, n)
+    filename = str(tmp_path / 'events.columns')
+    for sort in (False, True):
+        columnar.write(filename, [ dict(x=np.zeros(n), y=np.zeros(n), value=np.ones(n), time=ts, group=ts % 7) ], sort)
+
+        definition = dataclasses.replace(dataset_discovery.datasets['sunspots'], key='estimated', columnar_file=filename)
+        expected = estimate_footprint(n, int(ts.max() - ts.min()), minutes=7, grouped=True)
+        assert dataset_discovery.estimate_bytes(definition) == expected
+
+
+def test_datasets_report_estimated_bytes(monkeypatch):
+    monkeypatch.setattr(dataset_discovery, 'share_datasets', False)
+    monkeypatch.setattr(dataset_discovery, '_loaded', dict())
+
+    client = app.test_client()
+    estimated = { d['key']: d['estimatedBytes'] for d in client.get('/datasets').get_json() }
+    # from the time column of the CSV file
+    assert estimated['sunspots'] > 0
+    # generated datasets are only estimated once loaded
+    assert estimated['synthetic'] is None
+
+    dataset = dataset_discovery._load_dataset('synthetic')
+    estimated = { d['key']: d['estimatedBytes'] for d in client.get('/datasets').get_json() }
+    assert estimated['synthetic'] == estimate_footprint(len(dataset.ts), int(dataset.dt))
@@ -0,0 +1,27 @@
+import pytest
+
+from backend import app, dataset_discovery, export
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(export, 'directory', str(tmp_path))
+    monkeypatch.setattr(dataset_discovery, 'share_datasets', False)
+    return app.test_client()
+
+
+@pytest.mark.parametrize('num_bins', [ '0', '-5', '7', 'abc' ])
+def test_invalid_bin_count_is_rejected_before_revalidation(client, num_bins):
+    # the ETag that the request would have without validation (non-integers fell back to 25)
+    etag = export._etag('synthetic', int(num_bins) if num_bins.lstrip('-').isdigit() else 25, 'count')
+    response = client.get(F'/export/synthetic?numBins={num_bins}', headers={ 'If-None-Match': F'"{etag}"' })
+    assert response.status_code == 400
+
+
+def test_export_is_revalidated(client):
+    response = client.get('/export/synthetic?numBins=25')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+
+    response = client.get('/export/synthetic?numBins=25', headers={ 'If-None-Match': etag })
+    assert response.status_code == 304
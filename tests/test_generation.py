@@ -0,0 +1,77 @@
+import math
+import numpy as np
+import pytest
+from scipy.stats import chisquare
+
+from backend.dataset_generation import synthetic, synthetic2, synthetic3
+from backend.dataset_generation.vectorized import random_period_times
+
+
+def period_numbers(times, domain, period, phase):
+    '''Period numbers k of `times` = domain[0] + k * period + phase, and their distance from integers.'''
+    k = (times - domain[0] - phase) / period
+    return np.rint(k).astype('int64'), np.abs(k - np.rint(k))
+
+
+def valid_period_numbers(domain, period, phase):
+    '''Period numbers within `domain` that `_random_time` accepts.'''
+    num_periods = math.ceil((domain[1] - domain[0]) / period)
+    return [ k for k in range(-1, num_periods + 1) if domain[0] <= domain[0] + k * period + phase <= domain[1] ]
+
+
+def test_random_period_times_are_deterministic():
+    domain = synthetic._domain_tn
+    first = random_period_times(np.random.default_rng(1), domain, 7, 4.1, 1000)
+    again = random_period_times(np.random.default_rng(1), domain, 7, 4.1, 1000)
+    other = random_period_times(np.random.default_rng(2), domain, 7, 4.1, 1000)
+
+    np.testing.assert_array_equal(first, again)
+    assert not np.array_equal(first, other)
+
+
+@pytest.mark.parametrize('period, phase', [ (7, 4.1), (3, 0), (5 / 24, 1 / 24), (10, -2.5), (200, 300) ])
+def test_random_period_times_are_at_the_phase_within_the_domain(period, phase):
+    domain = synthetic._domain_tn
+    times = random_period_times(np.random.default_rng(3), domain, period, phase, 20000)
+
+    assert np.all(times >= domain[0])
+    assert np.all(times <= domain[1])
+
+    k, distance = period_numbers(times, domain, period, phase)
+    assert np.all(distance < 1e-6)
+
+    # uniform over the period numbers that the scalar version accepts
+    valid = valid_period_numbers(domain, period, phase)
+    assert np.unique(k).tolist() == valid
+    assert chisquare(np.bincount(k - valid[0])).pvalue > 0.001
+
+
+def test_synthetic_spots_are_at_their_phase():
+    times = synthetic.spot_columns(np.random.default_rng(4), 1000, 7, 4.1, x=47, y=81)['time'] / 86400
+    _, distance = period_numbers(times, synthetic._domain_tn, 7, 4.1)
+    assert np.all(distance < 1e-6)
+
+
+def test_synthetic2_events_are_at_the_phase_of_their_area():
+    columns = synthetic2._run_columns(5000)
+    times = columns['time'] / 86400
+    delta = (columns['x'].astype('float') - synthetic2._cx) ** 2 + (columns['y'].astype('float') - synthetic2._cy) ** 2
+    # the positions are stored in single precision
+    inside = delta < synthetic2._r2 - 1e-3
+    outside = delta > synthetic2._r2 + 1e-3
+
+    _, distance = period_numbers(times[inside], synthetic2._domain_tn, 45 / (24 * 60), 0)
+    assert np.all(distance < 1e-6)
+    _, distance = period_numbers(times[outside], synthetic2._domain_tn, 5 / 24, 1 / 24)
+    assert np.all(distance < 1e-6)
+
+
+@pytest.mark.parametrize('generator', [ synthetic, synthetic2, synthetic3 ])
+def test_generated_columns_are_reproducible(generator):
+    first = generator._run_columns(3000, seed=5)
+    again = generator._run_columns(3000, seed=5)
+    other = generator._run_columns(3000, seed=6)
+
+    for key in first:
+        np.testing.assert_array_equal(first[key], again[key])
+    assert not np.array_equal(first['time'], other['time'])
@@ -0,0 +1,48 @@
+import logging
+import numpy as np
+
+from backend.dataset import create_dataset
+
+
+logger = logging.getLogger(__name__)
+
+
+def grouped_dataset():
+    '''
+    Groups of a strongly periodic signal (0), Poisson events (1), a single
+    event (2) and three events (3).
+    '''
+    rng = np.random.default_rng(1)
+    period = 7 * 3600
+    periodic = np.arange(200) * period + rng.normal(0, 300, 200)
+    poisson = np.sort(rng.uniform(0, 200 * period, 200))
+
+    ts = np.concatenate([ periodic, poisson, [ 5000 ], [ 1e5, 2e5, 3e5 ] ])
+    groups = np.repeat([ 0, 1, 2, 3 ], [ 200, 200, 1, 3 ])
+    data = dict(x=np.zeros(len(ts)), y=np.zeros(len(ts)), value=np.ones(len(ts)), time=ts, group=groups)
+
+    return create_dataset(data, logger, minutes=60)
+
+
+def test_ranking_prefers_periodic_groups_over_small_ones():
+    dataset = grouped_dataset()
+    order, counts, best_entropies, best_periods = dataset.calculate_group_ranking()
+
+    assert counts.tolist() == [ 200, 200, 1, 3 ]
+    # the single event and the three events have the lowest entropies, but
+    # are too few to say anything
+    assert best_entropies[2] == 0 and best_entropies[3] == 0
+    assert order.tolist() == [ 0, 1, 3, 2 ]
+    assert best_periods[0] == 7 * 3600
+
+
+def test_ranking_matches_all_groups_message():
+    dataset = grouped_dataset()
+    dataset.groups_websocket_data(1)
+    from_histograms = dataset.group_rankings[(dataset.num_bins, dataset.method)]
+
+    dataset.group_rankings.clear()
+    ranking = dataset.calculate_group_ranking()
+
+    for a, b in zip(from_histograms, ranking):
+        np.testing.assert_array_equal(a, b)
@@ -0,0 +1,79 @@
+import logging
+import numpy as np
+import pytest
+
+from backend.dataset import create_dataset, harmonic_resolution, harmonics
+
+
+logger = logging.getLogger(__name__)
+
+
+# fine bins of the base period last this many seconds: all bin boundaries
+# of the base period and its derived sub-harmonics are multiples of it
+fine_bin_seconds = 2
+
+
+def harmonic_dataset(**kwargs):
+    '''
+    Events at odd seconds after the first one, halfway between the bin
+    boundaries of `base_period` and its sub-harmonics, with duplicates.
+    '''
+    rng = np.random.default_rng(3)
+    n = 3000
+    ts = np.concatenate([ [0], 2 * rng.integers(0, 1_000_000, n - 1) + 1 ])
+    values = rng.uniform(-1, 1, n)
+    dataset = create_dataset(dict(x=rng.uniform(0, 1, n), y=rng.uniform(0, 1, n), value=values, time=ts),
+            logger, minutes=60, **kwargs)
+    dataset.change_attribute_type('average value')
+    return dataset
+
+
+def direct_statistics(dataset, period, exact):
+    '''Counts, sums, sums of squares and first circular moment for `period` from the events.'''
+    num_bins = dataset.base_num_bins
+    t = dataset.ts.astype('int64') - dataset.t0
+    if exact:
+        # integer period: exact bins, without rounding at their boundaries
+        bins = np.remainder(t, int(period)) * num_bins // int(period)
+    else:
+        phases = np.remainder(t.astype('float'), period) / period
+        bins = np.minimum((phases * num_bins).astype('int64'), num_bins - 1)
+    values = dataset.values.astype('float') - dataset.value_shift
+    moment = np.mean(np.exp(2j * np.pi * np.remainder(t.astype('float'), period) / period))
+
+    return (np.bincount(bins, minlength=num_bins), np.bincount(bins, weights=values, minlength=num_bins),
+            np.bincount(bins, weights=values ** 2, minlength=num_bins), moment)
+
+
+@pytest.mark.parametrize('chunk_size', [ None, 701 ])
+def test_folded_sub_harmonics_match_direct_statistics(chunk_size):
+    dataset = harmonic_dataset(chunk_size=chunk_size)
+    base_period = dataset.base_num_bins * harmonic_resolution * fine_bin_seconds
+    # derived sub-harmonics, and periods that are not: 9 and 11 do not divide
+    # the harmonic resolution, and neither 7.3 nor a period next to base / 5
+    # is a sub-harmonic at all
+    derived = [ base_period // k for k in harmonics ]
+    periods = derived + [ base_period / 9, base_period / 11, base_period / 7.3, base_period / 5 * (1 + 1e-6) ]
+
+    counts, sums, sumsqs, moments = dataset.calculate_harmonic_base_statistics(periods, base_period)
+
+    for i, period in enumerate(periods):
+        direct_counts, direct_sums, direct_sumsqs, direct_moment = direct_statistics(dataset, period, i < len(derived))
+        np.testing.assert_array_equal(counts[i], direct_counts)
+        # the sums are kept in single precision
+        np.testing.assert_allclose(sums[i], direct_sums, rtol=1e-5, atol=1e-4)
+        np.testing.assert_allclose(sumsqs[i], direct_sumsqs, rtol=1e-5, atol=1e-4)
+        assert abs(moments[i] - direct_moment) < 1e-9
+
+
+def test_folded_counts_without_values():
+    dataset = harmonic_dataset()
+    dataset.change_attribute_type('count')
+    base_period = dataset.base_num_bins * harmonic_resolution * fine_bin_seconds
+    periods = [ base_period // 3, base_period / 7.3 ]
+
+    counts, sums, sumsqs, _ = dataset.calculate_harmonic_base_statistics(periods, base_period)
+
+    assert sums is None and sumsqs is None
+    for i, period in enumerate(periods):
+        np.testing.assert_array_equal(counts[i], direct_statistics(dataset, period, i == 0)[0])
@@ -0,0 +1,61 @@
+import logging
+import numpy as np
+import pytest
+
+from backend.dataset import create_dataset
+
+
+logger = logging.getLogger(__name__)
+
+
+def random_dataset(offset=0.0, **kwargs):
+    rng = np.random.default_rng(7)
+    n = 3000
+    # duplicate timestamps, so that events are collapsed into weighted ones
+    ts = np.sort(rng.integers(0, 2_000_000, n)).astype('float')
+    values = offset + rng.normal(0, 1, n)
+    data = dict(x=rng.uniform(0, 1, n), y=rng.uniform(0, 1, n), value=values, time=ts)
+    return create_dataset(data, logger, minutes=60, **kwargs)
+
+
+def direct_histograms(dataset, method):
+    '''Histograms and entropies of the period grid, binned directly from the events.'''
+    t = dataset.ts.astype('float') - dataset.t0
+    values = dataset.values.astype('float')
+    hists = np.zeros((len(dataset.periods), dataset.num_bins))
+    factor = dataset.base_num_bins // dataset.num_bins
+    for i, period in enumerate(dataset.periods):
+        # with integer times, events can lie exactly on bin boundaries, where
+        # rounding decides the bin; these are binned at the base resolution
+        phases = np.remainder(t, period) / period
+        bins = np.minimum((phases * dataset.base_num_bins).astype('int64'), dataset.base_num_bins - 1) // factor
+        counts = np.bincount(bins, minlength=dataset.num_bins)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = np.bincount(bins, weights=values, minlength=dataset.num_bins) / counts
+            if method == 'count':
+                hists[i] = counts
+            elif method == 'average value':
+                hists[i] = means
+            else:
+                hists[i] = np.bincount(bins, weights=(values - means[bins]) ** 2, minlength=dataset.num_bins) / counts
+
+    totals = np.nansum(hists, axis=1)
+    totals[totals == 0] = 1
+    return hists / totals[:, np.newaxis]
+
+
+@pytest.mark.parametrize('num_bins', [ 8, 10, 25, 40 ])
+@pytest.mark.parametrize('method', [ 'count', 'average value', 'variance' ])
+def test_derived_bin_counts_match_direct_binning(num_bins, method):
+    dataset = random_dataset(offset=5.0)
+    dataset.change_attribute_type(method)
+    dataset.change_num_bins(num_bins)
+
+    np.testing.assert_allclose(dataset.hists, direct_histograms(dataset, method), rtol=1e-5, atol=1e-6)
+
+
+def test_variance_of_values_far_from_zero():
+    dataset = random_dataset(offset=1e6)
+    dataset.change_attribute_type('variance')
+
+    np.testing.assert_allclose(dataset.hists, direct_histograms(dataset, 'variance'), rtol=1e-4, atol=1e-6)
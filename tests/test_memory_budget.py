@@ -0,0 +1,129 @@
+import json
+import logging
+import threading
+import time
+import numpy as np
+from simple_websocket import ConnectionClosed
+
+from backend import memory_budget, socket as sock
+from backend.memory_budget import MemoryBudget
+
+
+logger = logging.getLogger(__name__)
+
+
+class FakeSocket:
+    '''Records the messages sent to it, and whether it was closed.'''
+
+    def __init__(self, closed=False):
+        self.sent = []
+        self.closed = closed
+
+    def send(self, data):
+        if self.closed:
+            raise ConnectionClosed()
+        self.sent.append(data)
+
+    def close(self):
+        self.closed = True
+
+
+def acquire_in_background(budget, amount, timeout):
+    '''Thread waiting for `amount` bytes, and the list its result is appended to.'''
+    results = []
+    thread = threading.Thread(target=lambda: results.append(budget.acquire(amount, timeout)))
+    thread.start()
+    return thread, results
+
+
+def test_acquire_and_release():
+    budget = MemoryBudget(1000)
+    assert budget.acquire(600, 0)
+    assert budget.acquire(400, 0)
+    assert budget.used == 1000
+    assert budget.available == 0
+
+    budget.release(600)
+    assert budget.used == 400
+    assert budget.available == 600
+
+
+def test_acquire_times_out():
+    budget = MemoryBudget(1000)
+    assert budget.acquire(600, 0)
+
+    start = time.monotonic()
+    assert not budget.acquire(500, 0.2)
+    assert time.monotonic() - start >= 0.2
+    # a failed acquire reserves nothing
+    assert budget.used == 600
+
+
+def test_release_wakes_waiting_acquire():
+    budget = MemoryBudget(1000)
+    assert budget.acquire(600, 0)
+
+    thread, results = acquire_in_background(budget, 500, 10)
+    time.sleep(0.2)
+    assert thread.is_alive()
+
+    budget.release(600)
+    thread.join(10)
+    assert results == [ True ]
+    assert budget.used == 500
+
+
+def test_resize_to_a_smaller_footprint_wakes_waiting_acquire():
+    budget = MemoryBudget(1000)
+    assert budget.acquire(800, 0)
+
+    thread, results = acquire_in_background(budget, 500, 10)
+    time.sleep(0.2)
+    assert thread.is_alive()
+
+    budget.resize(800, 300)
+    thread.join(10)
+    assert results == [ True ]
+    assert budget.used == 800
+
+
+def test_amount_over_the_limit_is_refused_without_waiting():
+    budget = MemoryBudget(1000)
+
+    start = time.monotonic()
+    assert not budget.acquire(1001, 10)
+    assert time.monotonic() - start < 1
+    assert budget.used == 0
+
+
+def test_zero_limit_disables_the_budget():
+    budget = MemoryBudget(0)
+    assert budget.acquire(1 << 50, 0)
+    assert budget.acquire(1 << 50, 0)
+    assert budget.available is None
+
+
+def test_over_capacity_message(monkeypatch):
+    budget = MemoryBudget(1000)
+    monkeypatch.setattr(memory_budget, 'budget', budget)
+    assert budget.acquire(700, 0)
+
+    socket = FakeSocket()
+    sock.send_over_capacity(socket, 500, logger)
+
+    assert len(socket.sent) == 1
+    header = np.frombuffer(socket.sent[0][:8], dtype='<u4')
+    assert header[0] == 101
+    assert header[1] == len(socket.sent[0]) - 8
+    metadata = json.loads(socket.sent[0][8:])
+    assert metadata == dict(reason='memory budget exhausted', requested=500, available=300, budget=1000)
+    assert socket.closed
+
+
+def test_over_capacity_on_a_closed_socket(monkeypatch):
+    monkeypatch.setattr(memory_budget, 'budget', MemoryBudget(1000))
+
+    socket = FakeSocket(closed=True)
+    sock.send_over_capacity(socket, 5000, logger)
+    assert socket.sent == []
+    assert socket.closed
@@ -0,0 +1,98 @@
+import logging
+import numpy as np
+import pytest
+from scipy.stats import chisquare
+
+from backend import metrics
+from backend.dataset import create_dataset
+
+
+logger = logging.getLogger(__name__)
+
+
+def small_dataset(num_bins):
+    '''A periodic and a Poisson group of events at non-integer times.'''
+    rng = np.random.default_rng(11)
+    period = 5 * 3600
+    periodic = rng.integers(0, 50, 150) * period + rng.normal(0, 2000, 150) + 1e5
+    poisson = rng.uniform(0, 50 * period, 150)
+    ts = np.concatenate([ periodic, poisson ])
+    n = len(ts)
+    data = dict(x=np.zeros(n), y=np.zeros(n), value=np.ones(n), time=ts, group=np.repeat([ 0, 1 ], 150))
+    return create_dataset(data, logger, minutes=60, num_bins=num_bins)
+
+
+def grid_phases(t, period):
+    return np.remainder(t, period) / period
+
+
+def set_phases(t, period):
+    # as for groups, which may round differently for events at bin edges
+    cycles = t / period
+    return cycles - np.floor(cycles)
+
+
+def direct_metrics(phases, num_bins, resolution):
+    '''
+    The metrics from `phases`, with the Kuiper statistic from the empirical
+    distribution at the bin edges of `resolution` bins, and without it.
+    '''
+    n = len(phases)
+
+    rayleigh = np.abs(np.exp(2j * np.pi * phases).sum()) ** 2 / n
+    observed = np.bincount(np.minimum((phases * num_bins).astype('int64'), num_bins - 1), minlength=num_bins)
+    chi_square = chisquare(observed).statistic
+
+    edges = np.arange(1, resolution + 1) / resolution
+    difference = np.array([ np.count_nonzero(phases < edge) for edge in edges ]) / n - edges
+    kuiper = max(difference.max(), 0) + max(-difference.min(), 0)
+
+    ordered = np.sort(phases)
+    continuous_kuiper = np.max(np.arange(1, n + 1) / n - ordered) + np.max(ordered - np.arange(n) / n)
+
+    return dict(rayleighZ=rayleigh, chiSquare=chi_square, kuiper=kuiper), continuous_kuiper
+
+
+def assert_metrics(values, t, periods, phases, num_bins, resolution):
+    for i, period in enumerate(periods):
+        direct, continuous_kuiper = direct_metrics(phases(t, period), num_bins, resolution)
+        for key, value in direct.items():
+            assert values[key][i] == pytest.approx(value, rel=1e-5, abs=1e-5), (key, period)
+
+        # the empirical distribution is only evaluated at the bin edges
+        assert 0 <= continuous_kuiper - values['kuiper'][i] <= 2 / resolution + 1e-6
+
+
+@pytest.mark.parametrize('num_bins', [ 10, 25 ])
+def test_period_metrics_match_direct_computation(num_bins):
+    dataset = small_dataset(num_bins)
+    assert sorted(dataset.metric_values) == sorted(metrics.registry)
+
+    t = dataset.ts.astype('float') - dataset.t0
+    step = max(1, len(dataset.periods) // 100)
+    selected = np.arange(0, len(dataset.periods), step)
+    values = { key: v[selected] for key, v in dataset.metric_values.items() }
+    assert_metrics(values, t, dataset.periods[selected], grid_phases, num_bins, dataset.base_num_bins)
+
+
+@pytest.mark.parametrize('num_bins', [ 10, 25 ])
+def test_group_metrics_match_direct_computation(num_bins):
+    dataset = small_dataset(num_bins)
+    step = max(1, len(dataset.periods) // 100)
+    selected = np.arange(0, len(dataset.periods), step)
+
+    _, _, _, metric_values, counts = dataset.calculate_group_histograms(np.arange(len(dataset.group_keys)))
+    assert list(counts) == [ 150, 150 ]
+
+    t = dataset.ts.astype('float') - dataset.t0
+    for group in range(len(dataset.group_keys)):
+        values = { key: v[group, selected] for key, v in metric_values.items() }
+        # the statistics of groups are accumulated at the displayed resolution
+        assert_metrics(values, t[dataset.groups == group], dataset.periods[selected], set_phases, num_bins, num_bins)
+
+
+def test_metrics_of_empty_periods_are_nan():
+    values = metrics.evaluate(list(metrics.registry), dict(counts=np.zeros((2, 20)), moments=np.zeros(2, dtype='complex')), 10)
+    assert values['rayleighZ'].tolist() == [ 0, 0 ]
+    assert np.all(np.isnan(values['chiSquare']))
+    assert np.all(np.isnan(values['kuiper']))
@@ -0,0 +1,37 @@
+import logging
+import numpy as np
+
+from backend.dataset import create_dataset
+
+
+logger = logging.getLogger(__name__)
+
+
+def paged_dataset():
+    rng = np.random.default_rng(6)
+    n = 2000
+    ts = np.sort(rng.uniform(0, 1e7, n))
+    data = dict(x=np.zeros(n), y=np.zeros(n), value=rng.uniform(0, 1, n), time=ts)
+    return create_dataset(data, logger, vectorstrength_method='fft', page_size=100)
+
+
+def test_interrupted_prefetch_matches_calculated_pages():
+    dataset = paged_dataset()
+    dataset.period_page_websocket_data(150, 250, 1)
+    assert dataset.prefetch == [ 0, 3 ]
+
+    # give way after every slice
+    calls = 0
+    while len(dataset.prefetch) > 0:
+        dataset.prefetch_page(stop=lambda: True)
+        calls += 1
+    assert calls > 2
+
+    expected = paged_dataset()
+    expected.calculate_pages([ 0, 1, 2, 3 ])
+    assert sorted(dataset.pages) == sorted(expected.pages)
+    for page, statistics in expected.pages.items():
+        for a, b in zip(dataset.pages[page], statistics):
+            np.testing.assert_array_equal(a, b)
+
+    np.testing.assert_array_equal(dataset.ents, expected.ents)
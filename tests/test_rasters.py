@@ -0,0 +1,75 @@
+import logging
+import numpy as np
+import pytest
+from scipy.stats import entropy
+
+from backend.dataset import create_dataset
+
+
+logger = logging.getLogger(__name__)
+
+
+def spatial_dataset(**kwargs):
+    '''Events whose period depends on their position, with duplicate timestamps.'''
+    rng = np.random.default_rng(5)
+    n = 1200
+    xs = rng.uniform(0, 3, n)
+    ys = rng.uniform(0, 2, n)
+    period = np.where(xs < 1.5, 7 * 3600, 30 * 3600)
+    ts = np.round((rng.integers(0, 40, n) * period + rng.normal(0, 600, n)) / 60) * 60
+    return create_dataset(dict(x=xs, y=ys, value=np.ones(n), time=ts), logger, minutes=60, **kwargs)
+
+
+def brute_force_statistics(t, periods, num_bins):
+    '''Count histograms, their entropies and the vector strengths of events at `t` for each period.'''
+    phases = np.remainder(t[np.newaxis, :], periods[:, np.newaxis]) / periods[:, np.newaxis]
+    bins = np.minimum((phases * num_bins).astype('int64'), num_bins - 1)
+    hists = np.array([ np.bincount(b, minlength=num_bins) for b in bins ])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ents = entropy(hists, base=2, axis=1)
+    vecs = np.abs(np.exp(2j * np.pi * phases).sum(axis=1)) / max(len(t), 1)
+    return ents, vecs
+
+
+@pytest.mark.parametrize('chunk_size', [ None, 257 ])
+def test_period_raster_matches_brute_force(chunk_size):
+    dataset = spatial_dataset(chunk_size=chunk_size)
+    width, height = 3, 2
+    periods, ents, vecs, counts = dataset.calculate_period_raster(width, height)
+
+    t = dataset.ts.astype('float') - dataset.t0
+    cx = np.clip(np.floor((dataset.xs - dataset.xs.min()) / np.ptp(dataset.xs) * width).astype('int64'), 0, width - 1)
+    cy = np.clip(np.floor((dataset.ys - dataset.ys.min()) / np.ptp(dataset.ys) * height).astype('int64'), 0, height - 1)
+    cells = cy * width + cx
+    for cell in range(width * height):
+        selected = cells == cell
+        assert counts[cell] == np.count_nonzero(selected)
+
+        cell_ents, cell_vecs = brute_force_statistics(t[selected], dataset.periods, dataset.num_bins)
+        best = np.argmin(cell_ents)
+        assert periods[cell] == dataset.periods[best]
+        assert ents[cell] == pytest.approx(cell_ents[best], abs=1e-12)
+        assert vecs[cell] == pytest.approx(cell_vecs[best], abs=1e-12)
+
+    # the left cells have the shorter period
+    assert np.all(periods.reshape(height, width)[:, 0] == pytest.approx(7 * 3600, rel=0.01))
+
+
+@pytest.mark.parametrize('chunk_size', [ None, 257 ])
+def test_spectrogram_matches_brute_force(chunk_size):
+    dataset = spatial_dataset(chunk_size=chunk_size)
+    width, stride = 200_000, 75_000
+    starts, periods, ents, vecs, counts = dataset.calculate_spectrogram(width, stride)
+
+    assert np.all(periods <= width)
+    assert len(starts) == int((dataset.dt - width) // stride) + 1
+
+    ts = dataset.ts.astype('int64')
+    for w, start in enumerate(starts):
+        # events from the start of the window until before its end
+        selected = (ts >= start) & (ts < start + width)
+        assert counts[w] == np.count_nonzero(selected)
+
+        window_ents, window_vecs = brute_force_statistics((ts[selected] - dataset.t0).astype('float'), periods, dataset.num_bins)
+        np.testing.assert_allclose(ents[w], window_ents, rtol=0, atol=1e-9)
+        np.testing.assert_allclose(vecs[w], window_vecs, rtol=0, atol=1e-9)
@@ -0,0 +1,34 @@
+import threading
+import time
+
+from backend import dataset_discovery, scheduler, shared_arrays
+
+
+def test_waiting_for_a_shared_dataset_holds_no_compute_slot(tmp_path, monkeypatch):
+    monkeypatch.setattr(shared_arrays, 'directory', str(tmp_path))
+    monkeypatch.setattr(dataset_discovery, 'share_datasets', True)
+    monkeypatch.setattr(dataset_discovery, '_loaded', dict())
+
+    definition = dataset_discovery.datasets['synthetic']
+    name = dataset_discovery._shared_name(definition)
+    completed = scheduler.pool.statistics()['priorities']['sweep']['completed']
+
+    loaded = []
+    loader = threading.Thread(target=lambda: loaded.append(dataset_discovery._load_dataset('synthetic')))
+
+    # as if another worker process were building the dataset
+    with shared_arrays.locked(name):
+        loader.start()
+        time.sleep(0.5)
+        assert loader.is_alive()
+        assert scheduler.pool.statistics()['running'] == 0
+        assert scheduler.pool.statistics()['queued'] == 0
+
+    loader.join(60)
+    try:
+        assert len(loaded) == 1
+        assert len(loaded[0].periods) > 0
+        # the load itself ran in a slot
+        assert scheduler.pool.statistics()['priorities']['sweep']['completed'] == completed + 1
+    finally:
+        shared_arrays.release(name)
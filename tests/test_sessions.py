@@ -0,0 +1,109 @@
+import logging
+import time
+from types import SimpleNamespace
+import pytest
+from simple_websocket import ConnectionClosed
+
+from backend import memory_budget, sessions
+
+
+logger = logging.getLogger(__name__)
+
+
+class FakeSocket:
+    '''Records the messages sent to it, and fails to send once closed.'''
+
+    def __init__(self):
+        self.sent = []
+        self.closed = False
+
+    def send(self, data):
+        if self.closed:
+            raise ConnectionClosed()
+        self.sent.append(data)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def budget(monkeypatch):
+    budget = memory_budget.MemoryBudget(1000)
+    monkeypatch.setattr(memory_budget, 'budget', budget)
+    monkeypatch.setattr(sessions, 'grace_period', 0.2)
+    return budget
+
+
+def new_session(budget, socket):
+    assert budget.acquire(100, 0)
+    return sessions.create(SimpleNamespace(session_token=None, logger=logger), 100, 'key', socket)
+
+
+def test_resume_within_grace_period(budget):
+    first = FakeSocket()
+    session = new_session(budget, first)
+
+    sessions.detach(session, first)
+    time.sleep(0.1)
+    second = FakeSocket()
+    assert sessions.resume(session.token, 'key', second) is session
+    assert session.socket is second
+
+    # the expiry timer of the detachment was cancelled
+    time.sleep(0.3)
+    assert budget.used == 100
+
+    # taken over while still attached: the previous socket is closed
+    third = FakeSocket()
+    assert sessions.resume(session.token, 'key', third) is session
+    assert second.closed
+
+    # detaching the socket that was taken over does nothing
+    sessions.detach(session, second)
+    assert session.socket is third and session.timer is None
+
+
+def test_expiry_after_grace_period(budget):
+    socket = FakeSocket()
+    session = new_session(budget, socket)
+
+    sessions.detach(session, socket)
+    assert budget.used == 100
+    time.sleep(0.4)
+
+    assert budget.used == 0
+    assert sessions.resume(session.token, 'key', FakeSocket()) is None
+
+
+def test_resume_needs_the_same_dataset(budget):
+    socket = FakeSocket()
+    session = new_session(budget, socket)
+
+    assert sessions.resume(session.token, 'other key', FakeSocket()) is None
+    assert sessions.resume('no such token', 'key', FakeSocket()) is None
+    assert session.socket is socket
+
+
+def test_background_messages_go_to_the_resuming_socket(budget):
+    first = FakeSocket()
+    session = new_session(budget, first)
+    sessions.send(session, b'1')
+
+    # closed before it was detached
+    first.close()
+    sessions.send(session, b'2')
+    sessions.detach(session, first)
+    sessions.send(session, b'3')
+
+    second = FakeSocket()
+    assert sessions.resume(session.token, 'key', second) is session
+    sessions.send(session, b'4')
+    assert second.sent == []
+
+    # after the SESSION message
+    second.send(b'session')
+    sessions.start_sending(session)
+    sessions.send(session, b'5')
+
+    assert first.sent == [ b'1' ]
+    assert second.sent == [ b'session', b'2', b'3', b'4', b'5' ]
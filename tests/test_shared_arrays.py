@@ -0,0 +1,103 @@
+import multiprocessing
+import os
+import threading
+import time
+import numpy as np
+
+from backend import shared_arrays
+
+
+def publish_and_attach(name):
+    arrays = dict(ts=np.arange(10, dtype='<i4'), values=np.linspace(0, 1, 10))
+    with shared_arrays.locked(name):
+        shared_arrays.publish(name, arrays, dict(dt=9))
+        return shared_arrays.attach(name)
+
+
+def attach_in_child(name, release):
+    '''Attach to `name` from a child process, which releases it or exits without doing so.'''
+    def child():
+        with shared_arrays.locked(name):
+            arrays, attributes = shared_arrays.attach(name)
+        assert attributes == dict(dt=9)
+        assert np.array_equal(arrays['ts'], np.arange(10))
+        if release:
+            shared_arrays.release(name)
+        # without running the exit handlers
+        os._exit(0)
+
+    process = multiprocessing.get_context('fork').Process(target=child)
+    process.start()
+    process.join(30)
+    assert process.exitcode == 0
+
+
+def other_process_locks(name):
+    def child():
+        with shared_arrays.locked(name):
+            os._exit(0)
+
+    process = multiprocessing.get_context('fork').Process(target=child)
+    process.start()
+    process.join(1)
+    if process.exitcode is None:
+        process.kill()
+        process.join()
+        return False
+
+    return process.exitcode == 0
+
+def test_last_holder_removes_the_set_and_its_lock(tmp_path, monkeypatch):
+    monkeypatch.setattr(shared_arrays, 'directory', str(tmp_path))
+    arrays, _ = publish_and_attach('set')
+
+    attach_in_child('set', release=True)
+    # still held by this process
+    assert os.listdir(tmp_path / 'set' / 'holders') == [ str(os.getpid()) ]
+    assert (tmp_path / 'set.lock').exists()
+
+    shared_arrays.release('set')
+    assert os.listdir(tmp_path) == []
+    # the memory maps stay valid
+    assert arrays['values'][-1] == 1
+
+
+def test_dead_holders_are_ignored(tmp_path, monkeypatch):
+    monkeypatch.setattr(shared_arrays, 'directory', str(tmp_path))
+    publish_and_attach('set')
+
+    attach_in_child('set', release=False)
+    assert len(os.listdir(tmp_path / 'set' / 'holders')) == 2
+
+    shared_arrays.release('set')
+    assert os.listdir(tmp_path) == []
+
+
+def test_lock_removed_while_waiting_is_taken_again(tmp_path, monkeypatch):
+    monkeypatch.setattr(shared_arrays, 'directory', str(tmp_path))
+    acquired, done = threading.Event(), threading.Event()
+
+    def wait():
+        with shared_arrays.locked('set'):
+            acquired.set()
+            done.wait(10)
+
+    waiter = threading.Thread(target=wait)
+    with shared_arrays.locked('set'):
+        waiter.start()
+        time.sleep(0.2)
+        assert not acquired.is_set()
+        # as in `release`
+        os.remove(tmp_path / 'set.lock')
+
+    try:
+        assert acquired.wait(10)
+        # the waiter holds a lock on a new file, which excludes other processes
+        assert (tmp_path / 'set.lock').exists()
+        assert not other_process_locks('set')
+    finally:
+        done.set()
+        waiter.join()
+
+    assert other_process_locks('set')
+
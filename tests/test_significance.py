@@ -0,0 +1,82 @@
+import logging
+import numpy as np
+
+from backend.dataset import create_dataset
+
+
+logger = logging.getLogger(__name__)
+
+day = 24 * 3600
+
+
+def events_dataset(ts, **kwargs):
+    n = len(ts)
+    data = dict(x=np.zeros(n), y=np.zeros(n), value=np.ones(n), time=ts)
+    return create_dataset(data, logger, **kwargs)
+
+
+def periodic_dataset():
+    '''Events on a random half of 1000 days, within 15 minutes of noon.'''
+    rng = np.random.default_rng(2)
+    days = np.flatnonzero(rng.uniform(size=1000) < 0.5)
+    return events_dataset(np.sort(days * day + day / 2 + rng.uniform(-450, 450, len(days))), minutes=60)
+
+
+def poisson_dataset():
+    rng = np.random.default_rng(3)
+    return events_dataset(np.sort(rng.uniform(0, 1000 * day, 500)), minutes=60)
+
+
+def test_periodic_signal_is_significant():
+    dataset = periodic_dataset()
+    count = 16
+    # surrogates jittered by a week lose the daily phase
+    completed, ent_pvalues, ent_zscores, vec_pvalues, vec_zscores = \
+            dataset.calculate_significance(count, method='jitter', jitter_width=7 * day)
+
+    assert completed == count
+    i = np.flatnonzero(dataset.periods == day)[0]
+    assert ent_pvalues[i] == 1 / (count + 1)
+    assert vec_pvalues[i] == 1 / (count + 1)
+    assert ent_zscores[i] > 10 and vec_zscores[i] > 10
+
+
+def test_poisson_events_are_not_significant():
+    dataset = poisson_dataset()
+    count = 16
+    for method in ('shuffle', 'jitter'):
+        completed, ent_pvalues, _, vec_pvalues, _ = dataset.calculate_significance(count, method=method, jitter_width=day)
+
+        assert completed == count
+        for pvalues in (ent_pvalues, vec_pvalues):
+            assert not np.isnan(pvalues).any()
+            # roughly uniform over the possible values 1 / 17, ..., 1
+            assert 0.4 < pvalues.mean() < 0.65
+            assert np.mean(pvalues <= 1 / (count + 1)) < 0.15
+
+
+def test_data_is_evaluated_like_the_surrogates():
+    # shuffling equal intervals gives surrogates identical to the data, so
+    # they are exactly as good as the data, also with vector strengths from
+    # the spectrum for the dataset itself
+    dataset = events_dataset(np.arange(300) * 7919.0, minutes=60, vectorstrength_method='fft')
+    count = 4
+    completed, ent_pvalues, ent_zscores, vec_pvalues, vec_zscores = dataset.calculate_significance(count)
+
+    assert completed == count
+    np.testing.assert_array_equal(ent_pvalues, 1)
+    np.testing.assert_array_equal(vec_pvalues, 1)
+
+
+def test_paged_sweep_covers_calculated_pages():
+    dataset = events_dataset(np.sort(np.random.default_rng(5).uniform(0, 100 * day, 300)),
+            minutes=60, vectorstrength_method='fft', page_size=100)
+    dataset.calculate_pages([ 2 ])
+
+    _, ent_pvalues, _, vec_pvalues, _ = dataset.calculate_significance(2)
+
+    swept = np.zeros(len(dataset.periods), dtype='bool')
+    swept[200:300] = True
+    for pvalues in (ent_pvalues, vec_pvalues):
+        assert not np.isnan(pvalues[swept]).any()
+        assert np.isnan(pvalues[~swept]).all()
@@ -0,0 +1,123 @@
+import json
+import logging
+import numpy as np
+import pytest
+
+from backend import memory_budget, socket as sock
+from backend.dataset import create_dataset
+from backend.socket import handle_message
+
+
+logger = logging.getLogger(__name__)
+
+
+class FakeSocket:
+    '''Records the messages sent to it.'''
+
+    def __init__(self):
+        self.sent = []
+        self.session = None
+
+    def send(self, data):
+        self.sent.append(data)
+
+
+def dataset():
+    rng = np.random.default_rng(3)
+    n = 500
+    data = dict(x=rng.uniform(0, 1, n), y=rng.uniform(0, 1, n), value=rng.uniform(0, 1, n),
+            time=np.sort(rng.uniform(0, 1e6, n)))
+    return create_dataset(data, logger, minutes=60)
+
+
+def message_type(message):
+    return int(np.frombuffer(message, dtype='<u4', count=1)[0])
+
+
+def send(d, message):
+    socket = FakeSocket()
+    handle_message(d, message, socket, logger)
+    return socket.sent
+
+
+@pytest.mark.parametrize('request_', [
+    dict(periods=['a']),
+    dict(periods=[[1, 2], [3]]),
+    dict(periods=[[1, 2], [3, 4]]),
+    dict(periods=[1, None]),
+    dict(periods=[]),
+    dict(periods='abc'),
+    dict(periods=[1, -2]),
+    dict(periodRange=dict(min='a', max=2, count=3)),
+    dict(periodRange=dict(min=1, max=2)),
+    dict(periods=[1, 2], basePeriod=-1),
+        ])
+def test_malformed_json_period_request_is_an_error(request_):
+    sent = send(dataset(), json.dumps(dict(type='request additional data', requestId=1, **request_)))
+    assert [ message_type(m) for m in sent ] == [ 100 ]
+
+
+def binary_request(encoding, count, payload):
+    return np.array([ 6, 1, encoding, count ], dtype='<u4').tobytes() + payload
+
+
+@pytest.mark.parametrize('message', [
+    # truncated header
+    np.array([ 6, 1 ], dtype='<u4').tobytes(),
+    # fewer periods than announced
+    binary_request(1, 4, np.array([ 1.0, 2.0 ], dtype='<f8').tobytes()),
+    # unknown encoding
+    binary_request(7, 1, np.array([ 1.0 ], dtype='<f8').tobytes()),
+    # invalid periods
+    binary_request(1, 2, np.array([ 1.0, np.nan ], dtype='<f8').tobytes()),
+    binary_request(0, 1, np.array([ -1.0 ], dtype='<f4').tobytes()),
+    # invalid range
+    binary_request(2, 10, np.array([ 2.0, 1.0 ], dtype='<f8').tobytes()),
+    binary_request(2, 0, np.array([ 1.0, 2.0 ], dtype='<f8').tobytes()),
+        ])
+def test_malformed_binary_period_request_is_an_error(message):
+    sent = send(dataset(), message)
+    assert [ message_type(m) for m in sent ] == [ 100 ]
+
+
+def test_valid_period_requests_are_answered():
+    d = dataset()
+    json_sent = send(d, json.dumps(dict(type='request additional data', requestId=1, periods=[ 60, 120.5 ])))
+    binary_sent = send(d, binary_request(1, 2, np.array([ 60, 120.5 ], dtype='<f8').tobytes()))
+    assert len(json_sent) == 1 and message_type(json_sent[0]) != 100
+    assert json_sent == binary_sent
+
+
+def grouped_dataset(num_groups):
+    rng = np.random.default_rng(4)
+    n = 20 * num_groups
+    data = dict(x=np.zeros(n), y=np.zeros(n), value=rng.uniform(0, 1, n),
+            time=np.sort(rng.uniform(0, 1e6, n)), group=rng.permutation(np.arange(n) % num_groups))
+    return create_dataset(data, logger, minutes=60)
+
+
+def metadata(message):
+    length = int(np.frombuffer(message, dtype='<u4', count=1, offset=8)[0])
+    return json.loads(message[12:12 + length])
+
+
+def test_groups_are_bounded_and_reserved(monkeypatch):
+    budget = memory_budget.MemoryBudget(1 << 40)
+    monkeypatch.setattr(memory_budget, 'budget', budget)
+
+    d = grouped_dataset(sock.max_group_results + 10)
+    for request_ in (dict(), dict(topK=sock.max_group_results + 1)):
+        sent = send(d, json.dumps(dict(type='request groups', requestId=3, **request_)))
+        assert message_type(sent[0]) == 10
+        assert metadata(sent[0])['groupCount'] == sock.max_group_results
+        assert budget.used == 0
+
+
+def test_groups_over_the_memory_budget_are_an_error(monkeypatch):
+    d = grouped_dataset(20)
+    monkeypatch.setattr(memory_budget, 'budget', memory_budget.MemoryBudget(d.groups_reserve(5)))
+    monkeypatch.setattr(memory_budget, 'wait_timeout', 0)
+
+    assert message_type(send(d, json.dumps(dict(type='request groups', requestId=3, topK=5)))[0]) == 10
+    assert [ message_type(m) for m in send(d, json.dumps(dict(type='request groups', requestId=3))) ] == [ 100 ]
+    assert memory_budget.budget.used == 0
@@ -0,0 +1,55 @@
+import logging
+import numpy as np
+import pytest
+
+from backend import vectorstrength
+from backend.dataset import create_dataset, generate_periods
+
+
+logger = logging.getLogger(__name__)
+
+
+def random_events(integer):
+    rng = np.random.default_rng(8)
+    n = 2000
+    ts = rng.uniform(0, 5_000_000, n)
+    # events clustered around a period, so that the moments are not all small
+    ts[:n // 2] = np.round(ts[:n // 2] / 86400) * 86400 + rng.normal(0, 3600, n // 2)
+    ts = np.sort(np.round(ts) if integer else ts)
+    return ts, rng.uniform(0.5, 2, n)
+
+
+@pytest.mark.parametrize('integer', [ True, False ])
+@pytest.mark.parametrize('tolerance', [ 1e-4, 1e-6, 1e-9 ])
+def test_moments_within_error_bound(integer, tolerance):
+    ts, weights = random_events(integer)
+    periods = generate_periods(ts.max() - ts.min(), 3600)
+
+    approximate = vectorstrength.circular_moments(ts, periods, 3, weights, tolerance=tolerance)
+    exact = vectorstrength.direct_circular_moments(ts, periods, 3, weights)
+
+    # the bound is on the truncation error, the rest is rounding
+    assert np.abs(approximate - exact).max() <= tolerance + 1e-10
+
+
+def test_chunked_moments_match_moments():
+    ts, weights = random_events(True)
+    periods = generate_periods(ts.max() - ts.min(), 3600)
+
+    chunks = [ (ts[i:i + 300], weights[i:i + 300]) for i in range(0, len(ts), 300) ]
+    chunked = vectorstrength.chunked_circular_moments(chunks, ts.min(), ts.max(), periods, 2)
+    exact = vectorstrength.direct_circular_moments(ts, periods, 2, weights)
+
+    assert np.abs(chunked - exact).max() <= 1e-6 + 1e-10
+
+
+def test_dataset_vector_strengths_match_exact_method():
+    ts, values = random_events(True)
+    data = dict(x=np.zeros(len(ts)), y=np.zeros(len(ts)), value=values, time=ts)
+    exact = create_dataset(data, logger, minutes=60)
+    fft = create_dataset(data, logger, minutes=60, vectorstrength_method='fft')
+
+    np.testing.assert_array_equal(fft.periods, exact.periods)
+    # within the default tolerance, and single precision on the wire
+    np.testing.assert_allclose(fft.vecs, exact.vecs, rtol=0, atol=1e-6 + 1e-6)
+    np.testing.assert_array_equal(fft.hists, exact.hists)
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+
+'''
+Convert a CSV dataset with the columns x, y, time, value and (optionally)
+group into the columnar format of backend/columnar.py, in chunks, so that
+the input does not have to fit into memory.
+
+    $ python tools/convert_columnar.py datasets/tides_us.csv datasets/tides_us.columns --time-scaling 1/1440
+'''
+
+import argparse
+import fractions
+import importlib.util
+import logging
+import os.path
+import sys
+
+# loaded by path, as importing the backend package would start the server
+# application and discover the datasets
+_spec = importlib.util.spec_from_file_location('columnar',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend', 'columnar.py'))
+columnar = sys.modules[_spec.name] = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(columnar)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert a CSV dataset (columns x, y, time, value, optionally group) to the columnar format.')
+    parser.add_argument('infile', type=argparse.FileType('r'), help='input CSV file')
+    parser.add_argument('outfile', help='output columnar file')
+    parser.add_argument('--time-scaling', type=lambda s: float(fractions.Fraction(s)), default=1.0,
+            help='factor for the times, as in the run function arguments; may be a fraction like 1/1440 (default: %(default)s)')
+    parser.add_argument('--sort', action='store_true', help='sort the events by time')
+    parser.add_argument('--chunk-size', type=int, default=1 << 20, help='number of events parsed at once (default: %(default)s)')
+
+    parsed = parser.parse_args()
+    logging.basicConfig(format='%(asctime)s [%(levelname)s]  %(message)s', datefmt='%Y-%m-%dT%H:%M:%S', level=logging.INFO)
+    columnar.write(parsed.outfile, columnar.read_csv_chunks(parsed.infile, parsed.time_scaling, parsed.chunk_size), parsed.sort)
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+
+'''
+Generate websocket load against a locally running backend server.
+
+Opens a number of concurrent sessions against `/dataset/<id>` (or
+`/dataset/` with a random uploaded dataset), lets each session follow a
+script of messages, and reports latency percentiles per message type,
+throughput and error counts.
+
+The script is a JSON list of steps. Each step is one of:
+
+    { "type": "ready" }
+    { "type": "request additional data", "count": 5 }
+    { "type": "set display attribute", "attributes": ["average value", "count"] }
+    { "type": "sleep", "seconds": 0.5 }
+
+"request additional data" sends `count` requests shaped like the
+suggestion bar of the frontend: harmonics (multiples, divisors and
+fractions) of a randomly navigated-to period, each with five neighbours to
+either side.
+'''
+
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+from simple_websocket import Client, ConnectionClosed
+
+
+default_script = [
+    dict(type='ready'),
+    dict(type='request additional data', count=5),
+    dict(type='set display attribute', attributes=['average value', 'variance', 'count']),
+        ]
+
+# message types of the responses, see README.md
+_response_types = {
+    'ready': 0,
+    'request additional data': 1,
+    'set display attribute': 8,
+        }
+
+
+class OverCapacity(Exception):
+    pass
+
+
+class Statistics:
+    '''Thread-safe collection of latencies and errors per message type.'''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.bytes_received = 0
+
+    def add(self, msgtype, latency, num_bytes):
+        with self.lock:
+            self.latencies[msgtype].append(latency)
+            self.bytes_received += num_bytes
+
+    def error(self, msgtype):
+        with self.lock:
+            self.errors[msgtype] += 1
+
+
+def harmonic_periods(period, period_domain, max_factor=12, context=5):
+    '''Periods requested by the frontend's suggestion bar for `period`.'''
+    existing = set([0, 1])
+    factors = []
+
+    for denominator in range(2, max_factor + 1):
+        factors.append(denominator)
+        factors.append(1 / denominator)
+        existing.add(denominator)
+        existing.add(1 / denominator)
+
+        for nominator in range(1, 2 * denominator):
+            factor = nominator / denominator
+            if factor in existing:
+                continue
+
+            existing.add(factor)
+            factors.append(factor)
+
+    candidates = [ f * period for f in factors if period_domain[0] <= f * period <= period_domain[1] ]
+
+    return [ math.pow(1.005, d) * p for p in candidates for d in range(-context, context + 1) ]
+
+
+def random_upload(length, rng):
+    '''UPLOAD DATASET message with `length` random events.'''
+    header = np.array([2, length], dtype='<u4')
+    xs = rng.uniform(0, 100, length).astype('<f4')
+    ys = rng.uniform(0, 100, length).astype('<f4')
+    values = rng.uniform(0, 10, length).astype('<f4')
+    ts = rng.integers(1577836800, 1609459200, length).astype('<u4')
+
+    return b''.join(a.tobytes() for a in (header, xs, ys, values, ts))
+
+
+def parse_begin_dataset(message):
+    '''Metadata and periods of a BEGIN DATASET message.'''
+    metadata_length = np.frombuffer(message, dtype='<u4', count=1, offset=4)[0]
+    metadata = json.loads(message[8:8 + metadata_length].decode())
+
+    offset = 8 + metadata_length + 4 * (metadata['numBins'] + 2) * metadata['periodCount']
+    periods = np.frombuffer(message, dtype='<f4', count=metadata['periodCount'], offset=offset)
+
+    return metadata, periods
+
+
+class Session:
+    def __init__(self, index, url, script, stats, timeout, upload_length, seed):
+        self.index = index
+        self.url = url
+        self.script = script
+        self.stats = stats
+        self.timeout = timeout
+        self.upload_length = upload_length
+        self.rng = random.Random(seed + index)
+        self.request_id = 0
+        self.metadata = None
+        self.periods = None
+
+    def receive(self, socket, msgtype, expected):
+        '''Wait for the response of type `expected`, return it or None on error.'''
+        while True:
+            message = socket.receive(timeout=self.timeout)
+            if message is None:
+                self.stats.error(msgtype)
+                return None
+
+            if type(message) != bytes or len(message) < 4:
+                self.stats.error(msgtype)
+                return None
+
+            response_type = np.frombuffer(message, dtype='<u4', count=1, offset=0)[0]
+
+            # the server refuses sessions when its memory budget is exhausted
+            if response_type == 101:
+                raise OverCapacity()
+
+            # error messages only consist of the message type
+            if len(message) == 4 and response_type != expected:
+                self.stats.error(msgtype)
+                return None
+
+            if response_type == expected:
+                return message
+
+    def request(self, socket, msgtype, payload, check=None):
+        t0 = time.perf_counter()
+        socket.send(payload if type(payload) == bytes else json.dumps(payload))
+
+        while True:
+            message = self.receive(socket, msgtype, _response_types[msgtype])
+            if message is None:
+                return None
+
+            if check is None or check(message):
+                break
+
+        self.stats.add(msgtype, time.perf_counter() - t0, len(message))
+        return message
+
+    def step_ready(self, socket, step):
+        message = self.request(socket, 'ready', dict(type='ready'))
+        if message is not None:
+            self.metadata, self.periods = parse_begin_dataset(message)
+
+    def step_request_additional_data(self, socket, step):
+        if self.periods is None or len(self.periods) == 0:
+            self.stats.error('request additional data')
+            return
+
+        for _ in range(step.get('count', 1)):
+            period = float(self.rng.choice(self.periods))
+            periods = harmonic_periods(period, self.metadata['periodDomain'])
+            if len(periods) == 0:
+                continue
+
+            request_id = self.request_id
+            self.request_id += 1
+
+            def check(message):
+                return np.frombuffer(message, dtype='<u4', count=1, offset=4)[0] == request_id
+
+            # binary REQUEST ADDITIONAL DATA message with f64 periods and the
+            # selected period as base period, like the frontend
+            header = np.array([6, request_id, 1, len(periods)], dtype='<u4')
+            message = header.tobytes() + np.array(periods + [period], dtype='<f8').tobytes()
+
+            self.request(socket, 'request additional data', message, check)
+
+    def step_set_display_attribute(self, socket, step):
+        for attribute in step.get('attributes', ['count']):
+            self.request(socket, 'set display attribute', {
+                'type': 'set display attribute',
+                'attribute': attribute,
+                })
+
+    def step_sleep(self, socket, step):
+        time.sleep(step.get('seconds', 1))
+
+    def run(self):
+        try:
+            socket = Client.connect(self.url, receive_bytes=1 << 16)
+        except (OSError, ConnectionClosed):
+            self.stats.error('connect')
+            return
+
+        try:
+            if self.upload_length is not None:
+                rng = np.random.default_rng(self.index)
+                socket.send(random_upload(self.upload_length, rng))
+
+            for step in self.script:
+                handler = getattr(self, 'step_' + step['type'].replace(' ', '_'), None)
+                if handler is None:
+                    raise ValueError(F'unknown step type: {step["type"]}')
+
+                handler(socket, step)
+
+        except OverCapacity:
+            self.stats.error('over capacity')
+
+        except ConnectionClosed:
+            self.stats.error('connection closed')
+
+        finally:
+            try:
+                socket.close()
+            except ConnectionClosed:
+                pass
+
+
+def report(stats, duration, outfile):
+    total = sum(len(v) for v in stats.latencies.values())
+
+    outfile.write(F'{"message type":<26} {"count":>7} {"errors":>7} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"max ms":>9}\n')
+    for msgtype in sorted(set(stats.latencies.keys()) | set(stats.errors.keys())):
+        latencies = np.array(stats.latencies[msgtype]) * 1000
+        if len(latencies) > 0:
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            maximum = latencies.max()
+        else:
+            p50 = p95 = p99 = maximum = math.nan
+
+        outfile.write(F'{msgtype:<26} {len(latencies):>7} {stats.errors[msgtype]:>7} {p50:>9.1f} {p95:>9.1f} {p99:>9.1f} {maximum:>9.1f}\n')
+
+    outfile.write('\n')
+    outfile.write(F'duration:    {duration:.2f} s\n')
+    outfile.write(F'messages:    {total} ({total / duration:.2f} / s)\n')
+    outfile.write(F'received:    {stats.bytes_received / 1e6:.2f} MB ({stats.bytes_received / 1e6 / duration:.2f} MB / s)\n')
+    outfile.write(F'errors:      {sum(stats.errors.values())}\n')
+
+
+def work(url, sessions, script, timeout, upload_length, seed, outfile):
+    stats = Statistics()
+    threads = [
+        threading.Thread(target=Session(i, url, script, stats, timeout, upload_length, seed).run)
+        for i in range(sessions)
+            ]
+
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    duration = time.perf_counter() - t0
+
+    report(stats, duration, outfile)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Websocket load test for the backend server.')
+    parser.add_argument('dataset', nargs='?', default=None, help='dataset ID; if omitted, a random dataset is uploaded to /dataset/')
+    parser.add_argument('--server', default='ws://localhost:8000', help='websocket base URL of the server (default: %(default)s)')
+    parser.add_argument('--sessions', '-n', type=int, default=10, help='number of concurrent sessions (default: %(default)s)')
+    parser.add_argument('--script', type=argparse.FileType('r'), default=None, help='JSON file with the session script')
+    parser.add_argument('--upload-length', type=int, default=10000, help='number of events uploaded if no dataset ID is given (default: %(default)s)')
+    parser.add_argument('--timeout', type=float, default=600, help='timeout for a single response in seconds (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=123456, help='random seed (default: %(default)s)')
+
+    parsed = parser.parse_args()
+
+    script = default_script if parsed.script is None else json.load(parsed.script)
+    if parsed.dataset is None:
+        url = F'{parsed.server}/dataset/'
+        upload_length = parsed.upload_length
+    else:
+        url = F'{parsed.server}/dataset/{parsed.dataset}'
+        upload_length = None
+
+    work(url, parsed.sessions, script, parsed.timeout, upload_length, parsed.seed, sys.stdout)